@@ -0,0 +1,293 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from graphql import (
+    BooleanValueNode,
+    DocumentNode,
+    FieldNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    OperationType,
+    VariableNode,
+)
+
+from .metrics import registry
+
+# Limits for /graphql executions; see README for tuning
+ADMISSION_CONTROL = os.getenv("GRAPHQL_ADMISSION_CONTROL", "true").lower() == "true"
+MAX_CONCURRENCY = int(os.getenv("GRAPHQL_MAX_CONCURRENCY", "16"))
+MAX_QUEUE = int(os.getenv("GRAPHQL_MAX_QUEUE", "64"))
+# Requests waiting longer than this for a slot are shed with a 503
+QUEUE_TARGET_MS = float(os.getenv("GRAPHQL_QUEUE_TARGET_MS", "250"))
+
+# Priorities, lower runs first
+HIGH = 0
+NORMAL = 1
+LOW = 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+# Estimated cost of each root field; unknown fields count as a list page
+POINT_LOOKUP_COST = 1
+DEFAULT_FIELD_COST = 10
+FULL_SCAN_COST = 100
+FIELD_COSTS = {
+    "getLead": POINT_LOOKUP_COST,
+    "getTask": POINT_LOOKUP_COST,
+    "getNote": POINT_LOOKUP_COST,
+    "getAppointment": POINT_LOOKUP_COST,
+    "getVehicle": POINT_LOOKUP_COST,
+    "getTasksByLead": 2,
+    "getNotesByLead": 2,
+    "getNotesByTask": 2,
+    "getVehiclesByLead": 2,
+    # Answered from the bitmap indexes: a page of rows / a few popcounts
+    "getLeadsByStatus": DEFAULT_FIELD_COST,
+    "getLeadStatusCounts": 2,
+    "getVehicles": FULL_SCAN_COST,
+    "changesSince": FULL_SCAN_COST,
+}
+# Mutations that run batch jobs; other mutations cost a point lookup
+MUTATION_COSTS = {
+    "scoreLeads": FULL_SCAN_COST,
+}
+# Paginated fields cost one unit per row requested
+PAGINATED_FIELDS = ("getAllLeads", "getAllTasks", "getAllAppointments")
+# Lists that decompress every archive segment when asked to include archived rows
+ARCHIVE_SCAN_FIELDS = ("getAllTasks", "getAllAppointments")
+HIGH_PRIORITY_MAX_COST = 5
+NORMAL_PRIORITY_MAX_COST = 50
+
+queue_depth = registry.gauge("graphql_admission_queue_depth", "Requests waiting for an execution slot")
+in_flight = registry.gauge("graphql_admission_in_flight", "Executions currently holding a slot")
+admitted_total = registry.counter(
+    "graphql_admission_admitted_total", "Requests given an execution slot", ("priority",)
+)
+shed_total = registry.counter(
+    "graphql_admission_shed_total", "Requests rejected with 503", ("priority", "reason")
+)
+queue_wait_seconds = registry.summary(
+    "graphql_admission_queue_wait_seconds", "Time spent waiting for an execution slot", ("priority",)
+)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _int_argument(field: FieldNode, name: str, variables: Optional[Dict[str, Any]]) -> Optional[int]:
+    for argument in field.arguments:
+        if argument.name.value != name:
+            continue
+        if isinstance(argument.value, IntValueNode):
+            return int(argument.value.value)
+        if isinstance(argument.value, VariableNode) and isinstance(variables, dict):
+            value = variables.get(argument.value.name.value)
+            return value if isinstance(value, int) else None
+    return None
+
+
+def _bool_argument(field: FieldNode, name: str, variables: Optional[Dict[str, Any]]) -> bool:
+    for argument in field.arguments:
+        if argument.name.value != name:
+            continue
+        if isinstance(argument.value, BooleanValueNode):
+            return argument.value.value
+        if isinstance(argument.value, VariableNode) and isinstance(variables, dict):
+            return variables.get(argument.value.name.value) is True
+    return False
+
+
+def query_cost(document: Optional[DocumentNode], operation_name: Optional[str] = None,
+               variables: Optional[Dict[str, Any]] = None) -> int:
+    """Estimate the cost of an operation from its root fields."""
+    if document is None:
+        return DEFAULT_FIELD_COST
+    for definition in document.definitions:
+        if not isinstance(definition, OperationDefinitionNode):
+            continue
+        if operation_name is not None and (definition.name is None or definition.name.value != operation_name):
+            continue
+        if definition.operation == OperationType.MUTATION:
+            # Writes are small and users wait on them; never queue them behind reports
+            return max((
+                MUTATION_COSTS.get(selection.name.value, POINT_LOOKUP_COST)
+                for selection in definition.selection_set.selections
+                if isinstance(selection, FieldNode)
+            ), default=POINT_LOOKUP_COST)
+        cost = 0
+        for selection in definition.selection_set.selections:
+            if not isinstance(selection, FieldNode):
+                cost += DEFAULT_FIELD_COST
+                continue
+            name = selection.name.value
+            if name in PAGINATED_FIELDS:
+                size = _int_argument(selection, "size", variables)
+                cost += max(size if size is not None else 10, 1)
+            else:
+                cost += FIELD_COSTS.get(name, DEFAULT_FIELD_COST)
+            if name in ARCHIVE_SCAN_FIELDS and _bool_argument(selection, "includeArchived", variables):
+                cost += FULL_SCAN_COST
+        return cost
+    return DEFAULT_FIELD_COST
+
+
+def cost_priority(cost: int) -> int:
+    if cost <= HIGH_PRIORITY_MAX_COST:
+        return HIGH
+    if cost <= NORMAL_PRIORITY_MAX_COST:
+        return NORMAL
+    return LOW
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "enqueued_at", "timer")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Bounded concurrency with a short priority queue in front of it.
+
+    At most ``max_concurrency`` executions run at once. Every request joins a
+    queue ordered by priority then arrival, and slots are handed out on the
+    next event loop iteration: resolvers are synchronous, so an execution
+    rarely yields, and without that hop requests would simply run in arrival
+    order. This way cheap lookups overtake bulk scans that arrived alongside
+    them.
+
+    A request is shed with ``Overloaded`` once it has waited longer than
+    ``target_wait`` seconds, or when the queue is full and nothing of lower
+    priority can be evicted to make room.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 target_wait: float = QUEUE_TARGET_MS / 1000):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.target_wait = target_wait
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._dispatch_scheduled = False
+        # Moving average of execution time, used for Retry-After
+        self._service_time = 0.01
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to drain."""
+        backlog = (self._queued + self._active) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(backlog * self._service_time))
+
+    def _shed(self, priority: int, reason: str) -> Overloaded:
+        shed_total.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+        return Overloaded(reason, self.retry_after())
+
+    def _set_counts(self) -> None:
+        queue_depth.set(self._queued)
+        in_flight.set(self._active)
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        # Removed lazily from the heap; only the count is kept exact
+        self._queued -= 1
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+
+    def _expire(self, waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            self._dequeue(waiter)
+            waiter.future.set_exception(self._shed(waiter.priority, "queue_timeout"))
+            self._set_counts()
+
+    async def acquire(self, priority: int = NORMAL) -> None:
+        if self._queued >= self.max_queue:
+            pending = [w for w in self._waiters if not w.future.done()]
+            worst = max(pending) if pending else None
+            if worst is None or worst.priority <= priority:
+                raise self._shed(priority, "queue_full")
+            # Make room by evicting the newest request of the lowest priority
+            self._dequeue(worst)
+            worst.future.set_exception(self._shed(worst.priority, "evicted"))
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._seq), loop.create_future())
+        waiter.timer = loop.call_later(self.target_wait, self._expire, waiter)
+        heapq.heappush(self._waiters, waiter)
+        self._queued += 1
+        self._set_counts()
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # Client went away: give back a slot we were handed, or leave the queue
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self.release()
+            elif not waiter.future.done():
+                self._dequeue(waiter)
+                waiter.future.cancel()
+                self._set_counts()
+            raise
+
+        queue_wait_seconds.observe(time.monotonic() - waiter.enqueued_at, priority=PRIORITY_NAMES[priority])
+        admitted_total.inc(priority=PRIORITY_NAMES[priority])
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        now = time.monotonic()
+        while self._waiters and self._active < self.max_concurrency:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            self._dequeue(waiter)
+            if now - waiter.enqueued_at > self.target_wait:
+                # The timer couldn't fire while the loop was busy; shed it now
+                waiter.future.set_exception(self._shed(waiter.priority, "queue_timeout"))
+                continue
+            self._active += 1
+            waiter.future.set_result(None)
+        self._set_counts()
+
+    def release(self) -> None:
+        self._active -= 1
+        # Hand the slot straight to the next waiter
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = NORMAL) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_time += 0.1 * (elapsed - self._service_time)
+            self.release()
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from .db import ARCHIVED, db
+from .metrics import registry
+from .models import Appointment, Task
+from .router import dumps, loads
+
+# Directory of the archive segments; empty disables archiving
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+# Seconds between archive runs
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+# Tasks in these statuses are archived once not updated for ARCHIVE_TASK_AGE_DAYS
+ARCHIVE_TASK_STATUSES = tuple(s.strip() for s in os.getenv("ARCHIVE_TASK_STATUSES", "COMPLETED,CANCELLED").split(",") if s.strip())
+ARCHIVE_TASK_AGE_DAYS = float(os.getenv("ARCHIVE_TASK_AGE_DAYS", "30"))
+# Appointments are archived once they ended this many days ago
+ARCHIVE_APPOINTMENT_AGE_DAYS = float(os.getenv("ARCHIVE_APPOINTMENT_AGE_DAYS", "30"))
+# Rows per segment file, and per compressed block within a segment
+ARCHIVE_SEGMENT_ROWS = int(os.getenv("ARCHIVE_SEGMENT_ROWS", "50000"))
+ARCHIVE_BLOCK_ROWS = int(os.getenv("ARCHIVE_BLOCK_ROWS", "256"))
+# Decompressed blocks kept in memory for repeated reads
+ARCHIVE_CACHE_BLOCKS = int(os.getenv("ARCHIVE_CACHE_BLOCKS", "64"))
+
+ARCHIVED_TYPES: Dict[str, Type] = {"Task": Task, "Appointment": Appointment}
+
+# Segment layout: zlib-compressed NDJSON blocks, a zlib-compressed JSON
+# footer listing each block's offset, length, ids and lead ids, then the
+# footer offset and this magic
+SEGMENT_MAGIC = b"SGARCH01"
+SEGMENT_TRAILER = struct.Struct("<Q8s")
+# Lead merges affecting archived rows, one JSON [source_id, target_id] per
+# line; segments are immutable, so their lead ids are remapped on load
+MERGES_FILE = "merges.ndjson"
+
+logger = logging.getLogger(__name__)
+
+archived_rows = registry.counter("archived_rows_total", "Rows moved to the archive", ("type",))
+
+# (segment number, block number)
+Location = Tuple[int, int]
+
+
+class Segment:
+    """One read-only, memory-mapped archive file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._map) - SEGMENT_TRAILER.size
+        footer_offset, magic = SEGMENT_TRAILER.unpack_from(self._map, end)
+        if magic != SEGMENT_MAGIC:
+            self.close()
+            raise ValueError(f"Not an archive segment: {path}")
+        footer = loads(zlib.decompress(self._map[footer_offset:end]))
+        self.model_name: str = footer["model"]
+        # [offset, length, ids, lead_ids] per block
+        self.blocks: List[List[Any]] = footer["blocks"]
+
+    @staticmethod
+    def write(path: str, model_name: str, records: List[Dict[str, Any]], block_rows: int = ARCHIVE_BLOCK_ROWS) -> None:
+        # Written under a temporary name and renamed, so a segment is either complete or absent
+        partial = path + ".tmp"
+        blocks = []
+        with open(partial, "wb") as f:
+            for start in range(0, len(records), block_rows):
+                chunk = records[start:start + block_rows]
+                data = zlib.compress(b"\n".join(dumps(record) for record in chunk))
+                blocks.append([f.tell(), len(data), [r["id"] for r in chunk], [r.get("lead_id") for r in chunk]])
+                f.write(data)
+            footer_offset = f.tell()
+            f.write(zlib.compress(dumps({"model": model_name, "blocks": blocks})))
+            f.write(SEGMENT_TRAILER.pack(footer_offset, SEGMENT_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+
+    def read_block(self, index: int) -> List[Dict[str, Any]]:
+        offset, length = self.blocks[index][:2]
+        return [loads(line) for line in zlib.decompress(self._map[offset:offset + length]).splitlines()]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class Archive:
+    """Cold tier for tasks and appointments that queries rarely touch.
+
+    Rows matching the age/status policy are written to compressed segment
+    files and removed from the in-memory tables, so hot scans and indexes
+    shrink. Only the id and lead id of each archived row stay in memory;
+    reads that ask for archived data decompress the blocks they need from
+    the memory-mapped segments. Archived rows are read-only. Listeners and
+    the change log see an ARCHIVED operation rather than a delete, so hot
+    indexes drop the rows while sync clients keep them; lead scoring adds
+    the archived rows back in itself.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self.segments: List[Segment] = []
+        self._locations: Dict[str, Dict[str, Location]] = {name: {} for name in ARCHIVED_TYPES}
+        self._by_lead: Dict[str, Dict[str, List[str]]] = {name: {} for name in ARCHIVED_TYPES}
+        self._cache: "OrderedDict[Location, Dict[str, Any]]" = OrderedDict()
+        # Merged lead id -> the lead it was merged into
+        self._merged: Dict[str, str] = {}
+        # Merges applied so far, for readers that keep their own per-lead state
+        self.merges = 0
+        self._runner: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        # Off in pre-fork workers: each would archive its own copy of the
+        # rows into the shared directory, and the next start would load
+        # every copy. The segments already there are still read.
+        self.writable = True
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def open(self) -> None:
+        """Load the segments already in the archive directory."""
+        if not self.enabled or self.segments:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        merges = os.path.join(self.directory, MERGES_FILE)
+        if os.path.exists(merges):
+            with open(merges, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        source_id, target_id = loads(line)
+                        self._merged[source_id] = target_id
+                        self.merges += 1
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".seg"):
+                self._add_segment(Segment(os.path.join(self.directory, name)))
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+        self._locations = {name: {} for name in ARCHIVED_TYPES}
+        self._by_lead = {name: {} for name in ARCHIVED_TYPES}
+        self._cache.clear()
+        self._merged = {}
+        self.merges = 0
+
+    def _add_segment(self, segment: Segment) -> None:
+        number = len(self.segments)
+        self.segments.append(segment)
+        locations = self._locations[segment.model_name]
+        by_lead = self._by_lead[segment.model_name]
+        for block, (_, _, ids, lead_ids) in enumerate(segment.blocks):
+            for id, lead_id in zip(ids, lead_ids):
+                locations[id] = (number, block)
+                by_lead.setdefault(self.resolve_lead(lead_id), []).append(id)
+
+    def count(self, model_type: Type) -> int:
+        return len(self._locations[model_type.__name__])
+
+    def resolve_lead(self, lead_id: Optional[str]) -> Optional[str]:
+        """The lead that archived rows of lead_id now belong to, after merges."""
+        while lead_id in self._merged:
+            lead_id = self._merged[lead_id]
+        return lead_id
+
+    def merge_leads(self, target_id: str, source_ids: List[str]) -> None:
+        """Move the archived rows of merged leads to the surviving lead."""
+        sources = [id for id in source_ids
+                   if id != target_id and any(id in by_lead for by_lead in self._by_lead.values())]
+        if not sources:
+            return
+        if self.writable:
+            with open(os.path.join(self.directory, MERGES_FILE), "ab") as f:
+                f.write(b"".join(dumps([id, target_id]) + b"\n" for id in sources))
+                f.flush()
+                os.fsync(f.fileno())
+        for id in sources:
+            self._merged[id] = target_id
+            for by_lead in self._by_lead.values():
+                moved = by_lead.pop(id, None)
+                if moved:
+                    by_lead.setdefault(target_id, []).extend(moved)
+        self.merges += len(sources)
+        # Cached rows carry the old lead id
+        self._cache.clear()
+
+    def _row(self, model_type: Type, record: Dict[str, Any]) -> Any:
+        if record.get("lead_id") in self._merged:
+            record["lead_id"] = self.resolve_lead(record["lead_id"])
+        return model_type(**record)
+
+    # Policy
+
+    @staticmethod
+    def _cutoff(model_type: Type, now: datetime) -> str:
+        days = ARCHIVE_TASK_AGE_DAYS if model_type is Task else ARCHIVE_APPOINTMENT_AGE_DAYS
+        return (now - timedelta(days=days)).isoformat()
+
+    @staticmethod
+    def _expired(model_type: Type, row: Any, cutoff: str) -> bool:
+        if model_type is Task:
+            return row.status in ARCHIVE_TASK_STATUSES and row.updated_at < cutoff
+        return bool(row.end_time) and row.end_time < cutoff
+
+    def candidates(self, model_type: Type, now: Optional[datetime] = None) -> List[Any]:
+        """Hot rows the policy says to archive."""
+        cutoff = self._cutoff(model_type, now or datetime.utcnow())
+        if model_type is Task:
+            rows = db.select(Task, {"status": {"in_list": ARCHIVE_TASK_STATUSES}})
+        else:
+            rows = db.iter_all(model_type)
+        return [row for row in rows if self._expired(model_type, row, cutoff)]
+
+    def archive(self, model_type: Type, rows: List[Any]) -> int:
+        """Write rows to a new segment and remove them from the hot table."""
+        if not rows:
+            return 0
+        model_name = model_type.__name__
+        path = os.path.join(self.directory, f"{datetime.utcnow():%Y%m%d%H%M%S%f}-{model_name.lower()}.seg")
+        # Grouped by lead, so reading one lead's archived rows touches few blocks
+        records = sorted((row.to_dict() for row in rows), key=lambda record: record.get("lead_id") or "")
+        Segment.write(path, model_name, records)
+        self._add_segment(Segment(path))
+        db.bulk_delete(model_type, [row.id for row in rows], operation=ARCHIVED)
+        archived_rows.inc(len(rows), type=model_name)
+        return len(rows)
+
+    async def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Archive every row the policy selects, one segment at a time."""
+        if not self.enabled:
+            raise RuntimeError("Archiving needs ARCHIVE_DIR")
+        if not self.writable:
+            raise RuntimeError("Archiving is off in pre-fork workers")
+        self.open()
+        now = now or datetime.utcnow()
+        result: Dict[str, Any] = {}
+        for model_name, model_type in ARCHIVED_TYPES.items():
+            cutoff = self._cutoff(model_type, now)
+            ids = [row.id for row in self.candidates(model_type, now)]
+            archived = 0
+            for start in range(0, len(ids), ARCHIVE_SEGMENT_ROWS):
+                # Rows may have changed or gone while we yielded; check them again
+                batch = [db.get(model_type, id) for id in ids[start:start + ARCHIVE_SEGMENT_ROWS]]
+                archived += self.archive(model_type, [
+                    row for row in batch if row is not None and self._expired(model_type, row, cutoff)
+                ])
+                await asyncio.sleep(0)
+            result[model_name] = archived
+        result["finished_at"] = datetime.utcnow().isoformat()
+        self.last_run = result
+        return result
+
+    # Reads
+
+    def _block(self, location: Location, model_type: Type) -> Dict[str, Any]:
+        rows = self._cache.get(location)
+        if rows is None:
+            segment, block = location
+            rows = {record["id"]: self._row(model_type, record) for record in self.segments[segment].read_block(block)}
+            self._cache[location] = rows
+            if len(self._cache) > ARCHIVE_CACHE_BLOCKS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(location)
+        return rows
+
+    def get(self, model_type: Type, id: str) -> Optional[Any]:
+        location = self._locations[model_type.__name__].get(id)
+        if location is None:
+            return None
+        return self._block(location, model_type).get(id)
+
+    def get_by_lead(self, model_type: Type, lead_id: str) -> List[Any]:
+        ids = self._by_lead[model_type.__name__].get(lead_id, ())
+        return [row for row in (self.get(model_type, id) for id in ids) if row is not None]
+
+    def iter_all(self, model_type: Type, first_segment: int = 0) -> Iterator[Any]:
+        """Every archived row of a type (in segments from ``first_segment`` on); bypasses the block cache."""
+        model_name = model_type.__name__
+        for segment in self.segments[first_segment:]:
+            if segment.model_name != model_name:
+                continue
+            for block in range(len(segment.blocks)):
+                for record in segment.read_block(block):
+                    yield self._row(model_type, record)
+
+    # Background job
+
+    def start(self, interval: float = ARCHIVE_INTERVAL) -> None:
+        if self._runner is None and self.enabled:
+            self.open()
+            if self.writable:
+                self._runner = asyncio.get_running_loop().create_task(self._run_periodically(interval))
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+
+    async def _run_periodically(self, interval: float) -> None:
+        while True:
+            try:
+                await self.run()
+            except Exception:
+                # Rows not yet archived stay hot; retry on the next tick
+                logger.exception("Archive run failed")
+            await asyncio.sleep(interval)
+
+
+archive = Archive()
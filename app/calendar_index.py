@@ -0,0 +1,183 @@
+import bisect
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .db import CREATED, REMOVALS, db
+from .models import Appointment
+from .scheduler import naive_utc
+
+# Also bucket appointments per location (for room/showroom calendars)
+CALENDAR_LOCATION_INDEX = os.getenv("CALENDAR_LOCATION_INDEX", "false").lower() == "true"
+# Longest range a single calendar query may cover
+CALENDAR_MAX_DAYS = int(os.getenv("CALENDAR_MAX_DAYS", "366"))
+
+# (start_time, id): sorts a day's appointments by start time
+Entry = Tuple[str, str]
+
+logger = logging.getLogger(__name__)
+
+
+def day_of(timestamp: str) -> str:
+    # ISO timestamps start with their date
+    return timestamp[:10]
+
+
+def utc_bound(value: str) -> str:
+    """A query bound with an offset in naive UTC; dates and naive times are kept at the precision given."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    return naive_utc(value) if parsed.tzinfo is not None else value
+
+
+class DayBuckets:
+    """Appointments in per-day buckets, each kept sorted by start time."""
+
+    def __init__(self):
+        self.days: List[str] = []
+        self.buckets: Dict[str, List[Entry]] = {}
+
+    def add(self, day: str, entry: Entry) -> None:
+        bucket = self.buckets.get(day)
+        if bucket is None:
+            bucket = self.buckets[day] = []
+            bisect.insort(self.days, day)
+        bisect.insort(bucket, entry)
+
+    def remove(self, day: str, entry: Entry) -> None:
+        bucket = self.buckets[day]
+        del bucket[bisect.bisect_left(bucket, entry)]
+        if not bucket:
+            del self.buckets[day]
+            del self.days[bisect.bisect_left(self.days, day)]
+
+    def range(self, start: str, end: str) -> Iterator[Tuple[str, List[Entry]]]:
+        """Non-empty (day, entries) from the day of ``start`` to the day of ``end``, in order."""
+        first = bisect.bisect_left(self.days, day_of(start))
+        last = bisect.bisect_right(self.days, day_of(end))
+        for day in self.days[first:last]:
+            yield day, self.buckets[day]
+
+    def __bool__(self) -> bool:
+        return bool(self.days)
+
+
+class CalendarIndex:
+    """Appointments bucketed by UTC day of start_time, overall, per lead and optionally per location.
+
+    Maintained from database change notifications, so a calendar query reads
+    only the days in its range instead of scanning and sorting every
+    appointment.
+    """
+
+    def __init__(self, by_location: bool = CALENDAR_LOCATION_INDEX):
+        self.by_location = by_location
+        self.all = DayBuckets()
+        self.leads: Dict[str, DayBuckets] = {}
+        self.locations: Dict[str, DayBuckets] = {}
+        # What each appointment was indexed under, to move it when it changes
+        self._indexed: Dict[str, Tuple[str, Entry, str, Optional[str]]] = {}
+        self._source: Any = None
+        self.rebuild()
+        db.add_listener(self.on_change)
+
+    def rebuild(self) -> None:
+        self.all = DayBuckets()
+        self.leads = {}
+        self.locations = {}
+        self._indexed = {}
+        self._source = db.memory_structures()["tables"]["Appointment"]
+        for appointment in self._source.values():
+            self._add(appointment)
+
+    def _add(self, appointment: Appointment) -> None:
+        # Start times with an offset are filed under their UTC day
+        start = naive_utc(appointment.start_time)
+        if start is None:
+            logger.warning("Leaving appointment %s off the calendar: start time %r is not an ISO timestamp",
+                           appointment.id, appointment.start_time)
+            return
+        day = day_of(start)
+        entry = (start, appointment.id)
+        location = appointment.location if self.by_location else None
+        self.all.add(day, entry)
+        self.leads.setdefault(appointment.lead_id, DayBuckets()).add(day, entry)
+        if location is not None:
+            self.locations.setdefault(location, DayBuckets()).add(day, entry)
+        self._indexed[appointment.id] = (day, entry, appointment.lead_id, location)
+
+    def _remove(self, id: str) -> None:
+        indexed = self._indexed.pop(id, None)
+        if indexed is None:
+            return
+        day, entry, lead_id, location = indexed
+        self.all.remove(day, entry)
+        self._remove_from(self.leads, lead_id, day, entry)
+        if location is not None:
+            self._remove_from(self.locations, location, day, entry)
+
+    @staticmethod
+    def _remove_from(index: Dict[str, DayBuckets], key: str, day: str, entry: Entry) -> None:
+        buckets = index[key]
+        buckets.remove(day, entry)
+        if not buckets:
+            del index[key]
+
+    def on_change(self, operation: str, model_name: str, id: str, model: Any) -> None:
+        if model_name != "Appointment":
+            return
+        if operation != CREATED:
+            self._remove(id)
+        if operation not in REMOVALS:
+            self._add(model)
+
+    def _check_source(self) -> None:
+        # db.clear() swaps the tables without notifying listeners
+        if db.memory_structures()["tables"]["Appointment"] is not self._source:
+            self.rebuild()
+
+    def days(self, start: str, end: str, lead_id: Optional[str] = None,
+             location: Optional[str] = None) -> List[Tuple[str, List[Appointment]]]:
+        """(day, appointments ordered by start time) for every day in range that has any.
+
+        ``start`` and ``end`` are ISO dates or timestamps; days are UTC days
+        and timestamps with an offset are converted to UTC. Both bounds are
+        inclusive at the precision given, so ``end="2024-05-31"`` covers that
+        whole day.
+        """
+        start, end = utc_bound(start), utc_bound(end)
+        # Compared at the precision of end, which is inclusive
+        if start[:len(end)] > end:
+            raise ValueError("from must not be after to")
+        if (date.fromisoformat(day_of(end)) - date.fromisoformat(day_of(start))).days >= CALENDAR_MAX_DAYS:
+            raise ValueError(f"Calendar range is limited to {CALENDAR_MAX_DAYS} days")
+        self._check_source()
+        if location is not None and not self.by_location:
+            raise ValueError("Calendar by location needs CALENDAR_LOCATION_INDEX=true")
+
+        if lead_id is not None:
+            buckets = self.leads.get(lead_id)
+        elif location is not None:
+            buckets = self.locations.get(location)
+        else:
+            buckets = self.all
+        if not buckets:
+            return []
+
+        result = []
+        for day, entries in buckets.range(start, end):
+            # Only the first and last day can hold appointments outside the bounds
+            if day == day_of(start) or day == day_of(end):
+                entries = [(t, id) for t, id in entries if t >= start and t[:len(end)] <= end]
+            appointments = [db.get(Appointment, id) for _, id in entries]
+            if location is not None and lead_id is not None:
+                appointments = [a for a in appointments if a.location == location]
+            if appointments:
+                result.append((day, appointments))
+        return result
+
+
+calendar_index = CalendarIndex()
@@ -1,15 +1,95 @@
-from typing import Dict, List, TypeVar, Type, Any, Optional
+import os
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar, Type, Any, Optional
 from datetime import datetime
 from uuid import uuid4
 
+from .storage import (
+    ARCHIVED, CHANGE_LOG_SIZE, CREATED, DELETED, FOREIGN_KEYS, REMOVALS, UPDATED, ChangeListener, ChangeLogEntry,
+    FieldKey, StorageBackend, Where, _plain, equality_values, matches,
+)
+
 T = TypeVar('T')
 
-class InMemoryDB:
+# Storage backend: "memory" keeps everything in process, "sqlite" stores rows in DB_PATH
+DB_BACKEND = os.getenv("DB_BACKEND", "memory")
+DB_PATH = os.getenv("DB_PATH", "supergraph.db")
+
+# Low-cardinality columns stored dictionary-encoded: every distinct value
+# gets a small int code and rows share the value table's single copy
+DICTIONARY_FIELDS = {
+    'Lead': ('lead_status', 'lead_source'),
+    'Task': ('status', 'priority'),
+    'Appointment': ('status',),
+    'Vehicle': ('make', 'model', 'color', 'condition'),
+}
+
+# Dictionary-encoded columns also indexed with one bitmap per value (code)
+BITMAP_FIELDS = {
+    'Lead': ('lead_status', 'lead_source'),
+    'Task': ('status', 'priority'),
+    'Appointment': ('status',),
+    'Vehicle': ('condition', 'make'),
+}
+
+# Free slots tolerated before a table's bitmaps are renumbered
+BITMAP_COMPACT_MIN_HOLES = 1024
+
+
+# Set bits of a bitmap; int.bit_count() needs Python 3.10
+_popcount = getattr(int, "bit_count", None) or (lambda bits: bin(bits).count("1"))
+
+
+def _bits(slots: List[int]) -> int:
+    """Bitmap with the given bit positions set."""
+    if len(slots) == 1:
+        return 1 << slots[0]
+    # Setting bits one by one on an int copies it every time; build the bytes instead
+    buffer = bytearray((max(slots) >> 3) + 1) if slots else bytearray()
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Positions of the set bits, lowest first."""
+    binary = format(bits, 'b')[::-1]
+    position = binary.find('1')
+    while position != -1:
+        yield position
+        position = binary.find('1', position + 1)
+
+
+class ValueDictionary:
+    """Distinct values of a column and their int codes, assigned in first-seen order."""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value: Any) -> Optional[int]:
+        """Code of a value, or None if no row ever held it."""
+        return self.codes.get(value)
+
+
+class InMemoryDB(StorageBackend):
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(InMemoryDB, cls).__new__(cls)
+            cls._instance._init_changes()
             cls._instance._init_db()
         return cls._instance
 
@@ -44,8 +124,123 @@ class InMemoryDB:
                 'lead': {}
             }
         }
+        # (model_name, field) -> value -> ids, kept as dicts to preserve insertion order
+        self._fk_index: Dict[Tuple[str, str], Dict[str, Dict[str, None]]] = {
+            (model_name, field): {}
+            for model_name, fields in FOREIGN_KEYS.items()
+            for field in fields
+        }
+        # (model_name, field) -> value table of a dictionary-encoded column
+        self._dictionaries: Dict[Tuple[str, str], ValueDictionary] = {
+            (model_name, field): ValueDictionary()
+            for model_name, fields in DICTIONARY_FIELDS.items()
+            for field in fields
+        }
+        # Bitmap indexes: each row owns a bit position (slot), assigned in
+        # insertion order, so decoding a bitmap yields rows in db order
+        self._slots: Dict[str, Dict[str, int]] = {model_name: {} for model_name in BITMAP_FIELDS}
+        self._slot_ids: Dict[str, List[Optional[str]]] = {model_name: [] for model_name in BITMAP_FIELDS}
+        self._live: Dict[str, int] = {model_name: 0 for model_name in BITMAP_FIELDS}
+        # (model_name, field) -> value code -> bitmap of rows with that value
+        self._bitmaps: Dict[Tuple[str, str], Dict[int, int]] = {
+            (model_name, field): {}
+            for model_name, fields in BITMAP_FIELDS.items()
+            for field in fields
+        }
+
+    def _index_add(self, model_name: str, model: Any) -> None:
+        for field in FOREIGN_KEYS.get(model_name, ()):
+            value = getattr(model, field, None)
+            if value is not None:
+                self._fk_index[(model_name, field)].setdefault(value, {})[model.id] = None
+
+    def _index_remove(self, model_name: str, model: Any) -> None:
+        for field in FOREIGN_KEYS.get(model_name, ()):
+            value = getattr(model, field, None)
+            ids = self._fk_index[(model_name, field)].get(value)
+            if ids is not None:
+                ids.pop(model.id, None)
+                if not ids:
+                    del self._fk_index[(model_name, field)][value]
+
+    def _encode(self, model_name: str, models: List[Any]) -> None:
+        # Point rows at the value table's copy, so each distinct value is stored once
+        for field in DICTIONARY_FIELDS.get(model_name, ()):
+            dictionary = self._dictionaries[(model_name, field)]
+            values, codes = dictionary.values, dictionary.codes
+            for model in models:
+                value = getattr(model, field, None)
+                code = codes.get(value)
+                if code is None:
+                    code = dictionary.encode(value)
+                setattr(model, field, values[code])
+
+    def _code(self, model_name: str, field: str, model: Any) -> int:
+        return self._dictionaries[(model_name, field)].codes[getattr(model, field, None)]
+
+    def _bitmap_add(self, model_name: str, models: List[Any]) -> None:
+        if model_name not in BITMAP_FIELDS:
+            return
+        slots = self._slots[model_name]
+        slot_ids = self._slot_ids[model_name]
+        for model in models:
+            slots[model.id] = len(slot_ids)
+            slot_ids.append(model.id)
+        self._live[model_name] |= _bits([slots[model.id] for model in models])
+
+        for field in BITMAP_FIELDS[model_name]:
+            codes = self._dictionaries[(model_name, field)].codes
+            by_code = defaultdict(list)
+            for model in models:
+                by_code[codes[getattr(model, field, None)]].append(slots[model.id])
+            bitmaps = self._bitmaps[(model_name, field)]
+            for code, code_slots in by_code.items():
+                bitmaps[code] = bitmaps.get(code, 0) | _bits(code_slots)
+
+    def _bitmap_remove(self, model_name: str, model: Any) -> None:
+        if model_name not in BITMAP_FIELDS:
+            return
+        slot = self._slots[model_name].pop(model.id)
+        self._slot_ids[model_name][slot] = None
+        bit = 1 << slot
+        self._live[model_name] ^= bit
+        for field in BITMAP_FIELDS[model_name]:
+            self._bitmap_clear(model_name, field, self._code(model_name, field, model), bit)
+
+        holes = len(self._slot_ids[model_name]) - len(self._slots[model_name])
+        if holes > max(BITMAP_COMPACT_MIN_HOLES, len(self._slots[model_name])):
+            self._bitmap_rebuild(model_name)
+
+    def _bitmap_clear(self, model_name: str, field: str, code: int, bit: int) -> None:
+        bitmaps = self._bitmaps[(model_name, field)]
+        remaining = bitmaps[code] ^ bit
+        if remaining:
+            bitmaps[code] = remaining
+        else:
+            del bitmaps[code]
+
+    def _bitmap_update(self, model_name: str, model: Any, old_codes: Tuple) -> None:
+        if model_name not in BITMAP_FIELDS:
+            return
+        bit = 1 << self._slots[model_name][model.id]
+        for field, old in zip(BITMAP_FIELDS[model_name], old_codes):
+            new = self._code(model_name, field, model)
+            if new != old:
+                self._bitmap_clear(model_name, field, old, bit)
+                bitmaps = self._bitmaps[(model_name, field)]
+                bitmaps[new] = bitmaps.get(new, 0) | bit
+
+    def _bitmap_rebuild(self, model_name: str) -> None:
+        # Renumber slots densely, keeping db order
+        self._slots[model_name] = {}
+        self._slot_ids[model_name] = []
+        self._live[model_name] = 0
+        for field in BITMAP_FIELDS[model_name]:
+            self._bitmaps[(model_name, field)] = {}
+        self._bitmap_add(model_name, list(self._data[model_name].values()))
 
     def create(self, model_type: Type[T], **data) -> T:
+        data = {k: _plain(v) for k, v in data.items()}
         if 'id' not in data:
             data['id'] = str(uuid4())
 
@@ -56,15 +251,178 @@ class InMemoryDB:
             data['updated_at'] = now
 
         model = model_type(**data)
+        self._encode(model_type.__name__, [model])
         self._data[model_type.__name__][data['id']] = model
+        self._index_add(model_type.__name__, model)
+        self._bitmap_add(model_type.__name__, [model])
+        self._notify(CREATED, model_type.__name__, model.id, model)
         return model
 
+    def bulk_create(self, model_type: Type[T], rows: Iterable[Dict[str, Any]]) -> List[T]:
+        """Create many rows at once, indexing the whole batch before notifying listeners."""
+        model_name = model_type.__name__
+        table = self._data[model_name]
+        now = datetime.utcnow().isoformat()
+
+        models = []
+        for data in rows:
+            data = {k: _plain(v) for k, v in data.items()}
+            data.setdefault('id', str(uuid4()))
+            data.setdefault('created_at', now)
+            data.setdefault('updated_at', now)
+            models.append(model_type(**data))
+        self._encode(model_name, models)
+
+        for model in models:
+            table[model.id] = model
+            self._index_add(model_name, model)
+        self._bitmap_add(model_name, models)
+        for model in models:
+            self._notify(CREATED, model_name, model.id, model)
+        return models
+
     def get(self, model_type: Type[T], id: str) -> Optional[T]:
         return self._data[model_type.__name__].get(id)
 
     def get_all(self, model_type: Type[T]) -> List[T]:
         return list(self._data[model_type.__name__].values())
 
+    def iter_all(self, model_type: Type[T]) -> Iterator[T]:
+        """Yield rows one at a time, tolerating concurrent writes.
+
+        Only the ids are snapshotted up front; rows deleted while iterating are
+        skipped and rows created after the call started are not included.
+        """
+        rows = self._data[model_type.__name__]
+        for id in list(rows):
+            model = rows.get(id)
+            if model is not None:
+                yield model
+
+    def get_by_foreign_key(self, model_type: Type[T], field: str, value: str) -> List[T]:
+        """Return rows whose `field` equals `value` using the foreign key index."""
+        model_name = model_type.__name__
+        rows = self._data[model_name]
+        ids = self._fk_index[(model_name, field)].get(value)
+        if not ids:
+            return []
+        return [rows[id] for id in list(ids) if id in rows]
+
+    def value_code(self, model_type: Type[T], field: str, value: Any) -> Optional[int]:
+        """Code of a value in a dictionary-encoded column, or None if no row ever held it."""
+        return self._dictionaries[(model_type.__name__, field)].code(_plain(value))
+
+    def bitmap(self, model_type: Type[T], field: str, values: Iterable[Any]) -> int:
+        """Bitmap of rows whose indexed `field` is any of `values`."""
+        model_name = model_type.__name__
+        codes = self._dictionaries[(model_name, field)].codes
+        bitmaps = self._bitmaps[(model_name, field)]
+        bits = 0
+        for value in values:
+            code = codes.get(_plain(value))
+            if code is not None:
+                bits |= bitmaps.get(code, 0)
+        return bits
+
+    def bitmap_values(self, model_type: Type[T], field: str) -> Dict[Any, int]:
+        """Bitmap for every distinct value of an indexed field."""
+        key = (model_type.__name__, field)
+        values = self._dictionaries[key].values
+        return {values[code]: bits for code, bits in self._bitmaps[key].items()}
+
+    def all_rows_bitmap(self, model_type: Type[T]) -> int:
+        return self._live[model_type.__name__]
+
+    def count_values(self, model_type: Type[T], field: str) -> Dict[Any, int]:
+        """Number of rows per distinct value of an indexed field."""
+        key = (model_type.__name__, field)
+        values = self._dictionaries[key].values
+        return {values[code]: _popcount(bits) for code, bits in self._bitmaps[key].items()}
+
+    def rows_for_bitmap(self, model_type: Type[T], bits: int, start: int = 0,
+                        stop: Optional[int] = None) -> List[T]:
+        """Rows whose bits are set, in db order, optionally sliced like a list."""
+        model_name = model_type.__name__
+        rows = self._data[model_name]
+        slot_ids = self._slot_ids[model_name]
+        selected = []
+        for index, slot in enumerate(iter_bits(bits)):
+            if stop is not None and index >= stop:
+                break
+            if index >= start:
+                selected.append(rows[slot_ids[slot]])
+        return selected
+
+    def _where_bits(self, model_type: Type[T], where: Optional[Where]) -> Tuple[Optional[int], Where]:
+        """Bitmap of rows passing the conditions an index answers, and the conditions left to check per row.
+
+        The bitmap is None when no condition could use an index.
+        """
+        model_name = model_type.__name__
+        bits = None
+        rest = {}
+        for field, condition in (where or {}).items():
+            values = equality_values(condition)
+            if values is not None and field in BITMAP_FIELDS.get(model_name, ()):
+                field_bits = self.bitmap(model_type, field, values)
+            elif field in BITMAP_FIELDS.get(model_name, ()):
+                # Indexed columns hold few distinct values: test each value
+                # once and OR together the bitmaps of those that match
+                field_bits = 0
+                for value, value_bits in self.bitmap_values(model_type, field).items():
+                    if matches(value, condition):
+                        field_bits |= value_bits
+            elif values is not None and field in DICTIONARY_FIELDS.get(model_name, ()) and all(
+                    self._dictionaries[(model_name, field)].code(_plain(value)) is None for value in values):
+                # No row ever held these values
+                field_bits = 0
+            else:
+                rest[field] = _plain(condition)
+                continue
+            bits = field_bits if bits is None else bits & field_bits
+        return bits, rest
+
+    def _filtered(self, model_type: Type[T], where: Optional[Where]) -> Iterable[T]:
+        bits, rest = self._where_bits(model_type, where)
+        if bits is not None:
+            rows = self.rows_for_bitmap(model_type, bits)
+        else:
+            # Start from the foreign key index when a condition is on one
+            key = next((field for field in FOREIGN_KEYS.get(model_type.__name__, ())
+                        if field in rest and not isinstance(rest[field], dict)), None)
+            if key is not None:
+                rows = self.get_by_foreign_key(model_type, key, rest[key])
+            else:
+                rows = self._data[model_type.__name__].values()
+        if not rest:
+            return rows
+        return (row for row in rows if all(matches(getattr(row, field, None), condition)
+                                            for field, condition in rest.items()))
+
+    def select(self, model_type: Type[T], where: Optional[Where] = None, order_by: Optional[str] = None,
+               descending: bool = False, offset: int = 0, limit: Optional[int] = None) -> List[T]:
+        """Rows passing every condition, in db order or sorted by one field, then sliced.
+
+        Conditions on bitmap-indexed fields are answered from the bitmaps;
+        the others are checked row by row.
+        """
+        stop = None if limit is None else offset + limit
+        if order_by is None:
+            bits, rest = self._where_bits(model_type, where)
+            if bits is not None and not rest:
+                # Only decode the rows of the requested page
+                return self.rows_for_bitmap(model_type, bits, offset, stop)
+            return list(islice(self._filtered(model_type, where), offset, stop))
+        # Stable sort, so ties stay in db order either way
+        rows = sorted(self._filtered(model_type, where), key=FieldKey(order_by), reverse=descending)
+        return rows[offset:stop]
+
+    def count(self, model_type: Type[T], where: Optional[Where] = None) -> int:
+        bits, rest = self._where_bits(model_type, where)
+        if not rest:
+            return len(self._data[model_type.__name__]) if bits is None else _popcount(bits)
+        return sum(1 for _ in self._filtered(model_type, where))
+
     def update(self, model_type: Type[T], id: str, **data) -> Optional[T]:
         if id not in self._data[model_type.__name__]:
             return None
@@ -74,9 +432,37 @@ class InMemoryDB:
         data.pop('created_at', None)
 
         model = self._data[model_type.__name__][id]
-        model.update(**data)
+        self._apply_update(model_type.__name__, model, data)
+        self._notify(UPDATED, model_type.__name__, id, model)
         return model
 
+    def bulk_update(self, model_type: Type[T], changes: Dict[str, Dict[str, Any]]) -> List[T]:
+        """Apply {id: data} to many rows, indexing the whole batch before notifying listeners.
+
+        Ids that no longer exist are skipped.
+        """
+        model_name = model_type.__name__
+        table = self._data[model_name]
+        models = []
+        for id, data in changes.items():
+            model = table.get(id)
+            if model is None:
+                continue
+            data = {k: v for k, v in data.items() if k not in ('id', 'created_at')}
+            self._apply_update(model_name, model, data)
+            models.append(model)
+        for model in models:
+            self._notify(UPDATED, model_name, model.id, model)
+        return models
+
+    def _apply_update(self, model_name: str, model: Any, data: Dict[str, Any]) -> None:
+        old_codes = tuple(self._code(model_name, field, model) for field in BITMAP_FIELDS.get(model_name, ()))
+        self._index_remove(model_name, model)
+        model.update(**{k: _plain(v) for k, v in data.items()})
+        self._encode(model_name, [model])
+        self._index_add(model_name, model)
+        self._bitmap_update(model_name, model, old_codes)
+
     def delete(self, model_type: Type[T], id: str) -> bool:
         if id in self._data[model_type.__name__]:
             # Clean up relationships
@@ -93,10 +479,38 @@ class InMemoryDB:
                         rel_data.pop(id, None)
 
             # Delete the model
-            del self._data[model_type.__name__][id]
+            model = self._data[model_type.__name__].pop(id)
+            self._index_remove(model_name, model)
+            self._bitmap_remove(model_name, model)
+            self._notify(DELETED, model_type.__name__, id, model)
             return True
         return False
 
+    def bulk_delete(self, model_type: Type[T], ids: Iterable[str], operation: str = DELETED) -> List[T]:
+        """Delete many rows, cleaning up relationships in one pass before notifying listeners.
+
+        Ids that do not exist are skipped. Listeners and the change log see
+        ``operation``, ARCHIVED for rows moved to the archive.
+        """
+        model_name = model_type.__name__
+        table = self._data[model_name]
+        models = [table[id] for id in dict.fromkeys(ids) if id in table]
+        removed = {model.id for model in models}
+        for rel_name, rel_data in self._relationships.get(model_name, {}).items():
+            if isinstance(rel_data, list):
+                self._relationships[model_name][rel_name] = [r for r in rel_data if r[0] not in removed]
+            elif isinstance(rel_data, dict):
+                for id in removed:
+                    rel_data.pop(id, None)
+        for model in models:
+            # One at a time: removing a bitmap slot may renumber the table's remaining rows
+            del table[model.id]
+            self._index_remove(model_name, model)
+            self._bitmap_remove(model_name, model)
+        for model in models:
+            self._notify(operation, model_name, model.id, model)
+        return models
+
     def add_relationship(self, from_model_type: Type[T], from_id: str,
                         rel_name: str, to_model_type: Type[T], to_id: str) -> bool:
         from_model_name = from_model_type.__name__
@@ -114,9 +528,32 @@ class InMemoryDB:
             self._relationships[from_model_name][rel_name] = []
 
         # Add relationship
-        self._relationships[from_model_name].setdefault(rel_name, []).append((from_id, to_id))
+        rel_data = self._relationships[from_model_name][rel_name]
+        if isinstance(rel_data, dict):
+            # One-to-one relationship
+            rel_data[from_id] = to_id
+        else:
+            rel_data.append((from_id, to_id))
         return True
 
+    def repoint_relationships(self, model_type: Type[T], old_ids: Iterable[str], new_id: str) -> None:
+        """Move relationships from any of old_ids to new_id, e.g. when merging records."""
+        model_name = model_type.__name__
+        old_ids = set(old_ids)
+        # A model's own one-to-many lists, keyed by its id
+        for rel_name, rel_data in self._relationships.get(model_name, {}).items():
+            if isinstance(rel_data, list):
+                self._relationships[model_name][rel_name] = [
+                    (new_id, r[1]) if r[0] in old_ids else r for r in rel_data
+                ]
+        # Other models' one-to-one links to it, named after the model ('lead' -> Lead)
+        for rels in self._relationships.values():
+            rel_data = rels.get(model_name.lower())
+            if isinstance(rel_data, dict):
+                for from_id, to_id in rel_data.items():
+                    if to_id in old_ids:
+                        rel_data[from_id] = new_id
+
     def get_related(self, model_type: Type[T], id: str, rel_name: str) -> List[Any]:
         model_name = model_type.__name__
         if (model_name not in self._relationships or
@@ -171,9 +608,33 @@ class InMemoryDB:
 
         return None
 
+    def memory_structures(self) -> Dict[str, Dict[str, Any]]:
+        """Named in-memory structures, grouped by kind, for memory reporting."""
+        return {
+            'tables': dict(self._data),
+            'indexes': {
+                **{f'{model_name}.{field}': index for (model_name, field), index in self._fk_index.items()},
+                **{f'{model_name}.{field} (bitmap)': bitmaps for (model_name, field), bitmaps in self._bitmaps.items()},
+                **{f'{model_name} (slots)': slots for model_name, slots in self._slots.items()},
+                **{f'{model_name}.{field} (dictionary)': dictionary.codes
+                   for (model_name, field), dictionary in self._dictionaries.items()},
+            },
+            'relationships': {
+                f'{model_name}.{rel_name}': rel_data
+                for model_name, rels in self._relationships.items()
+                for rel_name, rel_data in rels.items()
+            },
+            'logs': {'change_log': self._change_log},
+        }
+
     def clear(self):
         """Clear all data (for testing purposes)"""
         self._init_db()
+        self._reset_changes()
 
 # Create a singleton instance
-db = InMemoryDB()
+if DB_BACKEND == "sqlite":
+    from .sqlite_db import SQLiteDB
+    db: StorageBackend = SQLiteDB(DB_PATH)
+else:
+    db = InMemoryDB()
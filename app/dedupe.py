@@ -0,0 +1,206 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .archive import archive
+from .db import REMOVALS, db
+from .models import Appointment, Lead, Note, Task, Vehicle
+
+# Email domains that ignore dots in the local part
+DOTLESS_EMAIL_DOMAINS = {"gmail.com": "gmail.com", "googlemail.com": "gmail.com"}
+# Titles and suffixes dropped from names before comparing
+NAME_STOPWORDS = {"mr", "mrs", "ms", "miss", "dr", "prof", "jr", "sr", "ii", "iii", "iv", "md", "phd", "dds", "dvm"}
+# Rows that belong to a lead and move to the surviving lead on merge
+CHILD_TYPES = (Task, Note, Appointment, Vehicle)
+# Lead fields filled from a duplicate when the surviving lead has no value
+MERGE_FIELDS = (
+    "email", "phone", "address", "city", "state", "zip", "lead_source", "lead_owner",
+    "lead_stage", "lead_description", "lead_notes", "lead_type",
+)
+
+_EXTENSION = re.compile(r"\s*(x|ext\.?)\s*\d+\s*$", re.IGNORECASE)
+_NON_DIGITS = re.compile(r"\D")
+_NAME_TOKENS = re.compile(r"[a-z]+")
+
+# (kind, normalized value), e.g. ("phone", "5551234567")
+BlockKey = Tuple[str, str]
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    if not email or "@" not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition("@")
+    local = local.split("+", 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace(".", "")
+        domain = DOTLESS_EMAIL_DOMAINS[domain]
+    return f"{local}@{domain}" if local and domain else None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    # Digits only, without extension or country prefix (+1, 001, ...)
+    if not phone:
+        return None
+    digits = _NON_DIGITS.sub("", _EXTENSION.sub("", phone))
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    # Order-insensitive, so "Smith, John" matches "John Smith"
+    tokens = sorted(t for t in _NAME_TOKENS.findall((name or "").lower()) if t not in NAME_STOPWORDS)
+    return " ".join(tokens) or None
+
+
+def blocking_keys(lead: Lead) -> Tuple[BlockKey, ...]:
+    """Keys under which a lead is indexed; leads sharing any key are duplicate candidates."""
+    keys = []
+    email = normalize_email(lead.email)
+    if email:
+        keys.append(("email", email))
+    phone = normalize_phone(lead.phone)
+    if phone:
+        keys.append(("phone", phone))
+    # A name alone is too common to block on; pair it with where the lead lives
+    name = normalize_name(lead.name)
+    locality = (lead.zip or "")[:5] or (lead.city or "").strip().lower()
+    if name and locality:
+        keys.append(("name", f"{name}|{locality}"))
+    return tuple(keys)
+
+
+class DuplicateIndex:
+    """Hash blocking index over normalized lead emails, phones and names.
+
+    Every lead is filed under its blocking keys, and keys shared by two or
+    more leads are tracked separately. Finding duplicates therefore looks only
+    at leads that share a key, never at all pairs. The index is maintained from
+    database change notifications.
+    """
+
+    def __init__(self):
+        self._blocks: Dict[BlockKey, Dict[str, None]] = {}
+        self._keys: Dict[str, Tuple[BlockKey, ...]] = {}
+        # Blocks holding two or more leads, in the order they became shared
+        self._shared: Dict[BlockKey, None] = {}
+        self._source: Any = None
+        self.rebuild()
+        db.add_listener(self.on_change)
+
+    def rebuild(self) -> None:
+        self._blocks = {}
+        self._keys = {}
+        self._shared = {}
+        self._source = db.memory_structures()["tables"]["Lead"]
+        for lead in self._source.values():
+            self._add(lead)
+
+    def _check_source(self) -> None:
+        # db.clear() swaps the tables without notifying listeners
+        if db.memory_structures()["tables"]["Lead"] is not self._source:
+            self.rebuild()
+
+    def _add(self, lead: Lead) -> None:
+        keys = blocking_keys(lead)
+        self._keys[lead.id] = keys
+        for key in keys:
+            ids = self._blocks.setdefault(key, {})
+            ids[lead.id] = None
+            if len(ids) == 2:
+                self._shared[key] = None
+
+    def _remove(self, id: str) -> None:
+        for key in self._keys.pop(id, ()):
+            ids = self._blocks[key]
+            del ids[id]
+            if len(ids) < 2:
+                self._shared.pop(key, None)
+            if not ids:
+                del self._blocks[key]
+
+    def on_change(self, operation: str, model_name: str, id: str, model: Any) -> None:
+        if model_name != "Lead":
+            return
+        self._remove(id)
+        if operation not in REMOVALS:
+            self._add(model)
+
+    def _component(self, lead_id: str, seen: Set[str], walked: Set[BlockKey]) -> Tuple[List[str], Set[str]]:
+        # Leads reachable from lead_id through shared blocks; each block is walked once
+        ids: Dict[str, None] = {lead_id: None}
+        matched_on: Set[str] = set()
+        seen.add(lead_id)
+        stack = [lead_id]
+        while stack:
+            for key in self._keys.get(stack.pop(), ()):
+                if key in walked or key not in self._shared:
+                    continue
+                walked.add(key)
+                matched_on.add(key[0])
+                for other in self._blocks[key]:
+                    if other not in seen:
+                        seen.add(other)
+                        ids[other] = None
+                        stack.append(other)
+        return list(ids), matched_on
+
+    def duplicates_of(self, lead_id: str) -> Tuple[List[str], Set[str]]:
+        """The duplicate group of lead_id (itself first) and the kinds of keys that linked it."""
+        self._check_source()
+        ids, matched_on = self._component(lead_id, set(), set())
+        return (ids, matched_on) if matched_on else ([], matched_on)
+
+    def groups(self, limit: Optional[int] = None) -> List[Tuple[List[str], Set[str]]]:
+        """Groups of duplicate lead ids with the kinds of keys that linked them.
+
+        Leads linked through different keys (A and B share an email, B and C
+        a phone) end up in one group. Only shared blocks are visited, and only
+        until ``limit`` groups are found.
+        """
+        self._check_source()
+        seen: Set[str] = set()
+        walked: Set[BlockKey] = set()
+        groups = []
+        for key in self._shared:
+            if limit is not None and len(groups) >= limit:
+                break
+            if key not in walked:
+                groups.append(self._component(next(iter(self._blocks[key])), seen, walked))
+        return groups
+
+
+def merge_leads(target_id: str, source_ids: Iterable[str]) -> Lead:
+    """Merge duplicate leads into target_id and delete them.
+
+    Tasks, notes, appointments and vehicles are moved to the target,
+    archived ones included, and fields the target lacks are filled from the
+    duplicates, first one first.
+    """
+    target = db.get(Lead, target_id)
+    if target is None:
+        raise ValueError(f"Lead not found: {target_id}")
+    source_ids = [id for id in dict.fromkeys(source_ids) if id != target_id]
+    sources = [db.get(Lead, id) for id in source_ids]
+    missing = [id for id, lead in zip(source_ids, sources) if lead is None]
+    if missing:
+        raise ValueError(f"Lead not found: {', '.join(missing)}")
+
+    fill = {}
+    for field in MERGE_FIELDS:
+        if getattr(target, field) in (None, ""):
+            value = next((getattr(s, field) for s in sources if getattr(s, field) not in (None, "")), None)
+            if value is not None:
+                fill[field] = value
+
+    for child_type in CHILD_TYPES:
+        for source in sources:
+            children = db.get_by_foreign_key(child_type, "lead_id", source.id)
+            db.bulk_update(child_type, {child.id: {"lead_id": target.id} for child in children})
+    db.repoint_relationships(Lead, source_ids, target.id)
+    archive.merge_leads(target.id, source_ids)
+    for source in sources:
+        db.delete(Lead, source.id)
+    if fill:
+        db.update(Lead, target.id, **fill)
+    return target
+
+
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .db import db
+
+# Events queued per subscriber before the oldest ones are dropped
+MAX_QUEUE_SIZE = 1000
+
+
+class ChangeEvent:
+    """A single create/update/delete of a row in the in-memory database.
+
+    ``data`` is a snapshot of the row taken once when the event is published
+    (the last known state for deletes) and shared by every subscriber.
+    """
+
+    __slots__ = ('operation', 'type', 'id', 'data', '_payloads')
+
+    def __init__(self, operation: str, type: str, id: str, data: Dict[str, Any]):
+        self.operation = operation
+        self.type = type
+        self.id = id
+        self.data = data
+        self._payloads: Dict[Any, Any] = {}
+
+    def payload(self, key: Any, build: Callable[['ChangeEvent'], Any]) -> Any:
+        """Build a representation of this event once and reuse it for every subscriber."""
+        if key not in self._payloads:
+            self._payloads[key] = build(self)
+        return self._payloads[key]
+
+
+class _Subscriber:
+    __slots__ = ('predicate', 'queue', 'loop')
+
+    def __init__(self, predicate: Optional[Callable[[ChangeEvent], bool]], loop: asyncio.AbstractEventLoop):
+        self.predicate = predicate
+        self.queue: asyncio.Queue = asyncio.Queue(MAX_QUEUE_SIZE)
+        self.loop = loop
+
+    def put(self, event: ChangeEvent) -> None:
+        if self.queue.full():
+            # Slow consumer: drop the oldest event rather than blocking writers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """Fans out database change events to asyncio subscribers."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[_Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, event: ChangeEvent) -> None:
+        subscribers = self._subscribers.get(event.type)
+        if not subscribers:
+            return
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        for subscriber in list(subscribers):
+            if subscriber.predicate is not None and not subscriber.predicate(event):
+                continue
+            if subscriber.loop is running_loop:
+                subscriber.put(event)
+            elif not subscriber.loop.is_closed():
+                subscriber.loop.call_soon_threadsafe(subscriber.put, event)
+
+    async def subscribe(
+        self,
+        type: str,
+        predicate: Optional[Callable[[ChangeEvent], bool]] = None
+    ) -> AsyncIterator[ChangeEvent]:
+        """Yield events for one model type, optionally filtered by predicate."""
+        subscriber = _Subscriber(predicate, asyncio.get_running_loop())
+        with self._lock:
+            # Copy on write so publish() can iterate without locking
+            self._subscribers[type] = self._subscribers.get(type, []) + [subscriber]
+        try:
+            while True:
+                yield await subscriber.queue.get()
+        finally:
+            with self._lock:
+                self._subscribers[type] = [s for s in self._subscribers.get(type, []) if s is not subscriber]
+
+    def subscriber_count(self, type: Optional[str] = None) -> int:
+        if type is not None:
+            return len(self._subscribers.get(type, []))
+        return sum(len(s) for s in self._subscribers.values())
+
+    def on_change(self, operation: str, model_name: str, id: str, model: Any) -> None:
+        # Skip the snapshot entirely when nobody is listening
+        if not self._subscribers.get(model_name):
+            return
+        self.publish(ChangeEvent(operation, model_name, id, model.to_dict()))
+
+
+# Create a singleton instance fed by every InMemoryDB mutation
+event_bus = EventBus()
+db.add_listener(event_bus.on_change)
@@ -0,0 +1,86 @@
+import zlib
+from typing import Any, Dict, Iterator
+
+from .archive import archive
+from .db import db
+from .models import Lead, Task, Note, Appointment, Vehicle
+from .router import dumps
+
+# Encoded lines are buffered up to this many bytes before being sent
+CHUNK_SIZE = 64 * 1024
+
+
+def _under_other_task(note: Note, lead_id: str, include_archived: bool) -> bool:
+    # The note's task is exported in another lead's record, so the note goes there
+    task = db.get(Task, note.task_id)
+    if task is None and include_archived:
+        task = archive.get(Task, note.task_id)
+    return task is not None and task.lead_id != lead_id and db.get(Lead, task.lead_id) is not None
+
+
+def lead_record(lead: Lead, include_archived: bool = False) -> Dict[str, Any]:
+    """Build the export record for one lead with its child rows.
+
+    Each note is written once: under its task when the task is exported,
+    otherwise under the lead. Archived tasks and appointments are only
+    included with ``include_archived``.
+    """
+    record = lead.to_dict()
+
+    tasks = db.get_by_foreign_key(Task, 'lead_id', lead.id)
+    appointments = db.get_by_foreign_key(Appointment, 'lead_id', lead.id)
+    if include_archived:
+        tasks = tasks + archive.get_by_lead(Task, lead.id)
+        appointments = appointments + archive.get_by_lead(Appointment, lead.id)
+
+    task_records = []
+    for task in tasks:
+        task_record = task.to_dict()
+        task_record['notes'] = [n.to_dict() for n in db.get_by_foreign_key(Note, 'task_id', task.id)]
+        task_records.append(task_record)
+    task_ids = {task.id for task in tasks}
+
+    record['tasks'] = task_records
+    record['notes'] = [
+        n.to_dict() for n in db.get_by_foreign_key(Note, 'lead_id', lead.id)
+        if n.task_id is None or (n.task_id not in task_ids and not _under_other_task(n, lead.id, include_archived))
+    ]
+    record['appointments'] = [a.to_dict() for a in appointments]
+    record['vehicles'] = [v.to_dict() for v in db.get_by_foreign_key(Vehicle, 'lead_id', lead.id)]
+    return record
+
+
+def iter_lead_lines(include_archived: bool = False) -> Iterator[bytes]:
+    """Yield one NDJSON line per lead."""
+    for lead in db.iter_all(Lead):
+        yield dumps(lead_record(lead, include_archived)) + b"\n"
+
+
+def iter_chunks(lines: Iterator[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Group small lines into chunks of roughly chunk_size bytes."""
+    buffer = bytearray()
+    for line in lines:
+        buffer += line
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_gzip(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a stream of chunks into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_leads(gzip: bool = False, include_archived: bool = False) -> Iterator[bytes]:
+    """Stream all leads with their tasks, notes, appointments and vehicles as NDJSON."""
+    chunks = iter_chunks(iter_lead_lines(include_archived))
+    if gzip:
+        return iter_gzip(chunks)
+    return chunks
@@ -0,0 +1,282 @@
+import csv
+import dataclasses
+import os
+import time
+import typing
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type, Union
+
+from .db import db
+from .models import Lead, Task, Note, Appointment, Vehicle
+from .router import loads
+from .schema.types import LeadInput, TaskInput, NoteInput, AppointmentInput, VehicleInput
+
+# Only the first errors are reported; the rest are counted
+MAX_REPORTED_ERRORS = 1000
+DEFAULT_BATCH_SIZE = 1000
+# Longest accepted line (or quoted CSV record); longer ones are skipped as row errors
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+
+
+class ImportTarget:
+    def __init__(self, input_type: type, model_type: type, relationships: Tuple[Tuple[str, str, type], ...] = ()):
+        self.input_type = input_type
+        self.model_type = model_type
+        # (foreign key field, relationship name, related model)
+        self.relationships = relationships
+        self.fields = {f.name: f for f in dataclasses.fields(input_type)}
+        self.hints = typing.get_type_hints(input_type)
+
+
+# Relationships mirror what the create_* mutations set up
+IMPORT_TARGETS: Dict[str, ImportTarget] = {
+    'leads': ImportTarget(LeadInput, Lead),
+    'tasks': ImportTarget(TaskInput, Task, (('lead_id', 'lead', Lead),)),
+    'notes': ImportTarget(NoteInput, Note, (('lead_id', 'lead', Lead), ('task_id', 'task', Task))),
+    'appointments': ImportTarget(AppointmentInput, Appointment, (('lead_id', 'lead', Lead),)),
+    'vehicles': ImportTarget(VehicleInput, Vehicle, (('lead_id', 'lead', Lead),)),
+}
+
+
+class ImportFormatError(ValueError):
+    """Raised when the input cannot be parsed at all (as opposed to a bad row)."""
+
+
+def _coerce(hint: Any, value: Any) -> Any:
+    # Unwrap Optional[...]
+    if typing.get_origin(hint) is typing.Union:
+        hint = next(a for a in typing.get_args(hint) if a is not type(None))
+
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        if isinstance(value, hint):
+            return value
+        try:
+            return hint(value)
+        except ValueError:
+            # Accept member names as well as values (e.g. TOYOTA or Toyota)
+            try:
+                return hint[str(value).upper()]
+            except KeyError:
+                allowed = ', '.join(str(m.value) for m in hint)
+                raise ValueError(f"'{value}' is not one of {allowed}") from None
+    if hint is int:
+        if isinstance(value, bool):
+            raise ValueError(f"'{value}' is not an integer")
+        return int(value)
+    if hint is str:
+        return str(value)
+    return value
+
+
+def validate_row(target: ImportTarget, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a raw row against the input type and return model data."""
+    values = {}
+    for name, value in row.items():
+        if name not in target.fields:
+            raise ValueError(f"unknown field '{name}'")
+        # Empty CSV cells mean "not provided"
+        if value is None or value == '':
+            continue
+        try:
+            values[name] = _coerce(target.hints[name], value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{name}: {e}") from None
+
+    missing = [
+        name for name, f in target.fields.items()
+        if name not in values
+        and f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING
+    ]
+    if missing:
+        raise ValueError(f"missing required field(s): {', '.join(missing)}")
+
+    for field, _, related_type in target.relationships:
+        related_id = values.get(field)
+        if related_id is not None and db.get(related_type, related_id) is None:
+            raise ValueError(f"{field}: {related_type.__name__} '{related_id}' does not exist")
+
+    data = target.input_type(**values).__dict__.copy()
+    return data
+
+
+def _decode_line(line: bytes, encoding: str) -> Union[str, ValueError]:
+    try:
+        return line.decode(encoding).rstrip('\r')
+    except UnicodeDecodeError as e:
+        return ValueError(f"not valid UTF-8 (byte {e.start})")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes],
+                     max_line_bytes: int = IMPORT_MAX_LINE_BYTES) -> AsyncIterator[Union[str, ValueError]]:
+    """Split a byte stream into text lines without buffering the whole body.
+
+    Each line is decoded on its own, so a line that isn't valid UTF-8 comes
+    out as a ValueError for that row instead of failing the whole import.
+    So does a line longer than ``max_line_bytes``, which is skipped rather
+    than buffered. A leading byte order mark is dropped.
+    """
+    too_long = f"line longer than {max_line_bytes} bytes"
+    # Splitting before decoding is safe: b'\n' never occurs inside a UTF-8 sequence
+    encoding = 'utf-8-sig'
+    pending = bytearray()
+    # Set while dropping the rest of an overlong line
+    skipping = False
+    async for chunk in chunks:
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b'\n', start)
+            if end < 0:
+                break
+            if skipping or end - start > max_line_bytes:
+                yield ValueError(too_long)
+            else:
+                yield _decode_line(bytes(pending[start:end]), encoding)
+            skipping = False
+            encoding = 'utf-8'
+            start = end + 1
+        del pending[:start]
+        if len(pending) > max_line_bytes:
+            skipping = True
+            pending.clear()
+    if skipping or len(pending) > max_line_bytes:
+        yield ValueError(too_long)
+    elif pending:
+        yield _decode_line(bytes(pending), encoding)
+
+
+async def iter_ndjson(lines: AsyncIterator[Union[str, ValueError]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (row number, parsed object or exception) for each non-blank line."""
+    row_number = 0
+    async for line in lines:
+        if isinstance(line, ValueError):
+            row_number += 1
+            yield row_number, line
+            continue
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            yield row_number, row
+        except ValueError as e:
+            yield row_number, ValueError(f"invalid JSON: {e}")
+
+
+async def iter_csv(lines: AsyncIterator[Union[str, ValueError]], target: ImportTarget) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (row number, dict) for each CSV record, allowing quoted newlines."""
+    header: Optional[List[str]] = None
+    record = ''
+    row_number = 0
+    async for line in lines:
+        if isinstance(line, ValueError):
+            if header is None:
+                raise ImportFormatError(f"header: {line}")
+            # The undecodable line fails the record it belongs to
+            record = ''
+            row_number += 1
+            yield row_number, line
+            continue
+        record = f"{record}\n{line}" if record else line
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            if len(record) > IMPORT_MAX_LINE_BYTES:
+                if header is None:
+                    raise ImportFormatError("header: unterminated quoted field")
+                record = ''
+                row_number += 1
+                yield row_number, ValueError(f"quoted field longer than {IMPORT_MAX_LINE_BYTES} characters")
+            continue
+        if not record.strip():
+            record = ''
+            continue
+
+        values = next(csv.reader([record]))
+        record = ''
+
+        if header is None:
+            header = [h.strip() for h in values]
+            unknown = [h for h in header if h not in target.fields]
+            if unknown:
+                raise ImportFormatError(f"unknown column(s): {', '.join(unknown)}")
+            continue
+
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, ValueError(f"expected {len(header)} columns, got {len(values)}")
+        else:
+            yield row_number, dict(zip(header, values))
+
+    if record:
+        row_number += 1
+        yield row_number, ValueError("unterminated quoted field")
+
+
+def _commit(target: ImportTarget, batch: List[Dict[str, Any]]) -> None:
+    models = db.bulk_create(target.model_type, batch)
+    for field, rel_name, related_type in target.relationships:
+        db.add_relationships(
+            target.model_type, rel_name, related_type,
+            ((m.id, getattr(m, field)) for m in models if getattr(m, field, None))
+        )
+
+
+async def import_rows(
+        entity: str,
+        chunks: AsyncIterator[bytes],
+        format: str,
+        batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, Any]:
+    """Parse, validate and commit rows from a CSV or NDJSON byte stream in batches."""
+    target = IMPORT_TARGETS.get(entity)
+    if target is None:
+        raise ImportFormatError(f"unknown entity '{entity}', expected one of {', '.join(IMPORT_TARGETS)}")
+    if format not in ('csv', 'ndjson'):
+        raise ImportFormatError(f"unsupported format '{format}', expected csv or ndjson")
+    batch_size = max(1, batch_size)
+
+    started = time.perf_counter()
+    lines = iter_lines(chunks)
+    records = iter_csv(lines, target) if format == 'csv' else iter_ndjson(lines)
+
+    rows = created = failed = batches = 0
+    errors: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+
+    async for row_number, row in records:
+        rows += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append(validate_row(target, row))
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': row_number, 'error': str(e)})
+            continue
+
+        if len(batch) >= batch_size:
+            _commit(target, batch)
+            created += len(batch)
+            batches += 1
+            batch = []
+
+    if batch:
+        _commit(target, batch)
+        created += len(batch)
+        batches += 1
+
+    elapsed = time.perf_counter() - started
+    return {
+        'entity': entity,
+        'rows': rows,
+        'created': created,
+        'failed': failed,
+        'batches': batches,
+        'errors': errors,
+        'errors_truncated': failed > len(errors),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
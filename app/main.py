@@ -1,12 +1,34 @@
 import os
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from strawberry.fastapi import GraphQLRouter
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import uvicorn
 
 # Import our schema
 from .schema.schema import schema
-from .seed_data import seed_database
+from .schema.loaders import get_context
+from .router import FastGraphQLRouter
+from .db import db
+from .models import Lead
+from .admission import AdmissionController, ADMISSION_CONTROL
+from .metrics import registry
+from .watchdog import LOOP_WATCHDOG, watchdog
+from .scheduler import REMINDER_DISPATCH, scheduler
+from .scoring import LEAD_SCORING_INTERVAL, scorer
+from .archive import archive
+from .memory import (
+    DEFAULT_SAMPLE_SIZE,
+    TRACEMALLOC_FRAMES,
+    TracemallocError,
+    compare_snapshots,
+    memory_report,
+    start_tracing,
+    stop_tracing,
+    take_snapshot,
+)
+from .export import export_leads
+from .importer import import_rows, ImportFormatError, DEFAULT_BATCH_SIZE
 
 # Create the FastAPI app
 app = FastAPI(
@@ -15,6 +37,9 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# Set by the pre-fork server (app/prefork.py), which loads the data before forking workers
+app.state.preloaded = False
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -24,22 +49,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bound concurrent GraphQL executions and shed load with 503 when the queue backs up
+admission = AdmissionController() if ADMISSION_CONTROL else None
+
 # Add GraphQL endpoint
-graphql_app = GraphQLRouter(schema, graphiql=True)
+graphql_app = FastGraphQLRouter(schema, graphiql=True, context_getter=get_context, admission=admission)
 app.include_router(graphql_app, prefix="/graphql", tags=["GraphQL"])
 
 # Seed the database with sample data on startup
 @app.on_event("startup")
 async def startup_event():
-    if os.getenv("ENV") != "production":
+    # Only into an empty database: seeding clears it, and a SQLite file keeps its rows across restarts
+    if os.getenv("ENV") != "production" and not app.state.preloaded and db.count(Lead) == 0:
+        # Imported here so production start-up doesn't pay for Faker
+        from .seed_data import seed_database
         seed_database()
         print("Database seeded with sample data")
+    # Log and count requests that block the event loop
+    if LOOP_WATCHDOG:
+        watchdog.start()
+    # Publish appointment reminders as they fall due
+    if REMINDER_DISPATCH:
+        scheduler.start()
+    # Score every lead, then re-score changed ones periodically
+    if LEAD_SCORING_INTERVAL > 0:
+        scorer.start()
+    # Move old closed tasks and past appointments to the on-disk archive
+    if archive.enabled:
+        archive.start()
+
+# Stop background work: the watchdog, reminder, scoring and archive loops
+@app.on_event("shutdown")
+async def shutdown_event():
+    watchdog.stop()
+    await scheduler.stop()
+    await scorer.stop()
+    await archive.stop()
+    archive.close()
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+# Prometheus metrics (admission queue depth, shed counts, ...)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Debug endpoints are on outside production unless DEBUG_ENDPOINTS says otherwise
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false" if os.getenv("ENV") == "production" else "true").lower() == "true"
+
+if DEBUG_ENDPOINTS:
+    # Row counts and estimated deep sizes of tables, indexes, relationships and caches.
+    # Runs on the event loop so no mutation can change the structures mid-walk.
+    @app.get("/debug/memory", tags=["Debug"])
+    async def debug_memory(sample: int = DEFAULT_SAMPLE_SIZE):
+        return memory_report(sample=sample)
+
+    # Event loop lag and the most recent stalls, with their operation, resolver path and stack
+    @app.get("/debug/event-loop", tags=["Debug"])
+    async def debug_event_loop():
+        return watchdog.report()
+
+    @app.post("/debug/memory/tracemalloc/start", tags=["Debug"])
+    async def debug_tracemalloc_start(frames: int = TRACEMALLOC_FRAMES):
+        return start_tracing(frames)
+
+    @app.post("/debug/memory/tracemalloc/stop", tags=["Debug"])
+    async def debug_tracemalloc_stop():
+        return stop_tracing()
+
+    @app.post("/debug/memory/snapshots", tags=["Debug"])
+    async def debug_take_snapshot(name: Optional[str] = None):
+        try:
+            return take_snapshot(name)
+        except TracemallocError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Diff two snapshots, or a snapshot against the current allocations when target is omitted
+    @app.get("/debug/memory/snapshots/diff", tags=["Debug"])
+    async def debug_compare_snapshots(base: str, target: Optional[str] = None, group_by: str = "lineno", limit: int = 20):
+        try:
+            return compare_snapshots(base, target, group_by, limit)
+        except TracemallocError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+# Streaming export of every lead with its related rows, one JSON object per line
+@app.get("/export/leads.ndjson", tags=["Export"])
+def export_leads_ndjson(gzip: bool = False, include_archived: bool = False):
+    filename = "leads.ndjson.gz" if gzip else "leads.ndjson"
+    return StreamingResponse(
+        export_leads(gzip=gzip, include_archived=include_archived),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Streaming bulk import of CSV or NDJSON rows, committed in batches
+@app.post("/import/{entity}", tags=["Import"])
+async def import_entity(
+    entity: str,
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+):
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    try:
+        return await import_rows(entity, request.stream(), format, batch_size)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # For local development
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
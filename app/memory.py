@@ -0,0 +1,258 @@
+import gc
+import itertools
+import os
+import resource
+import sys
+import tracemalloc
+from collections import OrderedDict
+from enum import Enum
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, Iterable, Optional, Set
+
+from .db import db
+from .router import normalize_document, parse_document
+from .schema.schema import schema
+
+# Rows measured per table before the size is extrapolated
+DEFAULT_SAMPLE_SIZE = int(os.getenv("MEMORY_SAMPLE_SIZE", "1000"))
+# Frames kept per allocation traceback when tracing is started on demand
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+# Named snapshots kept for diffing; the oldest is dropped beyond this
+MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "10"))
+
+# Shared, immutable objects that shouldn't be attributed to any one structure
+_SKIP_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, Enum)
+
+# Allocations made by the tracer itself or during imports
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+
+
+class TracemallocError(Exception):
+    pass
+
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """Approximate bytes held by obj and everything it references.
+
+    Objects whose id is already in ``seen`` are not counted again, so passing
+    one set across several calls attributes shared objects (e.g. id strings
+    used both as row keys and index entries) to the first structure measured.
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            attributes = getattr(current, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(current).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(current, name):
+                        stack.append(getattr(current, name))
+    return size
+
+
+def _entries(structure: Any) -> int:
+    # Indexes map value -> ids; count the ids rather than the distinct values
+    if isinstance(structure, dict) and structure and isinstance(next(iter(structure.values())), dict):
+        return sum(len(ids) for ids in structure.values())
+    return len(structure)
+
+
+def _table_size(rows: Dict[str, Any], sample: int, seen: Set[int]) -> Dict[str, Any]:
+    if not isinstance(rows, dict):
+        # Rows read from disk on access (the SQLite backend) hold no memory
+        return {"rows": len(rows), "bytes": 0, "sampled": False}
+    seen.add(id(rows))
+    size = sys.getsizeof(rows)
+    measured = itertools.islice(rows.items(), sample) if sample else rows.items()
+    count = 0
+    rows_size = 0
+    for key, row in measured:
+        rows_size += deep_sizeof(key, seen) + deep_sizeof(row, seen)
+        count += 1
+    sampled = count < len(rows)
+    if sampled:
+        rows_size = rows_size * len(rows) // count
+    return {"rows": len(rows), "bytes": size + rows_size, "sampled": sampled}
+
+
+def _cache_info(cached: Any) -> Dict[str, Any]:
+    info = cached.cache_info()
+    return {"entries": info.currsize, "maxsize": info.maxsize, "hits": info.hits, "misses": info.misses}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Entry counts and hit rates of the GraphQL document caches."""
+    caches = {
+        "router.parse_document": _cache_info(parse_document),
+        "router.normalize_document": _cache_info(normalize_document),
+    }
+    for extension in schema.extensions:
+        for name, value in vars(extension).items():
+            if hasattr(value, "cache_info"):
+                caches[f"schema.{type(extension).__name__}"] = _cache_info(value)
+    return caches
+
+
+def process_stats() -> Dict[str, Any]:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_bytes = peak if sys.platform == "darwin" else peak * 1024
+    rss_bytes = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss_bytes = int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        pass
+    return {
+        "rss_bytes": rss_bytes,
+        "peak_rss_bytes": peak_bytes,
+        "gc_objects": len(gc.get_objects()),
+        "gc_frozen_objects": gc.get_freeze_count(),
+        **shared_memory_stats(),
+    }
+
+
+def shared_memory_stats() -> Dict[str, int]:
+    """Resident memory shared with other processes (e.g. forked workers) vs private to this one.
+
+    PSS splits each shared page evenly between the processes mapping it, so
+    summing it over workers gives their real total. Empty where
+    /proc/self/smaps_rollup is not available.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError:
+        return {}
+    return {
+        "pss_bytes": fields.get("Pss", 0),
+        "shared_bytes": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_bytes": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def memory_report(sample: int = DEFAULT_SAMPLE_SIZE) -> Dict[str, Any]:
+    """Row counts and estimated deep sizes of every table, index, relationship and cache.
+
+    Tables larger than ``sample`` rows are measured on their first ``sample``
+    rows and extrapolated; pass 0 to measure every row. Objects shared between
+    structures are counted once, under the first one listed here.
+    """
+    seen: Set[int] = set()
+    structures = db.memory_structures()
+    report: Dict[str, Any] = {"process": process_stats()}
+    total = 0
+
+    report["tables"] = {}
+    for name, rows in structures["tables"].items():
+        report["tables"][name] = _table_size(rows, sample, seen)
+        total += report["tables"][name]["bytes"]
+
+    for kind in ("indexes", "relationships", "logs"):
+        report[kind] = {}
+        for name, structure in structures[kind].items():
+            size = deep_sizeof(structure, seen)
+            report[kind][name] = {"entries": _entries(structure), "bytes": size}
+            total += size
+
+    report["caches"] = cache_stats()
+    report["total_bytes"] = total
+    report["tracemalloc"] = tracing_status()
+    return report
+
+
+def tracing_status() -> Dict[str, Any]:
+    status: Dict[str, Any] = {"tracing": tracemalloc.is_tracing(), "snapshots": list(_snapshots)}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        status.update(frames=tracemalloc.get_traceback_limit(), traced_bytes=current, peak_traced_bytes=peak)
+    return status
+
+
+def start_tracing(frames: int = TRACEMALLOC_FRAMES) -> Dict[str, Any]:
+    """Start tracemalloc; only allocations made from now on are tracked."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return tracing_status()
+
+
+def stop_tracing() -> Dict[str, Any]:
+    tracemalloc.stop()
+    _snapshots.clear()
+    return tracing_status()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    if not tracemalloc.is_tracing():
+        raise TracemallocError("tracemalloc is not tracing; start it first")
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def take_snapshot(name: Optional[str] = None) -> Dict[str, Any]:
+    """Take and keep a named snapshot to diff against later."""
+    snapshot = _snapshot()
+    name = name or f"snapshot-{len(_snapshots) + 1}"
+    _snapshots.pop(name, None)
+    _snapshots[name] = snapshot
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.popitem(last=False)
+    return {"name": name, "traced_bytes": sum(stat.size for stat in snapshot.statistics("filename"))}
+
+
+def _format_traceback(frames: Iterable[tracemalloc.Frame]) -> list:
+    return [f"{frame.filename}:{frame.lineno}" for frame in frames]
+
+
+def compare_snapshots(base: str, target: Optional[str] = None, group_by: str = "lineno",
+                      limit: int = 20) -> Dict[str, Any]:
+    """Top allocation differences from snapshot ``base`` to ``target`` (or to now)."""
+    if group_by not in ("filename", "lineno", "traceback"):
+        raise TracemallocError("group_by must be filename, lineno or traceback")
+    if base not in _snapshots:
+        raise TracemallocError(f"Unknown snapshot: {base}")
+    if target is not None and target not in _snapshots:
+        raise TracemallocError(f"Unknown snapshot: {target}")
+
+    new = _snapshots[target] if target is not None else _snapshot()
+    stats = new.compare_to(_snapshots[base], group_by)
+    return {
+        "base": base,
+        "target": target or "now",
+        "size_diff": sum(stat.size_diff for stat in stats),
+        "count_diff": sum(stat.count_diff for stat in stats),
+        "top": [
+            {
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+                "traceback": _format_traceback(stat.traceback),
+            }
+            for stat in stats[:limit]
+        ],
+    }
@@ -0,0 +1,115 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Label values in the order of the metric's label names
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self._callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        if self._callback is not None:
+            return [(self.name, (), float(self._callback()))]
+        return super().samples()
+
+
+class Summary(_Metric):
+    """Tracks count and sum of observations (e.g. seconds waited)."""
+
+    type = 'summary'
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key + ('count',)] = self._values.get(key + ('count',), 0.0) + 1
+            self._values[key + ('sum',)] = self._values.get(key + ('sum',), 0.0) + value
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [(f'{self.name}_{key[-1]}', key[:-1], value) for key, value in self._values.items()]
+
+
+class Registry:
+    """In-process metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        # Modules may be imported more than once (e.g. with reload); reuse the metric
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, help, labels, callback))
+
+    def summary(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Summary:
+        return self._register(Summary(name, help, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, label_values, value in metric.samples():
+                if label_values:
+                    labels = ','.join(f'{label}="{v}"' for label, v in zip(metric.labels, label_values))
+                    lines.append(f'{name}{{{labels}}} {value:g}')
+                else:
+                    lines.append(f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+# Create a singleton registry served at /metrics
+registry = Registry()
@@ -0,0 +1,190 @@
+"""Pre-fork server: load the data once, then fork workers that share it.
+
+The parent imports the app and loads the dataset with the garbage collector
+off. It then moves every object into the permanent generation with
+gc.freeze() and forks the workers. Collections in a worker never traverse
+the loaded rows, so it doesn't write to their pages. The pages stay shared
+copy-on-write between all workers instead of being copied into each.
+
+Each worker holds its own copy of the data as of the fork, so writes made
+through one worker are not seen by the others. This mode is for read-mostly
+deployments, needs the memory backend and doesn't archive (archived
+segments already on disk are still read).
+
+Usage: python -m app.prefork
+"""
+import gc
+import gzip
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List
+
+import uvicorn
+
+from .archive import archive
+from .db import DB_BACKEND, db
+from .importer import DEFAULT_BATCH_SIZE, IMPORT_TARGETS
+from .memory import process_stats
+from .models import Lead
+from .router import loads
+
+# Worker processes forked after loading
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", str(os.cpu_count() or 1)))
+# Export file (/export/leads.ndjson, optionally .gz) loaded before forking;
+# empty seeds sample data outside production
+PREFORK_SNAPSHOT = os.getenv("PREFORK_SNAPSHOT", "")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+# Entities of an export record, in the order they are created
+SNAPSHOT_ENTITIES = ("leads", "tasks", "notes", "appointments", "vehicles")
+
+_MB = 1024 * 1024
+
+
+def _commit_snapshot(batch: Dict[str, Dict[str, Any]]) -> None:
+    for entity in SNAPSHOT_ENTITIES:
+        rows = batch[entity]
+        if not rows:
+            continue
+        target = IMPORT_TARGETS[entity]
+        models = db.bulk_create(target.model_type, rows.values())
+        for field, rel_name, related_type in target.relationships:
+            db.add_relationships(
+                target.model_type, rel_name, related_type,
+                ((m.id, getattr(m, field)) for m in models if getattr(m, field, None))
+            )
+        rows.clear()
+
+
+def load_snapshot(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Load leads with their child rows from an export file; returns the number of leads."""
+    batch: Dict[str, Dict[str, Any]] = {entity: {} for entity in SNAPSHOT_ENTITIES}
+    leads = 0
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = loads(line)
+            # Notes on a task are listed under the task
+            for task in record.get("tasks", ()):
+                for note in task.pop("notes", ()):
+                    batch["notes"][note["id"]] = note
+            for entity in SNAPSHOT_ENTITIES[1:]:
+                for row in record.pop(entity, ()):
+                    batch[entity][row["id"]] = row
+            batch["leads"][record["id"]] = record
+            leads += 1
+            if len(batch["leads"]) >= batch_size:
+                _commit_snapshot(batch)
+    _commit_snapshot(batch)
+    return leads
+
+
+def load() -> None:
+    """Load the dataset and everything derived from it in the parent."""
+    if PREFORK_SNAPSHOT:
+        started = time.perf_counter()
+        leads = load_snapshot(PREFORK_SNAPSHOT)
+        print(f"Loaded {leads} leads from {PREFORK_SNAPSHOT} in {time.perf_counter() - started:.1f}s")
+    elif os.getenv("ENV") != "production" and db.count(Lead) == 0:
+        from .seed_data import seed_database
+        seed_database()
+        print("Database seeded with sample data")
+
+    from .scoring import LEAD_SCORING_INTERVAL, scorer
+    if LEAD_SCORING_INTERVAL > 0:
+        # Score once here; otherwise every worker's first run rewrites every lead
+        scorer.run(full=True)
+
+
+def _mb(stats: Dict[str, Any], key: str) -> str:
+    value = stats.get(key)
+    return "n/a" if value is None else f"{value / _MB:.1f} MB"
+
+
+async def report_worker_memory() -> None:
+    stats = process_stats()
+    print(
+        f"Worker {os.getpid()}: RSS {_mb(stats, 'rss_bytes')}, shared {_mb(stats, 'shared_bytes')}, "
+        f"private {_mb(stats, 'private_bytes')}, PSS {_mb(stats, 'pss_bytes')}, "
+        f"frozen objects {stats['gc_frozen_objects']}",
+        flush=True,
+    )
+
+
+def _exit_code(status: int) -> int:
+    # os.waitstatus_to_exitcode() needs Python 3.9; a signal is reported negated, as there
+    return -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+
+def _run_worker(config: uvicorn.Config, sock: Any) -> None:
+    # Only objects allocated from here on are collected
+    gc.enable()
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def serve(workers: int = PREFORK_WORKERS, host: str = HOST, port: int = PORT) -> None:
+    if DB_BACKEND != "memory":
+        # Workers would inherit the parent's SQLite connection, which must not
+        # be used across fork(), and each worker's side indexes (calendar,
+        # due dates, scores) would miss the rows the others write
+        raise SystemExit("app.prefork needs DB_BACKEND=memory")
+    # No collections while loading: they would only traverse the growing,
+    # long-lived heap again and again
+    gc.disable()
+    from .main import app
+
+    load()
+    # Map the existing segments once, shared by every worker
+    archive.writable = False
+    archive.open()
+    # The workers must not load or seed again
+    app.state.preloaded = True
+    app.router.add_event_handler("startup", report_worker_memory)
+
+    config = uvicorn.Config(app, host=host, port=port)
+    sock = config.bind_socket()
+
+    gc.collect()
+    gc.freeze()
+    stats = process_stats()
+    print(f"Parent {os.getpid()}: RSS {_mb(stats, 'rss_bytes')}, "
+          f"frozen objects {stats['gc_frozen_objects']}; forking {workers} workers", flush=True)
+
+    children: List[int] = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children.append(pid)
+
+    def forward(signum: int, frame: Any) -> None:
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.remove(pid)
+        if status:
+            print(f"Worker {pid} exited with status {_exit_code(status)}", file=sys.stderr)
+    sock.close()
+
+
+if __name__ == "__main__":
+    serve()
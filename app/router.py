@@ -0,0 +1,370 @@
+import asyncio
+import contextlib
+import functools
+import gzip
+import json
+import os
+from typing import Any, AsyncContextManager, Dict, List, Optional, Union
+
+from graphql import DocumentNode, GraphQLError, OperationDefinitionNode, OperationType, parse, print_ast
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from strawberry import UNSET
+from strawberry.fastapi import GraphQLRouter
+from strawberry.fastapi.handlers import GraphQLTransportWSHandler, GraphQLWSHandler
+from strawberry.http import GraphQLHTTPResponse, process_result
+from strawberry.types import ExecutionResult
+
+from .admission import AdmissionController, Overloaded, cost_priority, query_cost
+from .schema.incremental import IncrementalState, has_incremental_directives
+from .schema.loaders import with_fresh_loaders
+from .singleflight import SingleFlight
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("GRAPHQL_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GRAPHQL_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("GRAPHQL_BROTLI_QUALITY", "4"))
+# Maximum number of operations in one batched POST
+MAX_BATCH_SIZE = int(os.getenv("GRAPHQL_MAX_BATCH_SIZE", "20"))
+# Share one execution between identical concurrent queries
+COALESCE_QUERIES = os.getenv("GRAPHQL_COALESCE_QUERIES", "true").lower() == "true"
+# Request headers that identify the caller; part of the coalescing key
+AUTH_HEADERS = ("authorization", "cookie")
+# Incremental delivery: parts of a multipart/mixed response, boundary "-"
+MULTIPART_BOUNDARY = b"\r\n---"
+MULTIPART_PART_HEADERS = b"\r\nContent-Type: application/json; charset=utf-8\r\n\r\n"
+MULTIPART_END = b"\r\n-----\r\n"
+
+
+def dumps(data: Any) -> bytes:
+    """Encode data as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=1000)
+def parse_document(query: str) -> Optional[DocumentNode]:
+    try:
+        return parse(query)
+    except GraphQLError:
+        return None
+
+
+@functools.lru_cache(maxsize=1000)
+def normalize_document(query: str) -> Optional[str]:
+    """Canonical text of a query, ignoring whitespace, commas and comments."""
+    document = parse_document(query)
+    return print_ast(document) if document is not None else None
+
+
+def operation_type(query: Optional[str], operation_name: Optional[str] = None) -> Optional[OperationType]:
+    """Return the type of the operation that would run, or None if it can't be determined."""
+    document = parse_document(query) if query else None
+    if document is None:
+        return None
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    for operation in operations:
+        if operation_name is None or (operation.name and operation.name.value == operation_name):
+            return operation.operation
+    return None
+
+
+def compress(body: bytes, accept_encoding: str) -> Optional[tuple]:
+    """Compress body for the client, returning (encoding, payload) or None."""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return None
+
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br", brotli.compress(body, quality=BROTLI_QUALITY)
+    if "gzip" in accepted:
+        return "gzip", gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return None
+
+
+class JSONBytesResponse(Response):
+    """Response for pre-encoded JSON bytes, compressed at send time.
+
+    The body is passed through to the ASGI server as-is, and is only replaced
+    when the client accepts gzip/brotli and the body is above the threshold.
+    """
+
+    media_type = "application/json"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if "content-encoding" not in self.headers:
+            compressed = compress(self.body, Headers(scope=scope).get("accept-encoding", ""))
+            if compressed is not None:
+                encoding, self.body = compressed
+                self.headers["content-encoding"] = encoding
+                self.headers["content-length"] = str(len(self.body))
+            self.headers.add_vary_header("Accept-Encoding")
+        await super().__call__(scope, receive, send)
+
+
+class TransportWSHandler(GraphQLTransportWSHandler):
+    """graphql-transport-ws handler giving each operation its own loaders."""
+
+    async def get_context(self) -> Any:
+        return with_fresh_loaders(await super().get_context())
+
+
+class WSHandler(GraphQLWSHandler):
+    """graphql-ws handler giving each operation its own loaders."""
+
+    async def get_context(self) -> Any:
+        return with_fresh_loaders(await super().get_context())
+
+
+class FastGraphQLRouter(GraphQLRouter):
+    """GraphQLRouter that encodes with orjson (when installed) and compresses large responses.
+
+    POST bodies holding a JSON array of operations are executed as one batch
+    and answered with an array of results in the same order.
+
+    Identical read-only POSTs that arrive while one of them is executing share
+    that execution and its encoded response (see SingleFlight).
+
+    With an AdmissionController, executions wait for a slot in priority order
+    and are answered with 503 and Retry-After when shed.
+
+    Queries using @defer/@stream from clients that accept multipart/mixed get
+    the initial result first and each deferred fragment or streamed batch as
+    a later part (see IncrementalExecutionContext).
+
+    Websocket operations each get a fresh copy of the connection's context,
+    so loaders never outlive the operation that filled them.
+    """
+
+    graphql_transport_ws_handler_class = TransportWSHandler
+    graphql_ws_handler_class = WSHandler
+
+    def __init__(self, *args: Any, admission: Optional[AdmissionController] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.single_flight = SingleFlight()
+        self.admission = admission
+
+    async def run(self, request: Request, context: Optional[Any] = UNSET, root_value: Optional[Any] = UNSET) -> Response:
+        try:
+            return await self.run_admitted(request, context, root_value)
+        except Overloaded as e:
+            return PlainTextResponse(str(e), status_code=503, headers={"Retry-After": str(e.retry_after)})
+
+    async def run_admitted(self, request: Request, context: Any, root_value: Any) -> Response:
+        payloads: List[Any] = []
+        if request.method == "POST" and "application/json" in request.headers.get("content-type", ""):
+            # Starlette caches the body, so the regular path can read it again
+            body = await request.body()
+            if body.lstrip()[:1] == b"[":
+                return await self.run_batch(request, body, context, root_value)
+            if "multipart/mixed" in request.headers.get("accept", ""):
+                response = await self.run_incremental(request, body, context, root_value)
+                if response is not None:
+                    return response
+            if COALESCE_QUERIES:
+                response = await self.run_coalesced(request, body, context, root_value)
+                if response is not None:
+                    return response
+            try:
+                payloads = [loads(body)]
+            except ValueError:
+                pass
+        elif "query" in request.query_params:
+            payloads = [dict(request.query_params)]
+        elif request.method == "POST":
+            # Multipart uploads; cost unknown
+            payloads = [{}]
+        # GETs without a query render GraphiQL and don't need a slot
+        async with self.admit(payloads):
+            return await super().run(request, context=context, root_value=root_value)
+
+    def admit(self, payloads: List[Any]) -> AsyncContextManager[None]:
+        """Wait for an execution slot priced by the operations' estimated cost."""
+        if self.admission is None or not payloads:
+            return contextlib.nullcontext()
+        cost = 0
+        for payload in payloads:
+            if not isinstance(payload, dict):
+                continue
+            query = payload.get("query")
+            document = parse_document(query) if isinstance(query, str) else None
+            cost += query_cost(document, payload.get("operationName"), payload.get("variables"))
+        return self.admission.slot(cost_priority(cost))
+
+    def coalescing_key(self, request: Request, payload: Dict[str, Any]) -> Optional[tuple]:
+        """Key identifying requests that may share a result, or None to bypass coalescing."""
+        query = payload.get("query")
+        operation_name = payload.get("operationName")
+        if not isinstance(query, str) or operation_type(query, operation_name) != OperationType.QUERY:
+            return None
+        return (
+            normalize_document(query),
+            json.dumps(payload.get("variables"), sort_keys=True, default=str),
+            operation_name,
+            tuple(request.headers.get(name) for name in AUTH_HEADERS),
+        )
+
+    async def run_coalesced(self, request: Request, body: bytes, context: Any, root_value: Any) -> Optional[Response]:
+        try:
+            payload = loads(body)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict):
+            return None
+        key = self.coalescing_key(request, payload)
+        if key is None:
+            # Mutations and anything we can't classify take the regular path
+            return None
+
+        sub_response = await self.get_sub_response(request)
+
+        async def execute() -> bytes:
+            # Only the leader takes a slot; followers just await its result
+            async with self.admit([payload]):
+                return self.encode_json(await self.execute_payload(payload, context, root_value))
+
+        body = await self.single_flight.do(key, execute)
+        response = JSONBytesResponse(body, status_code=sub_response.status_code or 200)
+        response.raw_headers.extend(sub_response.headers.raw)
+        return response
+
+    async def run_incremental(self, request: Request, body: bytes, context: Any, root_value: Any) -> Optional[Response]:
+        try:
+            payload = loads(body)
+        except ValueError:
+            return None
+        query = payload.get("query") if isinstance(payload, dict) else None
+        if not isinstance(query, str) or not has_incremental_directives(parse_document(query)):
+            return None
+
+        sub_response = await self.get_sub_response(request)
+        if context is UNSET:
+            context = await self.get_context(request, response=sub_response)
+        if root_value is UNSET:
+            root_value = await self.get_root_value(request)
+        if not isinstance(context, dict):
+            return None
+        state = IncrementalState()
+        context = {**context, "incremental": state}
+
+        async with self.admit([payload]):
+            initial = await self.execute_payload(payload, context, root_value)
+        if not state.has_next:
+            # Nothing was deferred (e.g. a mutation, or the lists were short)
+            response = JSONBytesResponse(self.encode_json(initial), status_code=sub_response.status_code or 200)
+            response.raw_headers.extend(sub_response.headers.raw)
+            return response
+
+        async def parts():
+            initial["hasNext"] = True
+            yield MULTIPART_BOUNDARY + MULTIPART_PART_HEADERS + self.encode_json(initial)
+            while state.has_next:
+                incremental = await state.next_payload()
+                yield MULTIPART_BOUNDARY + MULTIPART_PART_HEADERS + self.encode_json(
+                    {"incremental": [incremental], "hasNext": state.has_next}
+                )
+            yield MULTIPART_END
+
+        response = StreamingResponse(
+            parts(),
+            status_code=sub_response.status_code or 200,
+            media_type='multipart/mixed; boundary="-"',
+        )
+        response.raw_headers.extend(sub_response.headers.raw)
+        return response
+
+    async def run_batch(self, request: Request, body: bytes, context: Any, root_value: Any) -> Response:
+        try:
+            operations = loads(body)
+        except ValueError:
+            return PlainTextResponse("Unable to parse request body as JSON", status_code=400)
+
+        if not operations or not all(isinstance(op, dict) for op in operations):
+            return PlainTextResponse("Batch must be a non-empty array of operations", status_code=400)
+        if len(operations) > MAX_BATCH_SIZE:
+            return PlainTextResponse(f"Batch exceeds {MAX_BATCH_SIZE} operations", status_code=400)
+
+        sub_response = await self.get_sub_response(request)
+        if context is UNSET:
+            context = await self.get_context(request, response=sub_response)
+        if root_value is UNSET:
+            root_value = await self.get_root_value(request)
+
+        async with self.admit(operations):
+            results = await self.execute_batch(operations, context, root_value)
+
+        response = JSONBytesResponse(self.encode_json(results), status_code=sub_response.status_code or 200)
+        response.raw_headers.extend(sub_response.headers.raw)
+        return response
+
+    async def execute_batch(self, operations: List[Dict[str, Any]], context: Any, root_value: Any) -> List[GraphQLHTTPResponse]:
+        types = [operation_type(op.get("query"), op.get("operationName")) for op in operations]
+        if OperationType.MUTATION in types:
+            # Run in order so later operations see earlier writes, each with
+            # its own loaders so nothing cached before a write is reused
+            results = []
+            for op in operations:
+                results.append(await self.execute_payload(op, with_fresh_loaders(context), root_value))
+        else:
+            # Read-only: run concurrently and share the request's loaders
+            results = await asyncio.gather(*(
+                self.execute_payload(op, context, root_value) for op in operations
+            ))
+        return results
+
+    async def execute_payload(self, operation: Dict[str, Any], context: Any, root_value: Any) -> GraphQLHTTPResponse:
+        query = operation.get("query")
+        if not query:
+            return {"data": None, "errors": [{"message": "No GraphQL query found in the request"}]}
+
+        result: ExecutionResult = await self.schema.execute(
+            query,
+            root_value=root_value,
+            variable_values=operation.get("variables"),
+            context_value=context,
+            operation_name=operation.get("operationName"),
+        )
+        response_data = process_result(result)
+        if result.errors:
+            self._handle_errors(result.errors, response_data)
+        return response_data
+
+    def parse_json(self, data: Union[str, bytes]) -> Any:
+        if orjson is None:
+            return super().parse_json(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let the base view produce its usual 400 response
+            return super().parse_json(data)
+
+    def encode_json(self, response_data: GraphQLHTTPResponse) -> bytes:
+        return dumps(response_data)
+
+    def create_response(self, response_data: GraphQLHTTPResponse, sub_response: Response) -> Response:
+        response = JSONBytesResponse(
+            self.encode_json(response_data),
+            status_code=sub_response.status_code or 200,
+        )
+        response.raw_headers.extend(sub_response.headers.raw)
+        return response
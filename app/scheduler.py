@@ -0,0 +1,354 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .db import REMOVALS, db
+from .events import ChangeEvent, event_bus
+from .metrics import registry
+from .models import Appointment, Task
+
+# Run the background loop that publishes appointment reminders
+REMINDER_DISPATCH = os.getenv("REMINDER_DISPATCH", "true").lower() == "true"
+# Reminders at most this far in the past when they are (re)scheduled still fire
+REMINDER_GRACE_SECONDS = int(os.getenv("REMINDER_GRACE_SECONDS", "60"))
+
+# Event type published on the event bus when a reminder is due
+REMINDER = "REMINDER"
+REMINDER_EVENT_TYPE = "AppointmentReminder"
+
+CLOSED_TASK_STATUSES = {"COMPLETED", "CANCELLED"}
+REMINDED_APPOINTMENT_STATUSES = {"SCHEDULED", "CONFIRMED"}
+
+# Seconds before the reminder loop retries after a failed pass
+DISPATCH_RETRY_SECONDS = 1.0
+
+# Stale heap entries tolerated before a heap is rebuilt from the live ones
+COMPACT_MIN_STALE = 1024
+
+# (ISO timestamp, id)
+Entry = Tuple[str, str]
+
+reminders_fired = registry.counter("reminders_fired_total", "Appointment reminders published")
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> str:
+    # Timestamps are naive UTC ISO strings throughout, so they order as strings
+    return datetime.utcnow().isoformat()
+
+
+def parse_utc(value: Any) -> Optional[datetime]:
+    """An ISO timestamp as a naive UTC datetime; None if it isn't one.
+
+    Times with an offset are converted to UTC, so they compare with the naive
+    UTC times stored elsewhere.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def naive_utc(value: Any) -> Optional[str]:
+    """parse_utc() as an ISO string, which orders like the time itself."""
+    parsed = parse_utc(value)
+    return parsed.isoformat() if parsed is not None else None
+
+
+class TimeHeap:
+    """Min-heap of (time, id) with one live time per id.
+
+    Changing or removing an id leaves its old entry in the heap; entries whose
+    time no longer matches are skipped when met and dropped by compaction.
+    """
+
+    def __init__(self):
+        self._heap: List[Entry] = []
+        self._times: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def set(self, id: str, time: str) -> None:
+        if self._times.get(id) == time:
+            return
+        self._times[id] = time
+        heapq.heappush(self._heap, (time, id))
+        self._maybe_compact()
+
+    def discard(self, id: str) -> None:
+        if self._times.pop(id, None) is not None:
+            self._maybe_compact()
+
+    def _live(self, entry: Entry) -> bool:
+        return self._times.get(entry[1]) == entry[0]
+
+    def _stored(self) -> int:
+        return len(self._heap)
+
+    def _maybe_compact(self) -> None:
+        if self._stored() > 2 * len(self._times) + COMPACT_MIN_STALE:
+            self._compact()
+
+    def _compact(self) -> None:
+        self._heap = [(time, id) for id, time in self._times.items()]
+        heapq.heapify(self._heap)
+
+    def peek(self) -> Optional[Entry]:
+        while self._heap and not self._live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def pop(self) -> Optional[Entry]:
+        entry = self.peek()
+        if entry is not None:
+            heapq.heappop(self._heap)
+            del self._times[entry[1]]
+        return entry
+
+    def between(self, start: str, end: str, limit: Optional[int] = None) -> List[Entry]:
+        """Live entries with start <= time < end, earliest first, without popping them.
+
+        Walks the heap as a tree, best first: a child is never earlier than
+        its parent, so only entries before ``end`` and their direct children
+        are visited. O(k log k) for the k entries before ``end``.
+        """
+        heap = self._heap
+        result: List[Entry] = []
+        seen: Set[str] = set()
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and (limit is None or len(result) < limit):
+            entry, index = heapq.heappop(frontier)
+            if entry[0] >= end:
+                break
+            if entry[0] >= start and entry[1] not in seen and self._live(entry):
+                seen.add(entry[1])
+                result.append(entry)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+
+class DueDates(TimeHeap):
+    """TimeHeap that moves entries into a sorted ``past`` list as time passes.
+
+    Entries come off the heap in time order, so the past list is built by
+    appending; the heap then only holds what is still ahead, and a due-soon
+    walk never visits the (often much larger) backlog of overdue entries.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._past: List[Entry] = []
+
+    def _stored(self) -> int:
+        return len(self._heap) + len(self._past)
+
+    def _compact(self) -> None:
+        self._past = []
+        super()._compact()
+
+    def advance(self, now: str) -> None:
+        past = self._past
+        while self._heap and self._heap[0][0] < now:
+            entry = heapq.heappop(self._heap)
+            if not self._live(entry):
+                continue
+            if not past or entry >= past[-1]:
+                past.append(entry)
+            else:
+                # Rescheduled into the past
+                bisect.insort(past, entry)
+
+    def overdue(self, now: str, limit: Optional[int] = None) -> List[Entry]:
+        self.advance(now)
+        result: List[Entry] = []
+        seen: Set[str] = set()
+        for entry in self._past:
+            if limit is not None and len(result) >= limit:
+                break
+            if entry[1] not in seen and self._live(entry):
+                seen.add(entry[1])
+                result.append(entry)
+        return result
+
+    def due_between(self, now: str, end: str, limit: Optional[int] = None) -> List[Entry]:
+        self.advance(now)
+        return self.between(now, end, limit)
+
+
+class Scheduler:
+    """Time-ordered views of open task due dates and pending appointment reminders.
+
+    Both heaps are maintained from database change notifications, so
+    overdue/due-soon queries and reminder dispatch never scan the tables.
+    The reminder loop sleeps until the earliest reminder is due and is woken
+    early whenever reminders change.
+    """
+
+    def __init__(self):
+        self.tasks = DueDates()
+        self.reminders = TimeHeap()
+        self._sources: Dict[str, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.rebuild()
+        db.add_listener(self.on_change)
+        registry.gauge("scheduled_reminders", "Appointment reminders waiting to fire",
+                       callback=lambda: len(self.reminders))
+
+    def rebuild(self) -> None:
+        self.tasks = DueDates()
+        self.reminders = TimeHeap()
+        tables = db.memory_structures()["tables"]
+        self._sources = {"Task": tables["Task"], "Appointment": tables["Appointment"]}
+        for task in self._sources["Task"].values():
+            self._index_task(task)
+        self.tasks.advance(utcnow())
+        earliest = self._earliest_reminder()
+        for appointment in self._sources["Appointment"].values():
+            self._index_appointment(appointment, earliest)
+
+    def _check_source(self) -> None:
+        # db.clear() swaps the tables without notifying listeners
+        tables = db.memory_structures()["tables"]
+        if any(tables[name] is not source for name, source in self._sources.items()):
+            self.rebuild()
+
+    @staticmethod
+    def _earliest_reminder() -> str:
+        return (datetime.utcnow() - timedelta(seconds=REMINDER_GRACE_SECONDS)).isoformat()
+
+    def _index_task(self, task: Task) -> None:
+        due = naive_utc(task.due_date) if task.due_date else None
+        if task.due_date and due is None:
+            logger.warning("Ignoring due date %r of task %s: not an ISO timestamp", task.due_date, task.id)
+        if due and task.status not in CLOSED_TASK_STATUSES:
+            self.tasks.set(task.id, due)
+        else:
+            self.tasks.discard(task.id)
+
+    def _index_appointment(self, appointment: Appointment, earliest: str) -> None:
+        reminder = naive_utc(appointment.reminder_time) if appointment.reminder_time else None
+        if appointment.reminder_time and reminder is None:
+            logger.warning("Ignoring reminder time %r of appointment %s: not an ISO timestamp",
+                           appointment.reminder_time, appointment.id)
+        if reminder and reminder >= earliest and appointment.status in REMINDED_APPOINTMENT_STATUSES:
+            self.reminders.set(appointment.id, reminder)
+        else:
+            self.reminders.discard(appointment.id)
+
+    def on_change(self, operation: str, model_name: str, id: str, model: Any) -> None:
+        if model_name == "Task":
+            if operation in REMOVALS:
+                self.tasks.discard(id)
+            else:
+                self._index_task(model)
+        elif model_name == "Appointment":
+            if operation in REMOVALS:
+                self.reminders.discard(id)
+            else:
+                self._index_appointment(model, self._earliest_reminder())
+            self._wake_up()
+
+    def overdue_tasks(self, now: Optional[str] = None, limit: Optional[int] = None) -> List[Task]:
+        """Open tasks due before now, earliest first."""
+        self._check_source()
+        return [db.get(Task, id) for _, id in self.tasks.overdue(now or utcnow(), limit)]
+
+    def tasks_due_within(self, hours: float, now: Optional[str] = None, limit: Optional[int] = None) -> List[Task]:
+        """Open tasks due from now until ``hours`` from now, earliest first."""
+        self._check_source()
+        start = now or utcnow()
+        end = (datetime.fromisoformat(start) + timedelta(hours=hours)).isoformat()
+        return [db.get(Task, id) for _, id in self.tasks.due_between(start, end, limit)]
+
+    def due_reminders(self, now: Optional[str] = None) -> List[Appointment]:
+        """Pop every reminder that is due; each one is returned only once."""
+        self._check_source()
+        now = now or utcnow()
+        due = []
+        while True:
+            entry = self.reminders.peek()
+            if entry is None or entry[0] > now:
+                return due
+            self.reminders.pop()
+            due.append(db.get(Appointment, entry[1]))
+
+    def fire(self, appointment: Appointment) -> None:
+        reminders_fired.inc()
+        event_bus.publish(ChangeEvent(REMINDER, REMINDER_EVENT_TYPE, appointment.id, appointment.to_dict()))
+
+    def start(self) -> None:
+        """Start the reminder loop on the running event loop."""
+        if self._runner is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._runner = self._loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+
+    def _wake_up(self) -> None:
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def dispatch(self) -> Optional[float]:
+        """Fire every due reminder; returns the seconds until the next one (None if there is none)."""
+        for appointment in self.due_reminders():
+            if appointment is None:
+                continue
+            try:
+                self.fire(appointment)
+            except Exception:
+                logger.exception("Failed to publish reminder for appointment %s", appointment.id)
+        entry = self.reminders.peek()
+        if entry is None:
+            return None
+        return max((datetime.fromisoformat(entry[0]) - datetime.utcnow()).total_seconds(), 0)
+
+    async def run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                timeout = self.dispatch()
+            except Exception:
+                # Keep the loop alive; a failed pass must not stop every later reminder
+                logger.exception("Reminder dispatch failed")
+                timeout = DISPATCH_RETRY_SECONDS
+
+            # Sleep until the next reminder is due or the reminders change
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+scheduler = Scheduler()
@@ -0,0 +1,270 @@
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import strawberry
+from graphql import (
+    DirectiveLocation,
+    DocumentNode,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLObjectType,
+    GraphQLResolveInfo,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    located_error,
+)
+from graphql.execution import ExecutionContext
+from graphql.execution.collect_fields import (
+    does_fragment_condition_match,
+    get_field_entry_key,
+    should_include_node,
+)
+from graphql.execution.execute import CollectedErrors
+from graphql.execution.values import get_directive_values
+from graphql.pyutils import Path
+from typing_extensions import Annotated
+
+# Streamed list items sent per incremental payload
+STREAM_BATCH_SIZE = int(os.getenv("GRAPHQL_STREAM_BATCH_SIZE", "10"))
+
+
+# graphql-core 3.2 doesn't ship these; arguments follow the incremental delivery RFC.
+# They are only declared here: IncrementalExecutionContext implements them.
+@strawberry.directive(
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    description="Deliver this fragment in a later payload.",
+)
+def defer(if_: Annotated[bool, strawberry.argument(name="if")] = True, label: Optional[str] = None):
+    pass
+
+
+@strawberry.directive(
+    locations=[DirectiveLocation.FIELD],
+    description="Deliver the first initialCount items of this list, then the rest in later payloads.",
+)
+def stream(value: Any, if_: Annotated[bool, strawberry.argument(name="if")] = True,
+           label: Optional[str] = None, initial_count: int = 0):
+    return value
+
+# Fields keyed by response name, as returned by graphql-core's collect_fields
+Fields = Dict[str, List[FieldNode]]
+# (label, selection set) of each fragment held back by @defer
+Deferred = List[Tuple[Optional[str], SelectionSetNode]]
+
+
+def has_incremental_directives(document: Optional[DocumentNode]) -> bool:
+    """Whether a document uses @defer or @stream anywhere."""
+    if document is None:
+        return False
+    stack = list(document.definitions)
+    while stack:
+        node = stack.pop()
+        for directive in getattr(node, "directives", None) or ():
+            if directive.name.value in ("defer", "stream"):
+                return True
+        selection_set = getattr(node, "selection_set", None)
+        if selection_set is not None:
+            stack.extend(selection_set.selections)
+    return False
+
+
+class DeferredFragment:
+    """A fragment whose fields are executed after the initial payload."""
+
+    def __init__(self, label: Optional[str], path: Optional[Path], parent_type: GraphQLObjectType,
+                 source: Any, selection_set: SelectionSetNode):
+        self.label = label
+        self.path = path
+        self.parent_type = parent_type
+        self.source = source
+        self.selection_set = selection_set
+
+    async def execute(self, context: "IncrementalExecutionContext") -> Dict[str, Any]:
+        fields, deferred = context.collect_incremental_fields(self.parent_type, self.selection_set)
+        context.defer_fragments(deferred, self.path, self.parent_type, self.source)
+        data = context.execute_fields(self.parent_type, self.source, self.path, fields)
+        if context.is_awaitable(data):
+            data = await data
+        return {"data": data, "path": self.path.as_list() if self.path else []}
+
+
+class StreamedList:
+    """The items of a @stream list left over after its initial count."""
+
+    def __init__(self, label: Optional[str], path: Path, item_type: Any, field_nodes: List[FieldNode],
+                 info: GraphQLResolveInfo, items: List[Any], start: int):
+        self.label = label
+        self.path = path
+        self.item_type = item_type
+        self.field_nodes = field_nodes
+        self.info = info
+        self.items = items
+        self.start = start
+
+    async def execute(self, context: "IncrementalExecutionContext") -> Dict[str, Any]:
+        end = min(self.start + STREAM_BATCH_SIZE, len(self.items))
+        completed = []
+        for index in range(self.start, end):
+            item_path = self.path.add_key(index, None)
+            try:
+                value = context.complete_value(self.item_type, self.field_nodes, self.info, item_path, self.items[index])
+                if context.is_awaitable(value):
+                    value = await value
+            except Exception as raw_error:
+                error = located_error(raw_error, self.field_nodes, item_path.as_list())
+                context.handle_field_error(error, self.item_type, item_path)
+                value = None
+            completed.append(value)
+        payload = {"items": completed, "path": self.path.add_key(self.start, None).as_list()}
+        self.start = end
+        if self.start < len(self.items):
+            # Re-queue so other deferred work is interleaved with long lists
+            context.incremental.pending.append(self)
+        return payload
+
+
+class IncrementalState:
+    """Put in the request context as ``incremental`` to enable @defer/@stream.
+
+    The execution context registers itself here and queues deferred
+    fragments and streamed list remainders; the transport drains them with
+    ``next_payload`` after sending the initial result.
+    """
+
+    def __init__(self):
+        self.context: Optional["IncrementalExecutionContext"] = None
+        self.pending: Deque[Any] = deque()
+
+    @property
+    def has_next(self) -> bool:
+        return bool(self.pending)
+
+    async def next_payload(self) -> Dict[str, Any]:
+        record = self.pending.popleft()
+        context = self.context
+        # Errors are reported with the payload that produced them
+        context.collected_errors = CollectedErrors()
+        try:
+            payload = await record.execute(context)
+        except GraphQLError as error:
+            # A non-null field failed; the whole fragment/batch becomes null
+            context.collected_errors.add(error, None)
+            payload = {"data" if isinstance(record, DeferredFragment) else "items": None,
+                       "path": record.path.as_list() if record.path else []}
+        if record.label is not None:
+            payload["label"] = record.label
+        if context.collected_errors.errors:
+            payload["errors"] = [error.formatted for error in context.collected_errors.errors]
+        return payload
+
+
+def get_incremental(context_value: Any) -> Optional[IncrementalState]:
+    if isinstance(context_value, dict):
+        return context_value.get("incremental")
+    return getattr(context_value, "incremental", None)
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    """ExecutionContext that holds back @defer fragments and @stream list items.
+
+    Only active for queries whose context carries an IncrementalState; for
+    every other request the directives are ignored and everything is
+    executed inline, as the spec allows.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.incremental = get_incremental(self.context_value)
+        if self.incremental is not None and self.operation.operation != OperationType.QUERY:
+            self.incremental = None
+        if self.incremental is not None:
+            self.incremental.context = self
+            self._defer = self.schema.get_directive("defer")
+            self._stream = self.schema.get_directive("stream")
+        self._incremental_fields_cache: Dict[Tuple, Tuple[Fields, Deferred]] = {}
+
+    def execute_operation(self, operation: OperationDefinitionNode, root_value: Any) -> Any:
+        if self.incremental is None:
+            return super().execute_operation(operation, root_value)
+        root_type = self.schema.get_root_type(operation.operation)
+        fields, deferred = self.collect_incremental_fields(root_type, operation.selection_set)
+        self.defer_fragments(deferred, None, root_type, root_value)
+        return self.execute_fields(root_type, root_value, None, fields)
+
+    def complete_object_value(self, return_type: GraphQLObjectType, field_nodes: List[FieldNode],
+                              info: GraphQLResolveInfo, path: Path, result: Any) -> Any:
+        if self.incremental is None or return_type.is_type_of:
+            return super().complete_object_value(return_type, field_nodes, info, path, result)
+        key = (return_type, *map(id, field_nodes))
+        collected = self._incremental_fields_cache.get(key)
+        if collected is None:
+            fields: Fields = {}
+            deferred: Deferred = []
+            visited: Set[str] = set()
+            for node in field_nodes:
+                if node.selection_set:
+                    self._collect(return_type, node.selection_set, fields, deferred, visited)
+            collected = self._incremental_fields_cache[key] = (fields, deferred)
+        fields, deferred = collected
+        self.defer_fragments(deferred, path, return_type, result)
+        return self.execute_fields(return_type, result, path, fields)
+
+    def complete_list_value(self, return_type: GraphQLList, field_nodes: List[FieldNode],
+                            info: GraphQLResolveInfo, path: Path, result: Any) -> Any:
+        stream = None
+        if self.incremental is not None:
+            stream = get_directive_values(self._stream, field_nodes[0], self.variable_values)
+        if not stream or not stream["if"]:
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+
+        items = list(result)
+        initial_count = max(stream.get("initialCount") or 0, 0)
+        if len(items) > initial_count:
+            self.incremental.pending.append(StreamedList(
+                stream.get("label"), path, return_type.of_type, field_nodes, info, items, initial_count
+            ))
+        return super().complete_list_value(return_type, field_nodes, info, path, items[:initial_count])
+
+    def defer_fragments(self, deferred: Deferred, path: Optional[Path], parent_type: GraphQLObjectType,
+                        source: Any) -> None:
+        for label, selection_set in deferred:
+            self.incremental.pending.append(DeferredFragment(label, path, parent_type, source, selection_set))
+
+    def collect_incremental_fields(self, runtime_type: GraphQLObjectType,
+                                   selection_set: SelectionSetNode) -> Tuple[Fields, Deferred]:
+        fields: Fields = {}
+        deferred: Deferred = []
+        self._collect(runtime_type, selection_set, fields, deferred, set())
+        return fields, deferred
+
+    def _collect(self, runtime_type: GraphQLObjectType, selection_set: SelectionSetNode, fields: Fields,
+                 deferred: Deferred, visited: Set[str]) -> None:
+        # Mirrors graphql-core's collect_fields_impl, holding back @defer fragments
+        for selection in selection_set.selections:
+            if not should_include_node(self.variable_values, selection):
+                continue
+            if isinstance(selection, FieldNode):
+                fields.setdefault(get_field_entry_key(selection), []).append(selection)
+                continue
+
+            fragment: Any = selection
+            if isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name in visited:
+                    continue
+                visited.add(name)
+                fragment = self.fragments.get(name)
+                if fragment is None:
+                    continue
+            if not does_fragment_condition_match(self.schema, fragment, runtime_type):
+                continue
+
+            defer = get_directive_values(self._defer, selection, self.variable_values)
+            if defer and defer["if"]:
+                deferred.append((defer.get("label"), fragment.selection_set))
+            else:
+                self._collect(runtime_type, fragment.selection_set, fields, deferred, visited)
@@ -0,0 +1,55 @@
+from typing import Any, Dict, Optional, Tuple, Type
+
+from graphql import OperationType
+from strawberry.types import Info
+
+from ..db import db
+
+
+class DataLoaders:
+    """Per-request memo of rows converted to GraphQL types.
+
+    Nested resolvers (e.g. ``vehicles { lead { ... } }``) and operations
+    batched into one HTTP request look up the same parents many times; each
+    row is fetched and converted once per request.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[type, str], Any] = {}
+
+    def load(self, model_type: Type, graphql_type: Type, id: str) -> Optional[Any]:
+        key = (graphql_type, id)
+        if key not in self._cache:
+            row = db.get(model_type, id)
+            self._cache[key] = graphql_type(**row.to_dict()) if row is not None else None
+        return self._cache[key]
+
+
+def get_loaders(info: Optional[Info]) -> Optional[DataLoaders]:
+    """Return the request's loaders, or None when caching isn't safe.
+
+    Mutations may change rows after they have been cached, so only query
+    operations use the shared loaders.
+    """
+    if info is None or info.operation.operation != OperationType.QUERY:
+        return None
+    context = info.context
+    if isinstance(context, dict):
+        return context.get("loaders")
+    return getattr(context, "loaders", None)
+
+
+def with_fresh_loaders(context: Any) -> Any:
+    """Copy of a dict context with its own loaders, for one operation."""
+    if isinstance(context, dict):
+        return {**context, "loaders": DataLoaders()}
+    return context
+
+
+async def get_context() -> Dict[str, Any]:
+    """FastAPI context getter adding fresh loaders to every request.
+
+    A websocket connection keeps this context for its whole lifetime; the
+    router's websocket handlers give each operation its own copy.
+    """
+    return {"loaders": DataLoaders()}
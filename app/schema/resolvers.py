@@ -1,35 +1,146 @@
-from typing import List, Optional, Any, Dict, Union
+import dataclasses
+import re
+from typing import List, Optional, Any, AsyncGenerator, Dict, Iterable, Set, Union
 from datetime import datetime
+from strawberry.types import Info
+from graphql import FieldNode, FragmentSpreadNode
 from ..db import db
+from ..events import event_bus, ChangeEvent
+from ..storage import FieldKey, Where, matches
+from ..calendar_index import calendar_index
+from ..scheduler import REMINDER_EVENT_TYPE, scheduler
+from ..scoring import scorer
+from ..archive import ARCHIVED_TYPES, archive
+from ..dedupe import duplicate_index, merge_leads
+from .loaders import DataLoaders
 from .types import (
     LeadType, TaskType, NoteType, AppointmentType, VehicleType,
     LeadInput, TaskInput, NoteInput, AppointmentInput, VehicleInput,
     LeadPaginationResult, TaskPaginationResult, AppointmentPaginationResult, PageInfo,
-    VehicleFilterInput, AppointmentFilterInput, SortOrder, LeadFilterInput, LeadStatusCount
+    VehicleFilterInput, AppointmentFilterInput, TaskFilterInput, StringFilterInput, SortOrder, LeadFilterInput, LeadStatusCount,
+    ChangeOperation, LeadChangeEvent, AppointmentChangeEvent, TaskChangeEvent,
+    LeadStatus, AppointmentStatus, TaskStatus, ChangeEntry, ChangeSet, CalendarDay,
+    LeadScoringRun, DuplicateLeadGroup
 )
 from ..models import Lead, Task, Note, Appointment, Vehicle
 
 # Helper functions
-def apply_vehicle_filters(vehicles: List[VehicleType], filters: Optional[VehicleFilterInput] = None) -> List[VehicleType]:
+_CAMEL_BOUNDARY = re.compile(r'(?<!^)(?=[A-Z])')
+
+# Always copied because nested field resolvers read them
+_KEY_FIELDS = {'id', 'lead_id', 'task_id'}
+
+_init_fields: Dict[type, List[str]] = {}
+
+
+def _field_nodes(selections: Iterable[Any], fragments: Dict[str, Any]) -> Iterable[FieldNode]:
+    # Fragment spreads and inline fragments (typed or not) contribute their own selections
+    for selection in selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _field_nodes(fragment.selection_set.selections, fragments)
+        elif selection.selection_set is not None:
+            yield from _field_nodes(selection.selection_set.selections, fragments)
+
+
+def _children(nodes: Iterable[FieldNode], fragments: Dict[str, Any]) -> List[FieldNode]:
+    return [child for node in nodes if node.selection_set is not None
+            for child in _field_nodes(node.selection_set.selections, fragments)]
+
+
+def selected_fields(info: Optional[Info], *path: str) -> Optional[Set[str]]:
+    """Return the python names of the fields selected below `path`.
+
+    For `getAllLeads { items { id leadStatus } }`, selected_fields(info, 'items')
+    is {'id', 'lead_status'}. Returns None when info isn't available so callers
+    fall back to copying every field. Fields under @include/@skip are counted
+    whatever the condition, so this may over-select but never under-selects.
+    """
+    if info is None:
+        return None
+    raw = info._raw_info
+    level = _children(raw.field_nodes, raw.fragments)
+    for name in path:
+        level = _children((node for node in level if node.name.value == name), raw.fragments)
+    return {_CAMEL_BOUNDARY.sub('_', node.name.value).lower() for node in level
+            if not node.name.value.startswith('__')}
+
+
+def project(row: Any, graphql_type: type, fields: Optional[Set[str]] = None) -> Any:
+    """Build a GraphQL type from a model row, copying only the selected fields."""
+    if fields is None:
+        return graphql_type(**row.to_dict())
+    names = _init_fields.get(graphql_type)
+    if names is None:
+        names = _init_fields[graphql_type] = [f.name for f in dataclasses.fields(graphql_type) if f.init]
+    return graphql_type(**{
+        name: getattr(row, name) if name in fields or name in _KEY_FIELDS else None
+        for name in names
+    })
+
+
+def matches_string_filter(value: Optional[str], condition: StringFilterInput) -> bool:
+    """Whether a value passes every part of a string filter (contains is case-insensitive)."""
+    return matches(value, dataclasses.asdict(condition))
+
+
+def where_for(conditions: Dict[str, Any]) -> Where:
+    """db.select() conditions for filter fields, leaving out the unset ones.
+
+    Conditions are StringFilterInputs, or enum members / plain values for equality.
+    """
+    return {
+        field: dataclasses.asdict(condition) if isinstance(condition, StringFilterInput) else condition
+        for field, condition in conditions.items()
+        if condition is not None
+    }
+
+
+def only_filters_on(filter: Any, fields: Iterable[str]) -> bool:
+    # Whether every condition of the filter is answered by the given (indexed) fields
+    return all(getattr(filter, f.name) is None for f in dataclasses.fields(filter) if f.name not in fields)
+
+
+# Filter fields answered from the bitmap (or, in SQLite, column) indexes
+LEAD_BITMAP_FILTERS = ('lead_status', 'lead_source')
+TASK_BITMAP_FILTERS = ('status', 'priority')
+VEHICLE_BITMAP_FILTERS = ('make', 'condition')
+
+
+VEHICLE_FILTERS = ('make', 'model', 'year', 'condition')
+
+
+def vehicle_where(filters: Optional[VehicleFilterInput]) -> Where:
     if not filters:
-        return vehicles
+        return {}
+    return where_for({field: getattr(filters, field) for field in VEHICLE_FILTERS})
 
-    filtered = vehicles
 
-    if filters.make:
-        if filters.make.eq:
-            filtered = [v for v in filtered if v.make == filters.make.eq]
-        if filters.make.contains:
-            filtered = [v for v in filtered if filters.make.contains.lower() in v.make.lower()]
+def appointment_where(filters: Optional[AppointmentFilterInput]) -> Where:
+    # Everything but the start time range
+    if not filters:
+        return {}
+    return where_for({
+        'title': {'contains': filters.title} if filters.title else None,
+        'status': filters.status,
+        'lead_id': filters.lead_id,
+    })
 
-    if filters.model and filters.model.eq:
-        filtered = [v for v in filtered if v.model == filters.model.eq]
 
-    if filters.year and filters.year.eq:
-        filtered = [v for v in filtered if v.year == filters.year.eq]
+def apply_vehicle_filters(vehicles: List[VehicleType], filters: Optional[VehicleFilterInput] = None) -> List[VehicleType]:
+    if not filters:
+        return vehicles
 
-    if filters.condition and filters.condition.eq:
-        filtered = [v for v in filtered if v.condition == filters.condition.eq]
+    filtered = vehicles
+
+    for field in VEHICLE_FILTERS:
+        condition = getattr(filters, field)
+        if not condition:
+            continue
+        filtered = [v for v in filtered if matches_string_filter(getattr(v, field), condition)]
 
     return filtered
 
@@ -43,7 +154,8 @@ def apply_appointment_filters(appointments: List[AppointmentType], filters: Opti
         filtered = [a for a in filtered if filters.title.lower() in a.title.lower()]
 
     if filters.status:
-        filtered = [a for a in filtered if a.status == filters.status]
+        status = getattr(filters.status, 'value', filters.status)
+        filtered = [a for a in filtered if a.status == status]
 
     if filters.lead_id:
         filtered = [a for a in filtered if a.lead_id == filters.lead_id]
@@ -61,20 +173,45 @@ def apply_appointment_filters(appointments: List[AppointmentType], filters: Opti
 
     return filtered
 
+# Sort arguments mapped to the model fields they sort on
+APPOINTMENT_SORT_FIELDS = {
+    "TITLE": "title",
+    "START_TIME": "start_time",
+    "END_TIME": "end_time",
+    "STATUS": "status",
+    "CREATED_AT": "created_at",
+}
+VEHICLE_SORT_FIELDS = {
+    "MAKE": "make",
+    "MODEL": "model",
+    "YEAR": "year",
+}
+
+def _page_info(total: int, page: int, size: int) -> Dict[str, Any]:
+    return {
+        'total': total,
+        'page': page,
+        'size': size,
+        'has_next': (page + 1) * size < total,
+        'has_previous': page > 0
+    }
+
 def paginate(items: List[Any], page: int = 0, size: int = 10) -> Dict[str, Any]:
     start = page * size
     end = start + size
-    total = len(items)
 
     return {
         'items': items[start:end],
-        'page_info': {
-            'total': total,
-            'page': page,
-            'size': size,
-            'has_next': end < total,
-            'has_previous': page > 0
-        }
+        'page_info': _page_info(len(items), page, size)
+    }
+
+def paginate_where(model_type: type, where: Where, page: int = 0, size: int = 10,
+                   order_by: Optional[str] = None, descending: bool = False) -> Dict[str, Any]:
+    # Filtered, sorted and paged by the database; only the rows of the page are read
+    start = page * size
+    return {
+        'items': db.select(model_type, where, order_by, descending, start, size),
+        'page_info': _page_info(db.count(model_type, where), page, size)
     }
 
 # Query Resolvers
@@ -85,35 +222,14 @@ def resolve_get_lead(id: str) -> Optional[LeadType]:
     return None
 
 
-def resolve_get_all_leads(
-        page: int = 0,
-        size: int = 10,
-        filter: Optional[LeadFilterInput] = None
-) -> LeadPaginationResult:
-    # Get all leads
-    all_leads = db.get_all(Lead)
-
-    # Get current time in ISO format for comparison
-    now = datetime.utcnow().isoformat()
-
-    # Get all appointments and group by lead_id
-    all_appointments = db.get_all(Appointment)
-    appointments_by_lead = {}
-
-    for appt in all_appointments:
-        if appt.lead_id not in appointments_by_lead:
-            appointments_by_lead[appt.lead_id] = []
-        appointments_by_lead[appt.lead_id].append(appt)
-
+def filter_leads(all_leads: List[Lead], filter: Optional[LeadFilterInput], now: str) -> List[Lead]:
     # Process leads with filters
     filtered_leads = []
 
     for lead in all_leads:
-        lead_dict = lead.to_dict()
-        lead_appointments = appointments_by_lead.get(lead.id, [])
-
         # Check upcoming appointments filter if specified
         if filter and filter.has_upcoming_appointments is not None:
+            lead_appointments = db.get_by_foreign_key(Appointment, 'lead_id', lead.id)
             has_upcoming = any(
                 appt.start_time > now and appt.status in ["SCHEDULED", "CONFIRMED"]
                 for appt in lead_appointments
@@ -123,7 +239,7 @@ def resolve_get_all_leads(
 
         # Apply vehicle make filter if specified
         if filter and hasattr(filter, 'vehicle_make') and filter.vehicle_make:
-            lead_vehicles = [v for v in db.get_all(Vehicle) if v.lead_id == lead.id]
+            lead_vehicles = db.get_by_foreign_key(Vehicle, 'lead_id', lead.id)
             has_matching_vehicle = any(
                 v.make.lower() == filter.vehicle_make.lower()
                 for v in lead_vehicles
@@ -133,60 +249,88 @@ def resolve_get_all_leads(
 
         # Apply other filters
         if filter:
+            # Status and source filters
+            if filter.lead_status is not None and lead.lead_status != filter.lead_status.value:
+                continue
+            if filter.lead_source is not None and lead.lead_source != filter.lead_source.value:
+                continue
+
             # Name filter
             if hasattr(filter, 'name') and filter.name and filter.name.eq:
-                if lead_dict.get('name') != filter.name.eq:
+                if lead.name != filter.name.eq:
                     continue
 
             # Email filter
             if hasattr(filter, 'email') and filter.email and filter.email.eq:
-                if lead_dict.get('email') != filter.email.eq:
+                if lead.email != filter.email.eq:
                     continue
 
             # Add more filters as needed...
 
         # If we get here, lead passes all filters
-        lead_data = LeadType(**lead_dict)
+        filtered_leads.append(lead)
 
-        # Attach appointments to the lead
-        lead_data.appointments = [
-            AppointmentType(**appt.to_dict())
-            for appt in lead_appointments
-        ]
+    return filtered_leads
 
-        filtered_leads.append(lead_data)
 
-    # Apply pagination
+def resolve_get_all_leads(
+        page: int = 0,
+        size: int = 10,
+        filter: Optional[LeadFilterInput] = None,
+        info: Optional[Info] = None
+) -> LeadPaginationResult:
+    # Get current time in ISO format for comparison
+    now = datetime.utcnow().isoformat()
+    fields = selected_fields(info, 'items')
+
+    where = where_for({field: getattr(filter, field) for field in LEAD_BITMAP_FILTERS}) if filter else {}
+    if not filter or only_filters_on(filter, LEAD_BITMAP_FILTERS):
+        # Answered by the status/source indexes alone
+        result = paginate_where(Lead, where, page, size)
+        return LeadPaginationResult(
+            items=[project(lead, LeadType, fields) for lead in result['items']],
+            page_info=PageInfo(**result['page_info'])
+        )
+
+    if where:
+        # Only the rows with a matching status/source go through the other filters
+        filtered_leads = filter_leads(db.select(Lead, where), filter, now)
+    else:
+        filtered_leads = filter_leads(db.get_all(Lead), filter, now)
+
+    # Apply pagination, then copy only the selected columns of the page.
+    # Nested lists (appointments, tasks, ...) are resolved per lead by the
+    # LeadType field resolvers, and only when they are selected.
     result = paginate(filtered_leads, page, size)
     return LeadPaginationResult(
-        items=result['items'],
+        items=[project(lead, LeadType, fields) for lead in result['items']],
         page_info=PageInfo(**result['page_info'])
     )
 
-def resolve_get_leads_by_status(status: str) -> LeadPaginationResult:
-    leads = [
-        LeadType(**lead.to_dict())
-        for lead in db.get_all(Lead)
-        if lead.lead_status == status
-    ]
+def resolve_get_leads_by_status(status: str, info: Optional[Info] = None) -> LeadPaginationResult:
     # Using default pagination for consistency
-    result = paginate(leads, 0, 10)
+    result = paginate_where(Lead, {'lead_status': status}, 0, 10)
+    fields = selected_fields(info, 'items')
     return LeadPaginationResult(
-        items=result['items'],
+        items=[project(lead, LeadType, fields) for lead in result['items']],
         page_info=PageInfo(**result['page_info'])
     )
 
-def resolve_get_task(id: str) -> Optional[TaskType]:
+def resolve_get_task(id: str, include_archived: bool = False) -> Optional[TaskType]:
     task = db.get(Task, id)
+    if task is None and include_archived:
+        task = archive.get(Task, id)
     if task:
         return TaskType(**task.to_dict())
     return None
 
-def resolve_get_tasks_by_lead(lead_id: str) -> List[TaskType]:
+def resolve_get_tasks_by_lead(lead_id: str, include_archived: bool = False) -> List[TaskType]:
+    rows = db.get_by_foreign_key(Task, 'lead_id', lead_id)
+    if include_archived:
+        rows = rows + archive.get_by_lead(Task, lead_id)
     tasks = [
         TaskType(**task.to_dict())
-        for task in db.get_all(Task)
-        if task.lead_id == lead_id
+        for task in rows
     ]
     return tasks
 
@@ -199,21 +343,21 @@ def resolve_get_note(id: str) -> Optional[NoteType]:
 def resolve_get_notes_by_lead(lead_id: str) -> List[NoteType]:
     notes = [
         NoteType(**note.to_dict())
-        for note in db.get_all(Note)
-        if note.lead_id == lead_id
+        for note in db.get_by_foreign_key(Note, 'lead_id', lead_id)
     ]
     return notes
 
 def resolve_get_notes_by_task(task_id: str) -> List[NoteType]:
     notes = [
         NoteType(**note.to_dict())
-        for note in db.get_all(Note)
-        if note.task_id == task_id
+        for note in db.get_by_foreign_key(Note, 'task_id', task_id)
     ]
     return notes
 
-def resolve_get_appointment(id: str) -> Optional[AppointmentType]:
+def resolve_get_appointment(id: str, include_archived: bool = False) -> Optional[AppointmentType]:
     appointment = db.get(Appointment, id)
+    if appointment is None and include_archived:
+        appointment = archive.get(Appointment, id)
     if appointment:
         return AppointmentType(**appointment.to_dict())
     return None
@@ -223,35 +367,51 @@ def resolve_get_all_appointments(
     size: int = 10,
     sort_by: str = "START_TIME",
     sort_order: str = "DESC",
-    filter: Optional[AppointmentFilterInput] = None
+    filter: Optional[AppointmentFilterInput] = None,
+    info: Optional[Info] = None,
+    include_archived: bool = False
 ) -> AppointmentPaginationResult:
-    appointments = [AppointmentType(**a.to_dict()) for a in db.get_all(Appointment)]
-
-    # Apply filters
-    if filter:
-        appointments = apply_appointment_filters(appointments, filter)
-
-    # Apply sorting
+    # Filter and sort the rows themselves; only the page is converted
     reverse_sort = sort_order == "DESC"
-
-    if sort_by == "TITLE":
-        appointments.sort(key=lambda x: x.title or "", reverse=reverse_sort)
-    elif sort_by == "START_TIME":
-        appointments.sort(key=lambda x: x.start_time, reverse=reverse_sort)
-    elif sort_by == "END_TIME":
-        appointments.sort(key=lambda x: x.end_time, reverse=reverse_sort)
-    elif sort_by == "STATUS":
-        appointments.sort(key=lambda x: x.status or "", reverse=reverse_sort)
-    elif sort_by == "CREATED_AT":
-        appointments.sort(key=lambda x: x.created_at, reverse=reverse_sort)
-
-    # Apply pagination
-    result = paginate(appointments, page, size)
+    sort_field = APPOINTMENT_SORT_FIELDS.get(sort_by)
+    sort_key = FieldKey(sort_field) if sort_field else None
+    where = appointment_where(filter)
+
+    if not include_archived and not (filter and filter.start_time):
+        result = paginate_where(Appointment, where, page, size, sort_field, reverse_sort)
+    else:
+        # The database filters and sorts; the start time range is checked here
+        appointments = apply_appointment_filters(
+            db.select(Appointment, where, sort_field, reverse_sort), filter
+        )
+
+        if include_archived:
+            # Decompresses every archived appointment
+            appointments += apply_appointment_filters(list(archive.iter_all(Appointment)), filter)
+            if sort_key:
+                appointments.sort(key=sort_key, reverse=reverse_sort)
+
+        result = paginate(appointments, page, size)
+    fields = selected_fields(info, 'items')
     return AppointmentPaginationResult(
-        items=result['items'],
+        items=[project(a, AppointmentType, fields) for a in result['items']],
         page_info=PageInfo(**result['page_info'])
     )
 
+def resolve_get_calendar(
+    from_: str,
+    to: str,
+    lead_id: Optional[str] = None,
+    location: Optional[str] = None,
+    info: Optional[Info] = None
+) -> List[CalendarDay]:
+    # Read only the day buckets in range; they are already ordered by start time
+    fields = selected_fields(info, 'appointments')
+    return [
+        CalendarDay(date=day, appointments=[project(a, AppointmentType, fields) for a in appointments])
+        for day, appointments in calendar_index.days(from_, to, lead_id, location)
+    ]
+
 def resolve_get_vehicle(id: str) -> Optional[VehicleType]:
     vehicle = db.get(Vehicle, id)
     if vehicle:
@@ -261,37 +421,22 @@ def resolve_get_vehicle(id: str) -> Optional[VehicleType]:
 def resolve_get_vehicles_by_lead(lead_id: str) -> List[VehicleType]:
     vehicles = [
         VehicleType(**v.to_dict())
-        for v in db.get_all(Vehicle)
-        if v.lead_id == lead_id
+        for v in db.get_by_foreign_key(Vehicle, 'lead_id', lead_id)
     ]
     return vehicles
 
 def resolve_get_vehicles(
     filter: Optional[VehicleFilterInput] = None,
     sort_by: str = "CREATED_AT",
-    sort_order: str = "DESC"
+    sort_order: str = "DESC",
+    info: Optional[Info] = None
 ) -> List[VehicleType]:
-    vehicles = [VehicleType(**v.to_dict()) for v in db.get_all(Vehicle)]
-
-    # Apply filters
-    if filter:
-        vehicles = apply_vehicle_filters(vehicles, filter)
-
-    # Apply sorting
-    reverse_sort = sort_order == "DESC"
-
-    if sort_by == "MAKE":
-        vehicles.sort(key=lambda x: x.make or "", reverse=reverse_sort)
-    elif sort_by == "MODEL":
-        vehicles.sort(key=lambda x: x.model or "", reverse=reverse_sort)
-    elif sort_by == "YEAR":
-        vehicles.sort(key=lambda x: x.year or "", reverse=reverse_sort)
-    elif sort_by == "MILEAGE":
-        vehicles.sort(key=lambda x: x.mileage or 0, reverse=reverse_sort)
-    elif sort_by == "CREATED_AT":
-        vehicles.sort(key=lambda x: x.created_at, reverse=reverse_sort)
-
-    return vehicles
+    # Filtered and sorted by the database, then only the selected columns are copied
+    reverse_sort = sort_order.upper() == "DESC"
+    sort_field = VEHICLE_SORT_FIELDS.get(sort_by.upper())
+    vehicles = db.select(Vehicle, vehicle_where(filter), sort_field, reverse_sort)
+    fields = selected_fields(info)
+    return [project(v, VehicleType, fields) for v in vehicles]
 
 # Field Resolvers
 def resolve_lead_tasks(lead: LeadType) -> List[TaskType]:
@@ -300,8 +445,7 @@ def resolve_lead_tasks(lead: LeadType) -> List[TaskType]:
 def resolve_lead_vehicles(lead: LeadType, filter: Optional[VehicleFilterInput] = None) -> List[VehicleType]:
     vehicles = [
         VehicleType(**v.to_dict())
-        for v in db.get_all(Vehicle)
-        if v.lead_id == lead.id
+        for v in db.get_by_foreign_key(Vehicle, 'lead_id', lead.id)
     ]
     if filter:
         vehicles = apply_vehicle_filters(vehicles, filter)
@@ -313,8 +457,7 @@ def resolve_lead_notes(lead: LeadType) -> List[NoteType]:
 
 def resolve_lead_appointments(lead_id: str, filter: Optional[AppointmentFilterInput] = None) -> List[AppointmentType]:
     from .types import AppointmentType
-    appointments = db.get_all(Appointment)
-    lead_appointments = [a for a in appointments if a.lead_id == lead_id]
+    lead_appointments = db.get_by_foreign_key(Appointment, 'lead_id', lead_id)
 
     if filter and filter.status:
         if filter.status.eq:
@@ -328,36 +471,32 @@ def resolve_lead_appointments(lead_id: str, filter: Optional[AppointmentFilterIn
 
     return [AppointmentType(**appt.to_dict()) for appt in lead_appointments]
 
-def resolve_task_lead(task: TaskType) -> Optional[LeadType]:
-    lead = db.get(Lead, task.lead_id)
-    if lead:
-        return LeadType(**lead.to_dict())
+def _load(model_type: type, graphql_type: type, id: str, loaders: Optional[DataLoaders] = None) -> Optional[Any]:
+    if loaders is not None:
+        return loaders.load(model_type, graphql_type, id)
+    row = db.get(model_type, id)
+    if row:
+        return graphql_type(**row.to_dict())
     return None
 
+def resolve_task_lead(task: TaskType, loaders: Optional[DataLoaders] = None) -> Optional[LeadType]:
+    return _load(Lead, LeadType, task.lead_id, loaders)
+
 def resolve_task_notes(task: TaskType) -> List[NoteType]:
     return [n for n in resolve_get_notes_by_task(task.id)]
 
-def resolve_note_lead(note: NoteType) -> Optional[LeadType]:
+def resolve_note_lead(note: NoteType, loaders: Optional[DataLoaders] = None) -> Optional[LeadType]:
     if not note.lead_id:
         return None
-    lead = db.get(Lead, note.lead_id)
-    if lead:
-        return LeadType(**lead.to_dict())
-    return None
+    return _load(Lead, LeadType, note.lead_id, loaders)
 
-def resolve_note_task(note: NoteType) -> Optional[TaskType]:
+def resolve_note_task(note: NoteType, loaders: Optional[DataLoaders] = None) -> Optional[TaskType]:
     if not note.task_id:
         return None
-    task = db.get(Task, note.task_id)
-    if task:
-        return TaskType(**task.to_dict())
-    return None
+    return _load(Task, TaskType, note.task_id, loaders)
 
-def resolve_appointment_lead(appointment: AppointmentType) -> Optional[LeadType]:
-    lead = db.get(Lead, appointment.lead_id)
-    if lead:
-        return LeadType(**lead.to_dict())
-    return None
+def resolve_appointment_lead(appointment: AppointmentType, loaders: Optional[DataLoaders] = None) -> Optional[LeadType]:
+    return _load(Lead, LeadType, appointment.lead_id, loaders)
 
 def resolve_appointment_notes(appointment: AppointmentType) -> List[NoteType]:
     # This is a simplified version - in a real app, you'd have a many-to-many relationship
@@ -367,14 +506,11 @@ def resolve_appointment_notes(appointment: AppointmentType) -> List[NoteType]:
         if hasattr(n, 'appointment_id') and n.appointment_id == appointment.id
     ]
 
-def resolve_vehicle_lead(vehicle: VehicleType) -> Optional[LeadType]:
+def resolve_vehicle_lead(vehicle: VehicleType, loaders: Optional[DataLoaders] = None) -> Optional[LeadType]:
     if not hasattr(vehicle, 'lead_id') or not vehicle.lead_id:
         return None
 
-    lead = db.get(Lead, vehicle.lead_id)
-    if lead:
-        return LeadType(**lead.to_dict())
-    return None
+    return _load(Lead, LeadType, vehicle.lead_id, loaders)
 
 # Mutation Resolvers
 def resolve_create_lead(input: LeadInput) -> LeadType:
@@ -474,12 +610,43 @@ def resolve_update_vehicle(id: str, input: VehicleInput) -> Optional[VehicleType
 def resolve_delete_vehicle(id: str) -> bool:
     return db.delete(Vehicle, id)
 
-def resolve_get_all_tasks(page: int = 0, size: int = 10) -> dict:
-    all_tasks = db.get_all(Task)
-    tasks_data = [TaskType(**task.to_dict()) for task in all_tasks]
-    result = paginate(tasks_data, page, size)
+def resolve_score_leads(full: bool = False) -> LeadScoringRun:
+    # Re-score leads changed since the last run, or all of them
+    return LeadScoringRun(**scorer.run(full))
+
+def _duplicate_group(ids: List[str], matched_on: Iterable[str]) -> DuplicateLeadGroup:
+    return DuplicateLeadGroup(
+        leads=[LeadType(**db.get(Lead, id).to_dict()) for id in ids],
+        matched_on=sorted(matched_on),
+    )
+
+def resolve_find_duplicate_leads(lead_id: Optional[str] = None, limit: int = 50) -> List[DuplicateLeadGroup]:
+    # Leads sharing a normalized email, phone or name + locality, from the blocking index
+    if lead_id is not None:
+        ids, matched_on = duplicate_index.duplicates_of(lead_id)
+        return [_duplicate_group(ids, matched_on)] if ids else []
+    return [_duplicate_group(ids, matched_on) for ids, matched_on in duplicate_index.groups(limit)]
+
+def resolve_merge_leads(target_id: str, source_ids: List[str]) -> LeadType:
+    lead = merge_leads(target_id, source_ids)
+    return LeadType(**lead.to_dict())
+
+def resolve_get_all_tasks(page: int = 0, size: int = 10, info: Optional[Info] = None,
+                          filter: Optional[TaskFilterInput] = None, include_archived: bool = False) -> dict:
+    where = where_for({field: getattr(filter, field) for field in TASK_BITMAP_FILTERS}) if filter else {}
+    if include_archived:
+        # Archived tasks follow the hot ones; decompresses every archived task
+        tasks = db.select(Task, where)
+        tasks += [
+            task for task in archive.iter_all(Task)
+            if all(matches(getattr(task, field), condition) for field, condition in where.items())
+        ]
+        result = paginate(tasks, page, size)
+    else:
+        result = paginate_where(Task, where, page, size)
+    fields = selected_fields(info, 'items')
     return {
-        'items': result['items'],
+        'items': [project(task, TaskType, fields) for task in result['items']],
         'page_info': {
             'total': result['page_info']['total'],
             'page': result['page_info']['page'],
@@ -490,26 +657,158 @@ def resolve_get_all_tasks(page: int = 0, size: int = 10) -> dict:
     }
 
 
+def resolve_overdue_tasks(limit: int = 100, info: Optional[Info] = None) -> List[TaskType]:
+    # Read from the due-date heap, earliest first
+    fields = selected_fields(info)
+    return [project(task, TaskType, fields) for task in scheduler.overdue_tasks(limit=limit)]
+
+
+def resolve_tasks_due_within(hours: float, limit: int = 100, info: Optional[Info] = None) -> List[TaskType]:
+    fields = selected_fields(info)
+    return [project(task, TaskType, fields) for task in scheduler.tasks_due_within(hours, limit=limit)]
+
+
 def resolve_get_lead_status_counts() -> List[LeadStatusCount]:
     from .types import LeadStatus  # Import here to avoid circular imports
     from collections import defaultdict
 
-    # Get all leads
-    all_leads = db.get_all(Lead)
+    # Counted by the database (popcounts of the status bitmaps in memory)
+    counted = db.count_values(Lead, 'lead_status')
 
     # Initialize counts for all statuses
     status_counts = defaultdict(int)
     for status in LeadStatus:
-        status_counts[status.value] = 0
-
-    # Count leads per status
-    for lead in all_leads:
-        status = lead.to_dict().get('lead_status')
-        if status in status_counts:
-            status_counts[status] += 1
+        status_counts[status.value] = counted.get(status.value, 0)
 
     # Convert to list of LeadStatusCount objects
     return [
         LeadStatusCount(status=status, count=count)
         for status, count in status_counts.items()
-    ]
\ No newline at end of file
+    ]
+
+
+def resolve_changes_since(
+        version: int,
+        types: Optional[List[str]] = None,
+        limit: int = 500
+) -> ChangeSet:
+    model_types = {m.__name__: m for m in (Lead, Task, Note, Appointment, Vehicle)}
+    entries, high_water, full_resync = db.changes_since(version, types, limit)
+
+    changes = []
+    for entry_version, model_name, id, operation in entries:
+        row = db.get(model_types[model_name], id)
+        archived = row is None and model_name in ARCHIVED_TYPES
+        if archived:
+            row = archive.get(model_types[model_name], id)
+            archived = row is not None
+        # A row missing here was deleted after this entry; send a tombstone now
+        changes.append(ChangeEntry(
+            version=entry_version,
+            type=model_name,
+            id=id,
+            deleted=row is None,
+            data=row.to_dict() if row is not None else None,
+            archived=archived
+        ))
+
+    return ChangeSet(
+        changes=changes,
+        version=high_water,
+        full_resync=full_resync,
+        has_more=high_water < db.version
+    )
+
+
+# Subscription Resolvers
+def _event_filter(**conditions: Any):
+    # Match events whose row snapshot has the given values; None means "any"
+    conditions = {k: getattr(v, 'value', v) for k, v in conditions.items() if v is not None}
+    operations = conditions.pop('operations', None)
+    if not conditions and not operations:
+        return None
+
+    def predicate(event: ChangeEvent) -> bool:
+        if operations and event.operation not in operations:
+            return False
+        data = event.data
+        return all(data.get(field) == value for field, value in conditions.items())
+
+    return predicate
+
+
+def _build_lead_event(event: ChangeEvent) -> LeadChangeEvent:
+    return LeadChangeEvent(
+        operation=ChangeOperation(event.operation),
+        id=event.id,
+        lead=LeadType(**event.data)
+    )
+
+
+def _build_appointment_event(event: ChangeEvent) -> AppointmentChangeEvent:
+    return AppointmentChangeEvent(
+        operation=ChangeOperation(event.operation),
+        id=event.id,
+        appointment=AppointmentType(**event.data)
+    )
+
+
+def _build_task_event(event: ChangeEvent) -> TaskChangeEvent:
+    return TaskChangeEvent(
+        operation=ChangeOperation(event.operation),
+        id=event.id,
+        task=TaskType(**event.data)
+    )
+
+
+async def resolve_lead_changed(
+        id: Optional[str] = None,
+        lead_status: Optional[LeadStatus] = None,
+        operations: Optional[List[ChangeOperation]] = None
+) -> AsyncGenerator[LeadChangeEvent, None]:
+    predicate = _event_filter(
+        id=id,
+        lead_status=lead_status,
+        operations={op.value for op in operations} if operations else None
+    )
+    async for event in event_bus.subscribe('Lead', predicate):
+        yield event.payload(LeadChangeEvent, _build_lead_event)
+
+
+async def resolve_appointment_changed(
+        lead_id: Optional[str] = None,
+        status: Optional[AppointmentStatus] = None,
+        operations: Optional[List[ChangeOperation]] = None
+) -> AsyncGenerator[AppointmentChangeEvent, None]:
+    predicate = _event_filter(
+        lead_id=lead_id,
+        status=status,
+        operations={op.value for op in operations} if operations else None
+    )
+    async for event in event_bus.subscribe('Appointment', predicate):
+        yield event.payload(AppointmentChangeEvent, _build_appointment_event)
+
+
+async def resolve_task_changed(
+        lead_id: Optional[str] = None,
+        status: Optional[TaskStatus] = None,
+        assignee: Optional[str] = None,
+        operations: Optional[List[ChangeOperation]] = None
+) -> AsyncGenerator[TaskChangeEvent, None]:
+    predicate = _event_filter(
+        lead_id=lead_id,
+        status=status,
+        assignee=assignee,
+        operations={op.value for op in operations} if operations else None
+    )
+    async for event in event_bus.subscribe('Task', predicate):
+        yield event.payload(TaskChangeEvent, _build_task_event)
+
+
+def _build_reminder(event: ChangeEvent) -> AppointmentType:
+    return AppointmentType(**event.data)
+
+
+async def resolve_appointment_reminder(lead_id: Optional[str] = None) -> AsyncGenerator[AppointmentType, None]:
+    async for event in event_bus.subscribe(REMINDER_EVENT_TYPE, _event_filter(lead_id=lead_id)):
+        yield event.payload(AppointmentType, _build_reminder)
@@ -1,23 +1,28 @@
+import os
 import strawberry
-from typing import List, Optional
+from strawberry.extensions import ParserCache, ValidationCache
+from strawberry.types import Info
+from typing import AsyncGenerator, List, Optional
+from typing_extensions import Annotated
 
 from app.models.vehicle import Vehicle
 
+from .incremental import IncrementalExecutionContext, defer, stream
 from .types import (
     LeadType, TaskType, NoteType, AppointmentType, VehicleType,
     LeadInput, TaskInput, NoteInput, AppointmentInput, VehicleInput,
     LeadPaginationResult, TaskPaginationResult, AppointmentPaginationResult, PageInfo,
-    VehicleFilterInput, AppointmentFilterInput, LeadFilterInput, SortOrder, AppointmentSortField, VehicleSortField,
-    LeadStatusCount
+    VehicleFilterInput, AppointmentFilterInput, LeadFilterInput, TaskFilterInput, SortOrder, AppointmentSortField, VehicleSortField,
+    LeadStatusCount, CalendarDay, LeadScoringRun, DuplicateLeadGroup, LeadStatus, AppointmentStatus, TaskStatus, ChangeOperation,
+    LeadChangeEvent, AppointmentChangeEvent, TaskChangeEvent, ChangeSet
 )
 from .resolvers import (
     # Query resolvers
     resolve_get_lead, resolve_get_all_leads, resolve_get_leads_by_status,
     resolve_get_task, resolve_get_all_tasks, resolve_get_tasks_by_lead,
     resolve_get_note, resolve_get_notes_by_lead, resolve_get_notes_by_task,
-    resolve_get_appointment, resolve_get_all_appointments,
+    resolve_get_appointment, resolve_get_all_appointments, resolve_get_calendar,
     resolve_get_vehicle, resolve_get_vehicles_by_lead, resolve_get_vehicles,
-    apply_vehicle_filters,
 
     # Mutation resolvers
     resolve_create_lead, resolve_update_lead, resolve_delete_lead,
@@ -25,13 +30,18 @@ from .resolvers import (
     resolve_create_note, resolve_update_note, resolve_delete_note,
     resolve_create_appointment, resolve_update_appointment, resolve_delete_appointment,
     resolve_create_vehicle, resolve_update_vehicle, resolve_delete_vehicle,
+    resolve_score_leads, resolve_find_duplicate_leads, resolve_merge_leads,
 
     # Field resolvers
     resolve_lead_tasks, resolve_lead_vehicles, resolve_lead_notes, resolve_lead_appointments,
     resolve_task_lead, resolve_task_notes,
     resolve_note_lead, resolve_note_task,
     resolve_appointment_lead, resolve_appointment_notes,
-    resolve_vehicle_lead, resolve_get_lead_status_counts
+    resolve_vehicle_lead, resolve_get_lead_status_counts, resolve_changes_since,
+    resolve_overdue_tasks, resolve_tasks_due_within,
+
+    # Subscription resolvers
+    resolve_lead_changed, resolve_appointment_changed, resolve_task_changed, resolve_appointment_reminder
 )
 
 from app.db import db
@@ -43,28 +53,37 @@ class Query:
         return resolve_get_lead(id)
 
     @strawberry.field
-    def getAllLeads(self, page: int = 0, size: int = 10, filter: Optional[LeadFilterInput] = None) -> LeadPaginationResult:
-        return resolve_get_all_leads(page, size, filter)
+    def getAllLeads(self, info: Info, page: int = 0, size: int = 10, filter: Optional[LeadFilterInput] = None) -> LeadPaginationResult:
+        return resolve_get_all_leads(page, size, filter, info)
 
     @strawberry.field
-    def getLeadsByStatus(self, status: str) -> LeadPaginationResult:
-        return resolve_get_leads_by_status(status)
+    def getLeadsByStatus(self, info: Info, status: str) -> LeadPaginationResult:
+        return resolve_get_leads_by_status(status, info)
 
     @strawberry.field
-    def getTask(self, id: str) -> Optional[TaskType]:
-        return resolve_get_task(id)
+    def getTask(self, id: str, include_archived: bool = False) -> Optional[TaskType]:
+        return resolve_get_task(id, include_archived)
 
     @strawberry.field
-    def getAllTasks(self, page: int = 0, size: int = 10) -> TaskPaginationResult:
-        result = resolve_get_all_tasks(page, size)
+    def getAllTasks(self, info: Info, page: int = 0, size: int = 10,
+                    filter: Optional[TaskFilterInput] = None, include_archived: bool = False) -> TaskPaginationResult:
+        result = resolve_get_all_tasks(page, size, info, filter, include_archived)
         return TaskPaginationResult(
             items=result['items'],
             page_info=PageInfo(**result['page_info'])
         )
 
     @strawberry.field
-    def getTasksByLead(self, lead_id: str) -> List[TaskType]:
-        return resolve_get_tasks_by_lead(lead_id)
+    def getTasksByLead(self, lead_id: str, include_archived: bool = False) -> List[TaskType]:
+        return resolve_get_tasks_by_lead(lead_id, include_archived)
+
+    @strawberry.field
+    def overdueTasks(self, info: Info, limit: int = 100) -> List[TaskType]:
+        return resolve_overdue_tasks(limit, info)
+
+    @strawberry.field
+    def tasksDueWithin(self, info: Info, hours: float, limit: int = 100) -> List[TaskType]:
+        return resolve_tasks_due_within(hours, limit, info)
 
     @strawberry.field
     def getNote(self, id: str) -> Optional[NoteType]:
@@ -79,19 +98,32 @@ class Query:
         return resolve_get_notes_by_task(task_id)
 
     @strawberry.field
-    def getAppointment(self, id: str) -> Optional[AppointmentType]:
-        return resolve_get_appointment(id)
+    def getAppointment(self, id: str, include_archived: bool = False) -> Optional[AppointmentType]:
+        return resolve_get_appointment(id, include_archived)
 
     @strawberry.field
     def getAllAppointments(
         self, 
+        info: Info,
         page: int = 0, 
         size: int = 10, 
         sort_by: str = "START_TIME", 
         sort_order: str = "DESC",
-        filter: Optional[AppointmentFilterInput] = None
+        filter: Optional[AppointmentFilterInput] = None,
+        include_archived: bool = False
     ) -> AppointmentPaginationResult:
-        return resolve_get_all_appointments(page, size, sort_by, sort_order, filter)
+        return resolve_get_all_appointments(page, size, sort_by, sort_order, filter, info, include_archived)
+
+    @strawberry.field
+    def getCalendar(
+        self,
+        info: Info,
+        from_: Annotated[str, strawberry.argument(name="from")],
+        to: str,
+        lead_id: Optional[str] = None,
+        location: Optional[str] = None
+    ) -> List[CalendarDay]:
+        return resolve_get_calendar(from_, to, lead_id, location, info)
 
     @strawberry.field
     def getVehicle(self, id: str) -> Optional[VehicleType]:
@@ -104,31 +136,25 @@ class Query:
     @strawberry.field
     def getVehicles(
             self,
+            info: Info,
             filter: Optional[VehicleFilterInput] = None,
             sort_by: str = "CREATED_AT",
             sort_order: str = "DESC"
     ) -> List[VehicleType]:
-        vehicles = db.get_all(Vehicle)
-        vehicle_data = [VehicleType(**v.to_dict()) for v in vehicles]
-
-        if filter:
-            vehicle_data = apply_vehicle_filters(vehicle_data, filter)
+        return resolve_get_vehicles(filter, sort_by, sort_order, info)
 
-        # Apply sorting
-        reverse = sort_order.upper() == "DESC"
-        if sort_by.upper() == "MAKE":
-            vehicle_data.sort(key=lambda x: x.make or "", reverse=reverse)
-        elif sort_by.upper() == "MODEL":
-            vehicle_data.sort(key=lambda x: x.model or "", reverse=reverse)
-        elif sort_by.upper() == "YEAR":
-            vehicle_data.sort(key=lambda x: x.year or "", reverse=reverse)
-        # Add more sort options as needed
+    @strawberry.field
+    def findDuplicateLeads(self, lead_id: Optional[str] = None, limit: int = 50) -> List[DuplicateLeadGroup]:
+        return resolve_find_duplicate_leads(lead_id, limit)
 
-        return vehicle_data
     @strawberry.field
     def get_lead_status_counts(self) -> List[LeadStatusCount]:
         return resolve_get_lead_status_counts()
 
+    @strawberry.field
+    def changesSince(self, version: int, types: Optional[List[str]] = None, limit: int = 500) -> ChangeSet:
+        return resolve_changes_since(version, types, limit)
+
 @strawberry.type
 class Mutation:
     @strawberry.mutation
@@ -191,7 +217,72 @@ class Mutation:
     def deleteVehicle(self, id: str) -> bool:
         return resolve_delete_vehicle(id)
 
+    @strawberry.mutation
+    def scoreLeads(self, full: bool = False) -> LeadScoringRun:
+        return resolve_score_leads(full)
+
+    @strawberry.mutation
+    def mergeLeads(self, target_id: str, source_ids: List[str]) -> LeadType:
+        return resolve_merge_leads(target_id, source_ids)
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def leadChanged(
+        self,
+        id: Optional[str] = None,
+        lead_status: Optional[LeadStatus] = None,
+        operations: Optional[List[ChangeOperation]] = None
+    ) -> AsyncGenerator[LeadChangeEvent, None]:
+        async for event in resolve_lead_changed(id, lead_status, operations):
+            yield event
+
+    @strawberry.subscription
+    async def appointmentChanged(
+        self,
+        lead_id: Optional[str] = None,
+        status: Optional[AppointmentStatus] = None,
+        operations: Optional[List[ChangeOperation]] = None
+    ) -> AsyncGenerator[AppointmentChangeEvent, None]:
+        async for event in resolve_appointment_changed(lead_id, status, operations):
+            yield event
+
+    @strawberry.subscription
+    async def taskChanged(
+        self,
+        lead_id: Optional[str] = None,
+        status: Optional[TaskStatus] = None,
+        assignee: Optional[str] = None,
+        operations: Optional[List[ChangeOperation]] = None
+    ) -> AsyncGenerator[TaskChangeEvent, None]:
+        async for event in resolve_task_changed(lead_id, status, assignee, operations):
+            yield event
+
+    @strawberry.subscription
+    async def appointmentReminder(self, lead_id: Optional[str] = None) -> AsyncGenerator[AppointmentType, None]:
+        async for appointment in resolve_appointment_reminder(lead_id):
+            yield appointment
+
+
+# Parsed and validated documents are cached per query string and shared by
+# every transport (HTTP router, websockets and in-process clients)
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "1000"))
 
 # Create the schema
-schema = strawberry.Schema(query=Query, mutation=Mutation)
-print(schema)
\ No newline at end of file
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[
+        ParserCache(maxsize=DOCUMENT_CACHE_SIZE),
+        ValidationCache(maxsize=DOCUMENT_CACHE_SIZE),
+    ],
+    execution_context_class=IncrementalExecutionContext,
+)
+
+# Declared on the underlying graphql-core schema rather than as strawberry
+# directives, which would add a directive hook to every field resolution
+schema._schema.directives = (
+    *schema._schema.directives,
+    *(schema.schema_converter.from_directive(directive) for directive in (defer, stream)),
+)
@@ -7,6 +7,9 @@ from strawberry.scalars import JSON
 from typing import TYPE_CHECKING, List, Optional
 import strawberry
 from strawberry.scalars import JSON
+from strawberry.types import Info
+
+from .loaders import get_loaders
 
 if TYPE_CHECKING:
     from .resolvers import (
@@ -84,6 +87,14 @@ class AppointmentStatus(Enum):
     CANCELLED = "CANCELLED"
     NO_SHOW = "NO_SHOW"
 
+@strawberry.enum
+class ChangeOperation(Enum):
+    CREATED = "CREATED"
+    UPDATED = "UPDATED"
+    DELETED = "DELETED"
+    # Moved to the archive; still readable with includeArchived
+    ARCHIVED = "ARCHIVED"
+
 @strawberry.enum
 class VehicleCondition(Enum):
     NEW = "NEW"
@@ -151,6 +162,11 @@ class AppointmentFilterInput:
     lead_id: Optional[str] = None
     start_time: Optional[TimeRangeInput] = None
 
+@strawberry.input
+class TaskFilterInput:
+    status: Optional[StringFilterInput] = None
+    priority: Optional[StringFilterInput] = None
+
 @strawberry.input
 class LeadFilterInput:
     name: Optional[StringFilterInput] = None
@@ -262,9 +278,9 @@ class VehicleType:
     updated_at: str
 
     @strawberry.field
-    def lead(self) -> Optional["LeadType"]:
+    def lead(self, info: Info) -> Optional["LeadType"]:
         from .resolvers import resolve_vehicle_lead
-        return resolve_vehicle_lead(self)
+        return resolve_vehicle_lead(self, get_loaders(info))
 
 @strawberry.type
 class TaskType:
@@ -280,9 +296,9 @@ class TaskType:
     updated_at: str
 
     @strawberry.field
-    def lead(self) -> Optional["LeadType"]:
-        # This will be resolved by the resolver
-        pass
+    def lead(self, info: Info) -> Optional["LeadType"]:
+        from .resolvers import resolve_task_lead
+        return resolve_task_lead(self, get_loaders(info))
 
     @strawberry.field
     def notes(self) -> List["NoteType"]:
@@ -301,14 +317,14 @@ class NoteType:
     updated_at: str
 
     @strawberry.field
-    def lead(self) -> Optional["LeadType"]:
-        # This will be resolved by the resolver
-        pass
+    def lead(self, info: Info) -> Optional["LeadType"]:
+        from .resolvers import resolve_note_lead
+        return resolve_note_lead(self, get_loaders(info))
 
     @strawberry.field
-    def task(self) -> Optional[TaskType]:
-        # This will be resolved by the resolver
-        pass
+    def task(self, info: Info) -> Optional[TaskType]:
+        from .resolvers import resolve_note_task
+        return resolve_note_task(self, get_loaders(info))
 
 @strawberry.type
 class AppointmentType:
@@ -325,9 +341,9 @@ class AppointmentType:
     updated_at: str
 
     @strawberry.field
-    def lead(self) -> Optional["LeadType"]:
-        # This will be resolved by the resolver
-        pass
+    def lead(self, info: Info) -> Optional["LeadType"]:
+        from .resolvers import resolve_appointment_lead
+        return resolve_appointment_lead(self, get_loaders(info))
 
     @strawberry.field
     def notes(self) -> List[NoteType]:
@@ -381,7 +397,69 @@ class TaskPaginationResult:
     items: List["TaskType"]
     page_info: "PageInfo"
 
+@strawberry.type
+class CalendarDay:
+    date: str
+    appointments: List[AppointmentType]
+
+@strawberry.type
+class LeadScoringRun:
+    scored: int
+    updated: int
+    full: bool
+    vectorized: bool
+    duration_ms: float
+    finished_at: str
+
+@strawberry.type
+class DuplicateLeadGroup:
+    leads: List[LeadType]
+    # Kinds of key the leads share: email, phone, name
+    matched_on: List[str]
+
 @strawberry.type
 class LeadStatusCount:
     status: str
-    count: int
\ No newline at end of file
+    count: int
+
+# Subscription Types
+@strawberry.type
+class LeadChangeEvent:
+    operation: ChangeOperation
+    id: str
+    # Last known state for DELETED events
+    lead: LeadType
+
+@strawberry.type
+class AppointmentChangeEvent:
+    operation: ChangeOperation
+    id: str
+    appointment: AppointmentType
+
+@strawberry.type
+class TaskChangeEvent:
+    operation: ChangeOperation
+    id: str
+    task: TaskType
+
+# Incremental Sync Types
+@strawberry.type
+class ChangeEntry:
+    version: int
+    type: str
+    id: str
+    deleted: bool
+    # Current row for upserts, null for tombstones
+    data: Optional[JSON] = None
+    # The row was moved to the archive: keep it, it is no longer updated
+    archived: bool = False
+
+@strawberry.type
+class ChangeSet:
+    changes: List[ChangeEntry]
+    # High-water mark to pass as `version` on the next call
+    version: int
+    # True when the change log no longer covers the requested version and the
+    # client must re-download everything and resume from `version`
+    full_resync: bool
+    has_more: bool
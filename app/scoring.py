@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .archive import archive
+from .db import REMOVALS, db
+from .metrics import registry
+from .models import Appointment, Lead, Task, Vehicle
+from .scheduler import naive_utc
+
+# Seconds between background re-scoring runs; 0 disables the background job
+LEAD_SCORING_INTERVAL = float(os.getenv("LEAD_SCORING_INTERVAL", "300"))
+# Leads scored per batch; the background job yields to the event loop between batches
+LEAD_SCORING_BATCH = int(os.getenv("LEAD_SCORING_BATCH", "5000"))
+
+STATUS_VALUES = {"NEW": 0.2, "CONTACTED": 0.4, "QUALIFIED": 0.8, "UNQUALIFIED": 0.0, "CUSTOMER": 1.0}
+SOURCE_VALUES = {
+    "Referral": 1.0, "Walk-in": 0.8, "Phone Inquiry": 0.6, "Website": 0.4, "Email": 0.3, "Social Media": 0.2,
+}
+CONDITION_VALUES = {"NEW": 1.0, "CERTIFIED_PREOWNED": 0.7, "USED": 0.4, "LEMON": 0.0, "SALVAGE": 0.0}
+CLOSED_TASK_STATUSES = {"COMPLETED", "CANCELLED"}
+MISSED_APPOINTMENT_STATUSES = {"CANCELLED", "NO_SHOW"}
+UPCOMING_APPOINTMENT_STATUSES = {"SCHEDULED", "CONFIRMED"}
+
+# Logistic model over features scaled to 0..1; score = 100 * sigmoid(weights . features + bias)
+FEATURES = (
+    "status", "source", "contactable",
+    "tasks_completed", "tasks_open", "tasks_overdue",
+    "appointment_recency", "upcoming_appointment",
+    "vehicles", "vehicle_age", "vehicle_condition",
+)
+WEIGHTS = (2.0, 1.0, 0.8, 0.6, 0.3, -0.8, 1.2, 1.0, 0.4, -0.6, 0.5)
+BIAS = -2.5
+
+leads_scored = registry.counter("leads_scored_total", "Leads run through the scoring model")
+scoring_seconds = registry.summary("lead_scoring_seconds", "Time spent in lead scoring runs", ("mode",))
+
+logger = logging.getLogger(__name__)
+
+
+def _days_between(earlier: str, later: str) -> float:
+    return (datetime.fromisoformat(later) - datetime.fromisoformat(earlier)).total_seconds() / 86400
+
+
+def lead_features(lead: Lead, now: str, year: int,
+                  archived_completed: int = 0, archived_seen: Optional[str] = None) -> List[float]:
+    """Feature vector of one lead, in FEATURES order.
+
+    ``now`` is a naive UTC ISO string. Row times are normalised the same way;
+    ones that aren't timestamps are left out of the time-based features.
+    ``archived_completed`` and ``archived_seen`` carry the lead's completed
+    tasks and latest attended appointment start from the archive.
+    """
+    tasks = db.get_by_foreign_key(Task, "lead_id", lead.id)
+    completed = archived_completed + sum(1 for t in tasks if t.status == "COMPLETED")
+    open_tasks = [t for t in tasks if t.status not in CLOSED_TASK_STATUSES]
+    due_dates = (naive_utc(t.due_date) for t in open_tasks)
+    overdue = sum(1 for due in due_dates if due is not None and due < now)
+
+    last_seen = archived_seen
+    upcoming = 0.0
+    for appointment in db.get_by_foreign_key(Appointment, "lead_id", lead.id):
+        start = naive_utc(appointment.start_time)
+        if start is None:
+            continue
+        if start > now:
+            if appointment.status in UPCOMING_APPOINTMENT_STATUSES:
+                upcoming = 1.0
+        elif appointment.status not in MISSED_APPOINTMENT_STATUSES:
+            last_seen = max(last_seen or start, start)
+    recency = max(0.0, 1 - _days_between(last_seen, now) / 90) if last_seen else 0.0
+
+    vehicles = db.get_by_foreign_key(Vehicle, "lead_id", lead.id)
+    years = [int(v.year) for v in vehicles if v.year and str(v.year).isdigit()]
+    vehicle_age = min((year - max(years)) / 20, 1.0) if years else 0.0
+    condition = max((CONDITION_VALUES.get(v.condition, 0.0) for v in vehicles), default=0.0)
+
+    return [
+        STATUS_VALUES.get(lead.lead_status, 0.0),
+        SOURCE_VALUES.get(lead.lead_source, 0.0),
+        (0.5 if lead.email else 0.0) + (0.5 if lead.phone else 0.0),
+        min(completed / 5, 1.0),
+        min(len(open_tasks) / 5, 1.0),
+        min(overdue / 3, 1.0),
+        recency,
+        upcoming,
+        min(len(vehicles) / 3, 1.0),
+        max(vehicle_age, 0.0),
+        condition,
+    ]
+
+
+def score_features(rows: Sequence[List[float]]) -> List[int]:
+    """Scores 0-100 for a batch of feature vectors, in one vectorized pass when numpy is available."""
+    if not rows:
+        return []
+    if np is not None:
+        z = np.asarray(rows, dtype=float) @ np.asarray(WEIGHTS) + BIAS
+        return np.rint(100 / (1 + np.exp(-z))).astype(int).tolist()
+    # Same model, one row at a time
+    return [round(100 / (1 + math.exp(-(BIAS + sum(w * x for w, x in zip(WEIGHTS, row)))))) for row in rows]
+
+
+class LeadScorer:
+    """Batch scoring of Lead.lead_score.
+
+    Changes to a lead or to its tasks, appointments and vehicles mark the lead
+    dirty, so incremental runs re-score only those leads. Scores are written
+    back with one bulk update, and only where they changed. A task moved to
+    another lead only marks its new lead; the old one catches up on the next
+    full run.
+    """
+
+    def __init__(self):
+        self._dirty: Set[str] = set()
+        self._full_pending = True
+        self._writing = False
+        self._source: Any = db.memory_structures()["tables"]["Lead"]
+        self._runner: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        # Per lead: archived completed tasks and latest attended archived
+        # appointment, folded in from archive segments [0, _archived_segments)
+        self._archived_completed: Dict[str, int] = {}
+        self._archived_seen: Dict[str, str] = {}
+        self._archived_segments = 0
+        self._archived_merges = 0
+        db.add_listener(self.on_change)
+
+    def on_change(self, operation: str, model_name: str, id: str, model: Any) -> None:
+        if self._writing:
+            # Our own score write-back
+            return
+        if model_name == "Lead":
+            if operation in REMOVALS:
+                self._dirty.discard(id)
+            else:
+                self._dirty.add(id)
+        elif model_name in ("Task", "Appointment", "Vehicle"):
+            lead_id = getattr(model, "lead_id", None)
+            if lead_id:
+                self._dirty.add(lead_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def _take_leads(self, full: bool) -> List[Lead]:
+        # Picks up leads that gained archived rows through a merge
+        self._archived_activity()
+        tables = db.memory_structures()["tables"]
+        if tables["Lead"] is not self._source:
+            # db.clear() swapped the tables without notifying listeners
+            self._source = tables["Lead"]
+            self._full_pending = True
+        full = full or self._full_pending
+        dirty, self._dirty = self._dirty, set()
+        self._full_pending = False
+        if full:
+            return db.get_all(Lead)
+        return [lead for lead in (db.get(Lead, id) for id in dirty) if lead is not None]
+
+    def _put_back(self, leads: List[Lead], full: bool) -> None:
+        # A failed run mustn't lose the leads it had taken
+        if full:
+            self._full_pending = True
+        else:
+            self._dirty.update(lead.id for lead in leads)
+
+    def _archived_activity(self) -> Tuple[Dict[str, int], Dict[str, str]]:
+        # Archived rows never change, so only segments added since the last
+        # call are read, each block once, rather than every lead's blocks per run
+        segments = len(archive.segments)
+        if segments < self._archived_segments or archive.merges < self._archived_merges:
+            # The archive was closed
+            self._archived_completed, self._archived_seen, self._archived_segments = {}, {}, 0
+            self._archived_merges = 0
+        if archive.merges > self._archived_merges:
+            # Leads were merged: move their archived activity to the surviving lead
+            completed, seen = self._archived_completed, self._archived_seen
+            self._archived_completed, self._archived_seen = {}, {}
+            for lead_id in {*completed, *seen}:
+                target = archive.resolve_lead(lead_id)
+                if target != lead_id:
+                    self._dirty.add(target)
+                if lead_id in completed:
+                    self._archived_completed[target] = self._archived_completed.get(target, 0) + completed[lead_id]
+                start = seen.get(lead_id)
+                if start is not None and (target not in self._archived_seen or start > self._archived_seen[target]):
+                    self._archived_seen[target] = start
+            self._archived_merges = archive.merges
+        if segments > self._archived_segments:
+            for task in archive.iter_all(Task, self._archived_segments):
+                if task.status == "COMPLETED":
+                    self._archived_completed[task.lead_id] = self._archived_completed.get(task.lead_id, 0) + 1
+            for appointment in archive.iter_all(Appointment, self._archived_segments):
+                start = naive_utc(appointment.start_time)
+                if start is None or appointment.status in MISSED_APPOINTMENT_STATUSES:
+                    continue
+                seen = self._archived_seen.get(appointment.lead_id)
+                if seen is None or start > seen:
+                    self._archived_seen[appointment.lead_id] = start
+            self._archived_segments = segments
+        return self._archived_completed, self._archived_seen
+
+    def _score_batch(self, leads: List[Lead], now: str, year: int) -> int:
+        completed, seen = self._archived_activity()
+        scores = score_features([
+            lead_features(lead, now, year, completed.get(lead.id, 0), seen.get(lead.id)) for lead in leads
+        ])
+        changes = {
+            lead.id: {"lead_score": score}
+            for lead, score in zip(leads, scores)
+            if lead.lead_score != score
+        }
+        self._writing = True
+        try:
+            db.bulk_update(Lead, changes)
+        finally:
+            self._writing = False
+        return len(changes)
+
+    def _record(self, scored: int, updated: int, full: bool, started: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        leads_scored.inc(scored)
+        scoring_seconds.observe(elapsed, mode="full" if full else "incremental")
+        self.last_run = {
+            "scored": scored,
+            "updated": updated,
+            "full": full,
+            "vectorized": np is not None,
+            "duration_ms": round(elapsed * 1000, 1),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        return self.last_run
+
+    def run(self, full: bool = False) -> Dict[str, Any]:
+        """Score every dirty lead (or every lead) now, in one pass."""
+        started = time.perf_counter()
+        full = full or self._full_pending
+        leads = self._take_leads(full)
+        now = datetime.utcnow()
+        try:
+            updated = self._score_batch(leads, now.isoformat(), now.year)
+        except Exception:
+            self._put_back(leads, full)
+            raise
+        return self._record(len(leads), updated, full, started)
+
+    async def run_batched(self, full: bool = False) -> Dict[str, Any]:
+        """Like run(), yielding to the event loop after every LEAD_SCORING_BATCH leads."""
+        started = time.perf_counter()
+        full = full or self._full_pending
+        leads = self._take_leads(full)
+        now = datetime.utcnow()
+        updated = 0
+        for start in range(0, len(leads), LEAD_SCORING_BATCH):
+            try:
+                updated += self._score_batch(leads[start:start + LEAD_SCORING_BATCH], now.isoformat(), now.year)
+            except Exception:
+                self._put_back(leads[start:], full)
+                raise
+            await asyncio.sleep(0)
+        return self._record(len(leads), updated, full, started)
+
+    def start(self, interval: float = LEAD_SCORING_INTERVAL) -> None:
+        if self._runner is None:
+            self._runner = asyncio.get_running_loop().create_task(self._run_periodically(interval))
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+
+    async def _run_periodically(self, interval: float) -> None:
+        while True:
+            if self._full_pending or self._dirty or archive.merges != self._archived_merges:
+                try:
+                    await self.run_batched()
+                except Exception:
+                    # The leads are pending again; retry on the next tick
+                    logger.exception("Lead scoring run failed")
+            await asyncio.sleep(interval)
+
+
+scorer = LeadScorer()
@@ -0,0 +1,422 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar
+from uuid import uuid4
+
+from .models import Appointment, Lead, Note, Task, Vehicle
+from .storage import (
+    CREATED, DELETED, FOREIGN_KEYS, RELATIONSHIPS, SINGLE_RELATIONSHIPS, UPDATED,
+    StorageBackend, Where, _plain,
+)
+
+T = TypeVar('T')
+
+MODEL_TYPES: Dict[str, Type] = {
+    'Lead': Lead, 'Task': Task, 'Note': Note, 'Appointment': Appointment, 'Vehicle': Vehicle,
+}
+
+# Stored columns of each model; declared without types so values keep the
+# Python type they were written with
+COLUMNS = {
+    'Lead': ('name', 'email', 'phone', 'address', 'city', 'state', 'zip', 'lead_source', 'lead_status',
+             'lead_owner', 'lead_stage', 'lead_score', 'lead_description', 'lead_notes', 'lead_type'),
+    'Task': ('title', 'description', 'due_date', 'status', 'priority', 'assignee', 'lead_id'),
+    'Note': ('title', 'content', 'author', 'lead_id', 'task_id'),
+    'Appointment': ('title', 'description', 'location', 'start_time', 'end_time', 'status',
+                    'reminder_time', 'lead_id'),
+    'Vehicle': ('make', 'model', 'year', 'color', 'vin', 'license_plate', 'mileage', 'condition',
+                'notes', 'lead_id'),
+}
+
+# Columns the API filters or sorts on, indexed besides the foreign keys
+INDEXED_COLUMNS = {
+    'Lead': ('lead_status', 'lead_source'),
+    'Task': ('status', 'priority', 'due_date'),
+    'Appointment': ('status', 'start_time'),
+    'Vehicle': ('make', 'model', 'year', 'color', 'condition'),
+}
+
+# Columns the API sorts on; sorting reads IFNULL(column, '') (see select()),
+# so these get an index on that expression
+SORTED_COLUMNS = {
+    'Appointment': ('title', 'start_time', 'end_time', 'status', 'created_at'),
+    'Vehicle': ('make', 'model', 'year'),
+}
+
+# Statements kept prepared per connection; the SQL of every query shape is
+# built once per model, so repeated calls reuse the compiled statement
+SQLITE_CACHED_STATEMENTS = 256
+
+
+def _quote(name: str) -> str:
+    return f'"{name}"'
+
+
+def _condition_sql(column: str, condition: Any) -> Tuple[str, List[Any]]:
+    """SQL for one select() condition, with the same semantics as storage.matches()."""
+    if not isinstance(condition, dict):
+        if condition is None:
+            return f"{column} IS NULL", []
+        return f"{column} = ?", [_plain(condition)]
+    clauses: List[str] = []
+    params: List[Any] = []
+    parts = {part: value for part, value in condition.items() if value is not None}
+    if 'eq' in parts:
+        clauses.append(f"{column} = ?")
+        params.append(parts['eq'])
+    if 'ne' in parts:
+        clauses.append(f"({column} IS NULL OR {column} != ?)")
+        params.append(parts['ne'])
+    if 'in_list' in parts:
+        values = list(parts['in_list'])
+        clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+        params.extend(values)
+    if 'not_in' in parts and parts['not_in']:
+        values = list(parts['not_in'])
+        clauses.append(f"({column} IS NULL OR {column} NOT IN ({', '.join('?' * len(values))}))")
+        params.extend(values)
+    if 'contains' in parts:
+        clauses.append(f"instr(lower({column}), ?) > 0")
+        params.append(parts['contains'].lower())
+    if 'not_contains' in parts:
+        clauses.append(f"({column} IS NULL OR instr(lower({column}), ?) = 0)")
+        params.append(parts['not_contains'].lower())
+    if 'starts_with' in parts:
+        clauses.append(f"substr({column}, 1, ?) = ?")
+        params.extend([len(parts['starts_with']), parts['starts_with']])
+    if 'ends_with' in parts:
+        if parts['ends_with']:
+            clauses.append(f"substr({column}, ?) = ?")
+            params.extend([-len(parts['ends_with']), parts['ends_with']])
+        else:
+            clauses.append(f"{column} IS NOT NULL")
+    return " AND ".join(clauses) or "1", params
+
+
+class TableView:
+    """Read-only mapping of one table's rows by id, read from SQLite on access.
+
+    Stands in for the in-memory row dicts in memory_structures(); a new view
+    is made on clear(), so indexes built from it notice the reset.
+    """
+
+    def __init__(self, db: "SQLiteDB", model_type: Type):
+        self._db = db
+        self._model_type = model_type
+
+    def __len__(self) -> int:
+        return self._db.count(self._model_type)
+
+    def __iter__(self) -> Iterator[str]:
+        return (row.id for row in self._db.iter_all(self._model_type))
+
+    def __contains__(self, id: str) -> bool:
+        return self._db.get(self._model_type, id) is not None
+
+    def __getitem__(self, id: str) -> Any:
+        row = self._db.get(self._model_type, id)
+        if row is None:
+            raise KeyError(id)
+        return row
+
+    def get(self, id: str, default: Any = None) -> Any:
+        row = self._db.get(self._model_type, id)
+        return default if row is None else row
+
+    def values(self) -> Iterator[Any]:
+        return self._db.iter_all(self._model_type)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((row.id, row) for row in self._db.iter_all(self._model_type))
+
+
+class SQLiteDB(StorageBackend):
+    """Storage backend keeping rows in an SQLite database file.
+
+    Tables are rowid tables, so rowid order is insertion ("db") order, with
+    indexes on the foreign keys and on the columns the API filters and sorts
+    by. select() and count() translate their conditions, sort and page to
+    SQL, so only the requested rows are read. The change log and listeners
+    live in memory like with InMemoryDB: indexes kept by listeners are
+    rebuilt from the database when the process starts.
+    """
+
+    def __init__(self, path: str):
+        self._init_changes()
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, cached_statements=SQLITE_CACHED_STATEMENTS)
+        self._conn.row_factory = sqlite3.Row
+        # Readers don't block the writer, and commits skip the fsync of the
+        # database file (the WAL is synced at checkpoints)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._sql = {model_name: self._statements(model_name) for model_name in COLUMNS}
+        self._views = {model_name: TableView(self, MODEL_TYPES[model_name]) for model_name in COLUMNS}
+
+    def _create_schema(self) -> None:
+        with self._lock, self._conn:
+            for model_name, columns in COLUMNS.items():
+                table = _quote(model_name.lower())
+                column_sql = ", ".join(_quote(column) for column in ('created_at', 'updated_at') + columns)
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id PRIMARY KEY, {column_sql})")
+                for column in FOREIGN_KEYS.get(model_name, ()) + INDEXED_COLUMNS.get(model_name, ()):
+                    self._conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {_quote(f'{model_name.lower()}_{column}')} "
+                        f"ON {table} ({_quote(column)})"
+                    )
+                for column in SORTED_COLUMNS.get(model_name, ()):
+                    self._conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {_quote(f'{model_name.lower()}_{column}_sort')} "
+                        f"ON {table} (IFNULL({_quote(column)}, ''))"
+                    )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS relationships (model, rel, from_id, to_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS relationships_from ON relationships (model, rel, from_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS relationships_to ON relationships (rel, to_id)"
+            )
+
+    @staticmethod
+    def _statements(model_name: str) -> Dict[str, Any]:
+        table = _quote(model_name.lower())
+        columns = ('id', 'created_at', 'updated_at') + COLUMNS[model_name]
+        names = ", ".join(_quote(column) for column in columns)
+        return {
+            'columns': columns,
+            'insert': f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * len(columns))})",
+            'update': f"UPDATE {table} SET {', '.join(f'{_quote(c)} = ?' for c in columns[1:])} WHERE id = ?",
+            'get': f"SELECT * FROM {table} WHERE id = ?",
+            'delete': f"DELETE FROM {table} WHERE id = ?",
+            'page': f"SELECT rowid, * FROM {table} WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+            'max_rowid': f"SELECT IFNULL(MAX(rowid), 0) FROM {table}",
+        }
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    @staticmethod
+    def _model(model_type: Type[T], row: sqlite3.Row) -> T:
+        return model_type(**{key: row[key] for key in row.keys() if key != 'rowid'})
+
+    def _values(self, model_name: str, model: Any) -> Tuple:
+        return tuple(getattr(model, column, None) for column in self._sql[model_name]['columns'])
+
+    # Rows
+
+    def _build(self, model_type: Type[T], data: Dict[str, Any], now: str) -> T:
+        data = {k: _plain(v) for k, v in data.items()}
+        data.setdefault('id', str(uuid4()))
+        data.setdefault('created_at', now)
+        data.setdefault('updated_at', now)
+        return model_type(**data)
+
+    def create(self, model_type: Type[T], **data) -> T:
+        return self.bulk_create(model_type, [data])[0]
+
+    def bulk_create(self, model_type: Type[T], rows: Iterable[Dict[str, Any]]) -> List[T]:
+        model_name = model_type.__name__
+        now = datetime.utcnow().isoformat()
+        models = [self._build(model_type, data, now) for data in rows]
+        with self._lock, self._conn:
+            self._conn.executemany(self._sql[model_name]['insert'],
+                                   [self._values(model_name, model) for model in models])
+        for model in models:
+            self._notify(CREATED, model_name, model.id, model)
+        return models
+
+    def get(self, model_type: Type[T], id: str) -> Optional[T]:
+        rows = self._query(self._sql[model_type.__name__]['get'], (id,))
+        return self._model(model_type, rows[0]) if rows else None
+
+    def get_all(self, model_type: Type[T]) -> List[T]:
+        return self.select(model_type)
+
+    def iter_all(self, model_type: Type[T], batch: int = 1000) -> Iterator[T]:
+        """Yield rows one at a time, reading them in rowid pages.
+
+        Rows created after the call started are not included; rows deleted
+        while iterating are skipped once their page is reached.
+        """
+        sql = self._sql[model_type.__name__]
+        last = 0
+        end = self._query(sql['max_rowid'])[0][0]
+        while True:
+            rows = self._query(sql['page'], (last, end, batch))
+            if not rows:
+                return
+            last = rows[-1]['rowid']
+            for row in rows:
+                yield self._model(model_type, row)
+
+    def get_by_foreign_key(self, model_type: Type[T], field: str, value: str) -> List[T]:
+        return self.select(model_type, {field: value})
+
+    def _where_sql(self, model_type: Type[T], where: Optional[Where]) -> Tuple[str, List[Any]]:
+        clauses = []
+        params: List[Any] = []
+        columns = COLUMNS[model_type.__name__]
+        for field, condition in (where or {}).items():
+            if field not in columns and field not in ('id', 'created_at', 'updated_at'):
+                raise ValueError(f"Unknown column: {model_type.__name__}.{field}")
+            clause, clause_params = _condition_sql(_quote(field), condition)
+            clauses.append(clause)
+            params.extend(clause_params)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def select(self, model_type: Type[T], where: Optional[Where] = None, order_by: Optional[str] = None,
+               descending: bool = False, offset: int = 0, limit: Optional[int] = None) -> List[T]:
+        where_sql, params = self._where_sql(model_type, where)
+        sql = f"SELECT * FROM {_quote(model_type.__name__.lower())}{where_sql} ORDER BY "
+        if order_by is not None:
+            # NULL sorts as "", like FieldKey, so it ties with empty strings
+            # instead of coming first; ties stay in db order
+            sql += f"IFNULL({_quote(order_by)}, '') {'DESC' if descending else 'ASC'}, "
+        sql += "rowid"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+        return [self._model(model_type, row) for row in self._query(sql, params)]
+
+    def count(self, model_type: Type[T], where: Optional[Where] = None) -> int:
+        where_sql, params = self._where_sql(model_type, where)
+        return self._query(f"SELECT COUNT(*) FROM {_quote(model_type.__name__.lower())}{where_sql}", params)[0][0]
+
+    def count_values(self, model_type: Type[T], field: str) -> Dict[Any, int]:
+        column = _quote(field)
+        rows = self._query(
+            f"SELECT {column}, COUNT(*) FROM {_quote(model_type.__name__.lower())} "
+            f"GROUP BY {column} ORDER BY MIN(rowid)"
+        )
+        return {row[0]: row[1] for row in rows}
+
+    def update(self, model_type: Type[T], id: str, **data) -> Optional[T]:
+        models = self.bulk_update(model_type, {id: data})
+        return models[0] if models else None
+
+    def bulk_update(self, model_type: Type[T], changes: Dict[str, Dict[str, Any]]) -> List[T]:
+        model_name = model_type.__name__
+        sql = self._sql[model_name]
+        models = []
+        with self._lock, self._conn:
+            for id, data in changes.items():
+                model = self.get(model_type, id)
+                if model is None:
+                    continue
+                # Don't update id, created_at
+                model.update(**{k: _plain(v) for k, v in data.items() if k not in ('id', 'created_at')})
+                values = self._values(model_name, model)
+                self._conn.execute(sql['update'], values[1:] + (id,))
+                models.append(model)
+        for model in models:
+            self._notify(UPDATED, model_name, model.id, model)
+        return models
+
+    def delete(self, model_type: Type[T], id: str) -> bool:
+        return bool(self.bulk_delete(model_type, [id]))
+
+    def bulk_delete(self, model_type: Type[T], ids: Iterable[str], operation: str = DELETED) -> List[T]:
+        model_name = model_type.__name__
+        sql = self._sql[model_name]
+        models = []
+        with self._lock, self._conn:
+            for id in dict.fromkeys(ids):
+                model = self.get(model_type, id)
+                if model is None:
+                    continue
+                self._conn.execute(sql['delete'], (id,))
+                # Clean up the row's own relationships
+                self._conn.execute("DELETE FROM relationships WHERE model = ? AND from_id = ?", (model_name, id))
+                models.append(model)
+        for model in models:
+            self._notify(operation, model_name, model.id, model)
+        return models
+
+    # Relationships
+
+    def _exists(self, model_name: str, id: str) -> bool:
+        return bool(self._query(f"SELECT 1 FROM {_quote(model_name.lower())} WHERE id = ?", (id,)))
+
+    def add_relationship(self, from_model_type: Type[T], from_id: str,
+                         rel_name: str, to_model_type: Type[T], to_id: str) -> bool:
+        from_model_name = from_model_type.__name__
+        if not self._exists(from_model_name, from_id) or not self._exists(to_model_type.__name__, to_id):
+            return False
+        with self._lock, self._conn:
+            if rel_name in SINGLE_RELATIONSHIPS:
+                self._conn.execute("DELETE FROM relationships WHERE model = ? AND rel = ? AND from_id = ?",
+                                   (from_model_name, rel_name, from_id))
+            self._conn.execute("INSERT INTO relationships VALUES (?, ?, ?, ?)",
+                               (from_model_name, rel_name, from_id, to_id))
+        return True
+
+    def repoint_relationships(self, model_type: Type[T], old_ids: Iterable[str], new_id: str) -> None:
+        model_name = model_type.__name__
+        old_ids = list(old_ids)
+        if not old_ids:
+            return
+        placeholders = ", ".join('?' * len(old_ids))
+        plural = [rel for rel in RELATIONSHIPS.get(model_name, {}) if rel not in SINGLE_RELATIONSHIPS]
+        with self._lock, self._conn:
+            # A model's own one-to-many relationships, and other models' links to it
+            if plural:
+                self._conn.execute(
+                    f"UPDATE relationships SET from_id = ? WHERE model = ? "
+                    f"AND rel IN ({', '.join('?' * len(plural))}) AND from_id IN ({placeholders})",
+                    [new_id, model_name, *plural, *old_ids],
+                )
+            self._conn.execute(
+                f"UPDATE relationships SET to_id = ? WHERE rel = ? AND to_id IN ({placeholders})",
+                [new_id, model_name.lower(), *old_ids],
+            )
+
+    def get_related(self, model_type: Type[T], id: str, rel_name: str) -> List[Any]:
+        related_name = RELATIONSHIPS.get(model_type.__name__, {}).get(rel_name)
+        if related_name is None or rel_name in SINGLE_RELATIONSHIPS:
+            return []
+        rows = self._query(
+            f"SELECT t.* FROM relationships r JOIN {_quote(related_name.lower())} t ON t.id = r.to_id "
+            f"WHERE r.model = ? AND r.rel = ? AND r.from_id = ? ORDER BY r.rowid",
+            (model_type.__name__, rel_name, id),
+        )
+        return [self._model(MODEL_TYPES[related_name], row) for row in rows]
+
+    def get_related_single(self, model_type: Type[T], id: str, rel_name: str) -> Any:
+        related_name = RELATIONSHIPS.get(model_type.__name__, {}).get(rel_name)
+        if related_name is None or rel_name not in SINGLE_RELATIONSHIPS:
+            return None
+        rows = self._query(
+            f"SELECT t.* FROM relationships r JOIN {_quote(related_name.lower())} t ON t.id = r.to_id "
+            f"WHERE r.model = ? AND r.rel = ? AND r.from_id = ?",
+            (model_type.__name__, rel_name, id),
+        )
+        return self._model(MODEL_TYPES[related_name], rows[0]) if rows else None
+
+    # Maintenance
+
+    def memory_structures(self) -> Dict[str, Dict[str, Any]]:
+        # Rows, indexes and relationships live in the database file
+        return {
+            'tables': dict(self._views),
+            'indexes': {},
+            'relationships': {},
+            'logs': {'change_log': self._change_log},
+        }
+
+    def clear(self):
+        """Clear all data (for testing purposes)"""
+        with self._lock, self._conn:
+            for model_name in COLUMNS:
+                self._conn.execute(f"DELETE FROM {_quote(model_name.lower())}")
+            self._conn.execute("DELETE FROM relationships")
+        self._views = {model_name: TableView(self, MODEL_TYPES[model_name]) for model_name in COLUMNS}
+        self._reset_changes()
+
+    def close(self) -> None:
+        self._conn.close()
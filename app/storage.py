@@ -0,0 +1,304 @@
+import os
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar
+
+T = TypeVar('T')
+
+# Operations passed to change listeners
+CREATED = 'CREATED'
+UPDATED = 'UPDATED'
+DELETED = 'DELETED'
+# Rows moved out of their table into the archive, where they stay readable
+ARCHIVED = 'ARCHIVED'
+# Operations after which the row is no longer in its table
+REMOVALS = (DELETED, ARCHIVED)
+
+# listener(operation, model_name, id, model)
+ChangeListener = Callable[[str, str, str, Any], None]
+
+# Number of mutations kept in the change log for changes_since()
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "10000"))
+
+# (version, model_name, id, operation)
+ChangeLogEntry = Tuple[int, str, str, str]
+
+# Foreign key columns indexed for child lookups
+FOREIGN_KEYS = {
+    'Task': ('lead_id',),
+    'Note': ('lead_id', 'task_id'),
+    'Appointment': ('lead_id',),
+    'Vehicle': ('lead_id',),
+}
+
+# Relationships of each model: name -> related model. Singular names link a
+# row to one related row, plural names to a list
+RELATIONSHIPS = {
+    'Lead': {'tasks': 'Task', 'vehicles': 'Vehicle', 'notes': 'Note', 'appointments': 'Appointment'},
+    'Task': {'notes': 'Note', 'lead': 'Lead'},
+    'Note': {'lead': 'Lead', 'task': 'Task'},
+    'Appointment': {'lead': 'Lead', 'notes': 'Note'},
+    'Vehicle': {'lead': 'Lead'},
+}
+SINGLE_RELATIONSHIPS = {'lead', 'task'}
+
+# Conditions on columns for select()/count(): field -> condition. A condition
+# is a plain value (equality) or a dict with any of the parts of a GraphQL
+# StringFilterInput: eq, ne, in_list, not_in, contains, not_contains (both
+# case-insensitive), starts_with, ends_with
+Where = Dict[str, Any]
+
+
+def _plain(value: Any) -> Any:
+    # Store enum members by value so rows created through GraphQL inputs
+    # compare equal to rows created from plain strings (e.g. seed data)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def matches(value: Any, condition: Any) -> bool:
+    """Whether a column value passes a condition; None values only pass negative parts."""
+    if not isinstance(condition, dict):
+        return value == condition
+    eq = condition.get('eq')
+    if eq is not None and value != eq:
+        return False
+    ne = condition.get('ne')
+    if ne is not None and value == ne:
+        return False
+    in_list = condition.get('in_list')
+    if in_list is not None and value not in in_list:
+        return False
+    not_in = condition.get('not_in')
+    if not_in is not None and value in not_in:
+        return False
+    contains = condition.get('contains')
+    starts_with = condition.get('starts_with')
+    ends_with = condition.get('ends_with')
+    if value is None:
+        return contains is None and starts_with is None and ends_with is None
+    if contains is not None and contains.lower() not in value.lower():
+        return False
+    not_contains = condition.get('not_contains')
+    if not_contains is not None and not_contains.lower() in value.lower():
+        return False
+    if starts_with is not None and not value.startswith(starts_with):
+        return False
+    if ends_with is not None and not value.endswith(ends_with):
+        return False
+    return True
+
+
+def equality_values(condition: Any) -> Optional[List[Any]]:
+    """The values an equality or eq/in_list-only condition accepts; None for other conditions."""
+    if not isinstance(condition, dict):
+        return [condition]
+    parts = {part for part, value in condition.items() if value is not None}
+    if parts == {'eq'}:
+        return [condition['eq']]
+    if parts == {'in_list'}:
+        return list(condition['in_list'])
+    return None
+
+
+class FieldKey:
+    """Picklable sort key reading one attribute, with a default for None."""
+
+    def __init__(self, field: str, default: Any = ""):
+        self.field = field
+        self.default = default
+
+    def __call__(self, row: Any) -> Any:
+        value = getattr(row, self.field)
+        return self.default if value is None else value
+
+
+class StorageBackend(ABC):
+    """Interface of the database behind the API, with the change tracking every backend shares.
+
+    Backends store rows of the model classes and keep them in insertion
+    ("db") order. Every write calls ``_notify``, which bumps the version,
+    appends to the change log and calls the listeners with the written row.
+    Subclasses implement every abstract row, relationship and maintenance
+    method.
+    """
+
+    def _init_changes(self) -> None:
+        self._listeners: List[ChangeListener] = []
+        # Versions keep increasing across clear() so clients never see one reused
+        self._version = 0
+        self._change_log: List[ChangeLogEntry] = []
+        self._log_floor = 0
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        """Register a callback invoked after every create/update/delete."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ChangeListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @property
+    def version(self) -> int:
+        """Version of the most recent mutation."""
+        return self._version
+
+    def _notify(self, operation: str, model_name: str, id: str, model: Any) -> None:
+        self._version += 1
+        self._change_log.append((self._version, model_name, id, operation))
+        if len(self._change_log) >= 2 * CHANGE_LOG_SIZE:
+            # Trim in bulk so appends stay amortised O(1)
+            dropped = len(self._change_log) - CHANGE_LOG_SIZE
+            self._log_floor = self._change_log[dropped - 1][0]
+            del self._change_log[:dropped]
+
+        for listener in self._listeners:
+            listener(operation, model_name, id, model)
+
+    def _reset_changes(self) -> None:
+        # Everything before this point is gone; force clients to resync
+        self._change_log = []
+        self._log_floor = self._version
+
+    def changes_since(self, version: int, types: Optional[Iterable[str]] = None,
+                      limit: Optional[int] = None) -> Tuple[List[ChangeLogEntry], int, bool]:
+        """Return the latest change per row after `version`.
+
+        Returns (entries, high_water_mark, full_resync). When the log no longer
+        reaches back to `version`, full_resync is True and entries is empty.
+        Entries are ordered by version; with a limit, high_water_mark is the
+        last version covered so the caller can page through the log.
+        """
+        if version < self._log_floor or version > self._version:
+            return [], self._version, True
+
+        types = set(types) if types else None
+        latest: Dict[Tuple[str, str], ChangeLogEntry] = {}
+        high_water = self._version
+
+        # Versions are contiguous, so the start offset can be computed directly
+        start = version - self._change_log[0][0] + 1 if self._change_log else 0
+        for entry in self._change_log[start:]:
+            if types is not None and entry[1] not in types:
+                continue
+            key = (entry[1], entry[2])
+            if limit is not None and key not in latest and len(latest) >= limit:
+                high_water = entry[0] - 1
+                break
+            # Re-insert so the dict stays ordered by each row's latest version
+            latest.pop(key, None)
+            latest[key] = entry
+
+        return list(latest.values()), high_water, False
+
+    # Rows
+
+    @abstractmethod
+    def create(self, model_type: Type[T], **data) -> T:
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_create(self, model_type: Type[T], rows: Iterable[Dict[str, Any]]) -> List[T]:
+        """Create many rows at once, indexing the whole batch before notifying listeners."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, model_type: Type[T], id: str) -> Optional[T]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_all(self, model_type: Type[T]) -> List[T]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_all(self, model_type: Type[T]) -> Iterator[T]:
+        """Yield rows one at a time, tolerating concurrent writes."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_by_foreign_key(self, model_type: Type[T], field: str, value: str) -> List[T]:
+        """Return rows whose `field` (one of FOREIGN_KEYS) equals `value`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def select(self, model_type: Type[T], where: Optional[Where] = None, order_by: Optional[str] = None,
+               descending: bool = False, offset: int = 0, limit: Optional[int] = None) -> List[T]:
+        """Rows passing every condition, in db order or sorted by one field (None sorts as ""), then sliced."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, model_type: Type[T], where: Optional[Where] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_values(self, model_type: Type[T], field: str) -> Dict[Any, int]:
+        """Number of rows per distinct value of a field."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, model_type: Type[T], id: str, **data) -> Optional[T]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_update(self, model_type: Type[T], changes: Dict[str, Dict[str, Any]]) -> List[T]:
+        """Apply {id: data} to many rows before notifying listeners; missing ids are skipped."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, model_type: Type[T], id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_delete(self, model_type: Type[T], ids: Iterable[str], operation: str = DELETED) -> List[T]:
+        """Delete many rows before notifying listeners; missing ids are skipped.
+
+        ``operation`` is what listeners and the change log see, ARCHIVED
+        for rows moved to the archive.
+        """
+        raise NotImplementedError
+
+    # Relationships
+
+    @abstractmethod
+    def add_relationship(self, from_model_type: Type[T], from_id: str,
+                         rel_name: str, to_model_type: Type[T], to_id: str) -> bool:
+        raise NotImplementedError
+
+    def add_relationships(self, from_model_type: Type[T], rel_name: str, to_model_type: Type[T],
+                          pairs: Iterable[Tuple[str, str]]) -> int:
+        """Add many (from_id, to_id) relationships, returning how many were added."""
+        added = 0
+        for from_id, to_id in pairs:
+            if self.add_relationship(from_model_type, from_id, rel_name, to_model_type, to_id):
+                added += 1
+        return added
+
+    @abstractmethod
+    def repoint_relationships(self, model_type: Type[T], old_ids: Iterable[str], new_id: str) -> None:
+        """Move relationships from any of old_ids to new_id, e.g. when merging records."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_related(self, model_type: Type[T], id: str, rel_name: str) -> List[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_related_single(self, model_type: Type[T], id: str, rel_name: str) -> Any:
+        raise NotImplementedError
+
+    # Maintenance
+
+    @abstractmethod
+    def memory_structures(self) -> Dict[str, Dict[str, Any]]:
+        """Named structures, grouped by kind, for memory reporting.
+
+        ``tables`` maps each model name to a mapping of its rows by id; it is
+        replaced by clear(), which derived indexes use to notice a reset.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Clear all data (for testing purposes)"""
+        raise NotImplementedError
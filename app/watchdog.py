@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from types import FrameType
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+
+from graphql.execution import ExecutionContext
+
+from .metrics import registry
+
+# Opt-in: a heartbeat on the event loop plus a thread watching it
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "false").lower() == "true"
+# Report the loop as blocked once a callback runs longer than this
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+# How often the heartbeat runs and the watching thread checks it
+LOOP_WATCHDOG_INTERVAL_MS = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "20"))
+# Innermost frames kept in each stack sample
+LOOP_WATCHDOG_STACK_DEPTH = int(os.getenv("LOOP_WATCHDOG_STACK_DEPTH", "25"))
+# Recent stalls kept for /debug/event-loop
+LOOP_WATCHDOG_HISTORY = int(os.getenv("LOOP_WATCHDOG_HISTORY", "50"))
+# Operation names used as the metrics' operation label; clients choose the
+# names, so any other (or no) name is counted as OTHER_OPERATION
+LOOP_WATCHDOG_OPERATIONS = frozenset(
+    name.strip() for name in os.getenv("LOOP_WATCHDOG_OPERATIONS", "").split(",") if name.strip()
+)
+OTHER_OPERATION = "other"
+
+logger = logging.getLogger(__name__)
+
+loop_lag = registry.gauge("event_loop_lag_seconds", "Delay of the latest event loop heartbeat")
+blocked_total = registry.counter(
+    "event_loop_blocked_total", "Times the event loop was blocked beyond the threshold", ("operation",)
+)
+blocked_seconds = registry.summary(
+    "event_loop_blocked_seconds", "Time the event loop spent blocked beyond the threshold", ("operation",)
+)
+
+# Every resolver runs inside this frame; its locals hold the operation and field path
+_EXECUTE_FIELD = ExecutionContext.execute_field.__code__
+
+
+def describe_frame(frame: Optional[FrameType]) -> Tuple[Optional[str], Optional[str]]:
+    """(operation name, resolver path) of the innermost GraphQL field being resolved."""
+    while frame is not None:
+        if frame.f_code is _EXECUTE_FIELD:
+            local_vars = frame.f_locals
+            context, path = local_vars.get("self"), local_vars.get("path")
+            operation = getattr(context, "operation", None)
+            name = operation.name.value if operation is not None and operation.name else None
+            return name, ".".join(str(key) for key in path.as_list()) if path is not None else None
+        frame = frame.f_back
+    return None, None
+
+
+class LoopWatchdog:
+    """Detects callbacks that block the asyncio event loop.
+
+    A heartbeat callback re-schedules itself on the loop every ``interval``
+    seconds and records when it last ran. A daemon thread checks the
+    heartbeat; once it is more than ``threshold`` late, the thread samples the
+    loop thread's stack and works out which GraphQL operation and field were
+    being resolved. When the loop gets going again the heartbeat measures the
+    full delay and reports the stall as a log line and metrics.
+    """
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, interval_ms: float = LOOP_WATCHDOG_INTERVAL_MS,
+                 stack_depth: int = LOOP_WATCHDOG_STACK_DEPTH, history: int = LOOP_WATCHDOG_HISTORY,
+                 operations: Iterable[str] = LOOP_WATCHDOG_OPERATIONS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.stack_depth = stack_depth
+        self.operations = frozenset(operations)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        # When the heartbeat is next due, and the sample of the stall in progress
+        self._due = 0.0
+        self._sample: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Start watching; must be called from the loop's thread."""
+        if self.running:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._due = time.monotonic() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._heartbeat)
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _heartbeat(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            lag = max(now - self._due, 0.0)
+            sample, self._sample = self._sample, None
+            self._due = now + self.interval
+        if not self._stopped.is_set():
+            self._handle = self._loop.call_later(self.interval, self._heartbeat)
+        loop_lag.set(lag)
+        if sample is not None or lag >= self.threshold:
+            self._report(lag, sample or {})
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                due = self._due
+                if time.monotonic() - due < self.threshold or self._sample is not None:
+                    continue
+            # Sample once per stall, while the loop is still stuck
+            sample = self._take_sample()
+            with self._lock:
+                if self._due != due:
+                    # The loop caught up while the stack was being sampled
+                    continue
+                self._sample = sample
+            late = time.monotonic() - due
+            logger.warning(
+                "Event loop blocked for over %.0f ms (operation=%s, path=%s)",
+                late * 1000, sample["operation"], sample["path"],
+            )
+
+    def _take_sample(self) -> Dict[str, Any]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        operation, path = describe_frame(frame)
+        stack = traceback.format_list(traceback.extract_stack(frame)[-self.stack_depth:]) if frame else []
+        return {"operation": operation, "path": path, "stack": stack}
+
+    def _report(self, lag: float, sample: Dict[str, Any]) -> None:
+        operation = sample.get("operation")
+        # The raw name only goes to the log and /debug/event-loop
+        label = operation if operation in self.operations else OTHER_OPERATION
+        blocked_total.inc(operation=label)
+        blocked_seconds.observe(lag, operation=label)
+        stall = {
+            "at": time.time() - lag,
+            "blocked_ms": round(lag * 1000, 1),
+            "operation": operation,
+            "path": sample.get("path"),
+            "stack": sample.get("stack", []),
+        }
+        self.stalls.append(stall)
+        logger.warning(
+            "Event loop was blocked for %.0f ms (operation=%s, path=%s)%s",
+            lag * 1000, operation, stall["path"],
+            "\n" + "".join(stall["stack"]) if stall["stack"] else "",
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": round(loop_lag.value() * 1000, 1),
+            "stalls": list(self.stalls),
+        }
+
+
+watchdog = LoopWatchdog()
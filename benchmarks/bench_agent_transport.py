@@ -0,0 +1,53 @@
+"""Compare per-call latency of the report agent's HTTP and in-process transports.
+
+The HTTP path goes through FastAPI's TestClient, so it includes the full ASGI
+stack and JSON encoding/decoding but not the network round trip.
+
+Usage: python -m benchmarks.bench_agent_transport [--calls 200]
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from graphql_client import InProcessGraphQLClient
+
+QUERIES = [
+    "{ getLeadStatusCounts { status count } }",
+    "{ getAllLeads(size: 20) { items { id name leadStatus } pageInfo { total } } }",
+    "{ getAllAppointments(size: 20) { items { id title startTime status } } }",
+]
+
+
+def per_call_ms(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(QUERIES[i % len(QUERIES)])
+    return (time.perf_counter() - start) * 1000 / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with TestClient(app) as http:
+        in_process = InProcessGraphQLClient()
+
+        def via_http(query: str):
+            return http.post("/graphql", json={"query": query}).json()
+
+        # Warm up caches on both paths
+        per_call_ms(via_http, len(QUERIES))
+        per_call_ms(in_process.execute, len(QUERIES))
+
+        http_ms = per_call_ms(via_http, args.calls)
+        local_ms = per_call_ms(in_process.execute, args.calls)
+
+    print(f"HTTP (ASGI + JSON): {http_ms:6.2f} ms/call")
+    print(f"in-process        : {local_ms:6.2f} ms/call  ({http_ms / local_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
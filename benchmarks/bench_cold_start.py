@@ -0,0 +1,88 @@
+"""Measure how long a fresh process takes to import the app.
+
+Each run starts a new interpreter that imports app.main, which builds the
+schema and the router. The median wall time is checked against the start-up
+target. One more run with ``-X importtime`` lists the slowest modules by
+their own (self) and cumulative import time.
+
+Usage: python -m benchmarks.bench_cold_start [--runs 7] [--top 15] [--target-ms 700]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# Median import time of app.main that counts as a regression when exceeded
+COLD_START_TARGET_MS = float(os.getenv("COLD_START_TARGET_MS", "700"))
+
+IMPORT = "import app.main"
+# What any app on this stack pays before importing its own code
+FRAMEWORKS = "import fastapi, strawberry.fastapi, uvicorn"
+
+# (module, self µs, cumulative µs)
+ImportTimes = List[Tuple[str, int, int]]
+
+
+def timed(*command: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *command], stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def import_times() -> ImportTimes:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT],
+                            capture_output=True, text=True, check=True)
+    times: ImportTimes = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(own), int(cumulative)))
+    return times
+
+
+def top(times: ImportTimes, n: int, column: int, prefix: str = "") -> List[Tuple[str, int, int]]:
+    selected = [t for t in times if t[0].startswith(prefix)]
+    return sorted(selected, key=lambda t: t[column], reverse=True)[:n]
+
+
+def print_table(title: str, rows: List[Tuple[str, int, int]]) -> None:
+    print(f"\n{title}")
+    print(f"  {'module':<55} {'self ms':>8} {'cum ms':>8}")
+    for name, own, cumulative in rows:
+        print(f"  {name:<55} {own / 1000:>8.1f} {cumulative / 1000:>8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--target-ms", type=float, default=COLD_START_TARGET_MS)
+    args = parser.parse_args()
+
+    # The first run warms the bytecode and OS file caches
+    timed("-c", IMPORT)
+    runs = sorted(timed("-c", IMPORT) for _ in range(args.runs))
+    interpreter = statistics.median(timed("-c", "pass") for _ in range(args.runs))
+    frameworks = statistics.median(timed("-c", FRAMEWORKS) for _ in range(args.runs))
+    times = import_times()
+
+    print_table("Slowest modules by self time", top(times, args.top, 1))
+    print_table("Slowest app modules by self time", top(times, args.top, 1, "app"))
+    print_table("Slowest modules by cumulative time", top(times, args.top, 2))
+
+    median_ms = statistics.median(runs) * 1000
+    print(f"\nInterpreter alone: {interpreter * 1000:.0f} ms; with FastAPI, strawberry and uvicorn: "
+          f"{frameworks * 1000:.0f} ms")
+    print(f"Cold start, median of {args.runs} runs: {median_ms:.0f} ms "
+          f"(min {runs[0] * 1000:.0f}, max {runs[-1] * 1000:.0f}); target {args.target_ms:.0f} ms")
+    if median_ms > args.target_ms:
+        print("Cold start is over the target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Measure table memory with rows loaded the way an import loads them.
+
+Rows are parsed from NDJSON, so every row arrives with its own string
+objects, as with /import or any JSON client. Reports the memory held by
+the Lead and Vehicle tables per row.
+
+Usage: python -m benchmarks.bench_dictionary_encoding [--leads 100000]
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from app.db import db
+from app.models import Lead, Vehicle
+
+STATUSES = ["NEW", "CONTACTED", "QUALIFIED", "UNQUALIFIED", "CUSTOMER"]
+SOURCES = ["Website", "Referral", "Social Media", "Email", "Phone Inquiry", "Walk-in"]
+MAKES = {
+    "TOYOTA": ["Camry", "Corolla", "RAV4", "Highlander"],
+    "HONDA": ["Civic", "Accord", "CR-V", "Pilot"],
+    "FORD": ["F-150", "Escape", "Explorer", "Mustang"],
+    "BMW": ["3 Series", "5 Series", "X3", "X5"],
+}
+COLORS = ["Black", "White", "Silver", "Gray", "Blue", "Red"]
+CONDITIONS = ["NEW", "USED", "CERTIFIED_PREOWNED"]
+
+
+def ndjson_rows(count: int, make_row):
+    # Round-trip through JSON so strings are not shared between rows
+    lines = [json.dumps(make_row(i)) for i in range(count)]
+    return (json.loads(line) for line in lines)
+
+
+def load(model_type, rows) -> int:
+    # Bytes still allocated after the load, i.e. held by the table and its indexes
+    gc.collect()
+    tracemalloc.start()
+    db.bulk_create(model_type, rows)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=100000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    lead_rows = ndjson_rows(args.leads, lambda i: {
+        "id": f"lead-{i}", "name": f"Lead {i}",
+        "lead_status": random.choice(STATUSES), "lead_source": random.choice(SOURCES),
+    })
+    lead_bytes = load(Lead, lead_rows)
+
+    def vehicle(i):
+        make = random.choice(list(MAKES))
+        return {
+            "make": make, "model": random.choice(MAKES[make]), "color": random.choice(COLORS),
+            "condition": random.choice(CONDITIONS), "year": str(random.randint(2000, 2024)),
+            "lead_id": f"lead-{i // 2}",
+        }
+    vehicle_bytes = load(Vehicle, ndjson_rows(args.leads * 2, vehicle))
+
+    print(f"{args.leads} leads:     {lead_bytes / args.leads:6.0f} B/row")
+    print(f"{args.leads * 2} vehicles:  {vehicle_bytes / (args.leads * 2):6.0f} B/row")
+
+
+if __name__ == "__main__":
+    main()
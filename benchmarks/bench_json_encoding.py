@@ -0,0 +1,90 @@
+"""Compare the stock GraphQLRouter JSON path with FastGraphQLRouter.
+
+Usage: python -m benchmarks.bench_json_encoding [--leads 20000] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import time
+
+from app.db import db
+from app.models import Lead, Appointment, Vehicle
+from app.router import FastGraphQLRouter, compress, orjson, brotli
+from app.schema.schema import schema
+
+LEADS_QUERY = """
+query ($size: Int!) {
+  getAllLeads(size: $size) {
+    items {
+      id name email phone city state leadStatus leadSource leadOwner createdAt updatedAt
+      appointments { id title location startTime endTime status }
+    }
+    pageInfo { total }
+  }
+}
+"""
+
+VEHICLES_QUERY = """
+{ getVehicles { id make model year color vin mileage condition notes leadId createdAt } }
+"""
+
+
+def populate(n_leads: int) -> None:
+    db.clear()
+    for i in range(n_leads):
+        lead = db.create(Lead, name=f"Lead {i}", email=f"lead{i}@example.com", phone="555-0100",
+                         city="Springfield", state="IL", lead_status="NEW", lead_source="Website",
+                         lead_owner="Owner Name")
+        db.create(Appointment, title="Test drive", description="Bring license",
+                  location="123 Main St, Springfield", start_time="2030-01-01T10:00:00",
+                  end_time="2030-01-01T11:00:00", status="SCHEDULED", lead_id=lead.id)
+        db.create(Vehicle, make="Toyota", model="Camry", year="2020", color="Blue",
+                  vin="1HGCM82633A004352", mileage=42000, condition="USED",
+                  notes="Clean title, one owner", lead_id=lead.id)
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(name: str, payload: dict, repeat: int) -> None:
+    router = FastGraphQLRouter(schema)
+
+    # The stock router path: json.dumps to str, then Starlette encodes to bytes
+    baseline = timeit(lambda: json.dumps(payload).encode("utf-8"), repeat)
+    fast = timeit(lambda: router.encode_json(payload), repeat)
+    body = router.encode_json(payload)
+
+    print(f"{name}: {len(body) / 1e6:.2f} MB")
+    print(f"  stdlib json + encode : {baseline * 1000:8.1f} ms")
+    print(f"  FastGraphQLRouter    : {fast * 1000:8.1f} ms  ({baseline / fast:.1f}x, orjson={'yes' if orjson else 'no'})")
+
+    gz = timeit(lambda: compress(body, "gzip"), repeat)
+    print(f"  gzip                 : {gz * 1000:8.1f} ms  -> {len(compress(body, 'gzip')[1]) / 1e6:.2f} MB")
+    if brotli is not None:
+        br = timeit(lambda: compress(body, "br"), repeat)
+        print(f"  brotli               : {br * 1000:8.1f} ms  -> {len(compress(body, 'br')[1]) / 1e6:.2f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    populate(args.leads)
+
+    leads = schema.execute_sync(LEADS_QUERY, variable_values={"size": args.leads})
+    bench("getAllLeads", {"data": leads.data}, args.repeat)
+
+    vehicles = schema.execute_sync(VEHICLES_QUERY)
+    bench("getVehicles", {"data": vehicles.data}, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 # app/agents/report_agent.py
+import os
 from typing import TypedDict, List
 from langgraph.prebuilt import create_react_agent
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
-import requests
-import json
 from datetime import datetime
 
-# Configuration
-GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
+from graphql_client import create_client, GRAPHQL_ENDPOINT, compact_json
+
+# Send multi-query tool calls as one batched POST instead of parallel requests
+GRAPHQL_BATCHING = os.getenv("GRAPHQL_BATCHING", "false").lower() == "true"
+
+# Shared client for all tool calls; set GRAPHQL_TRANSPORT=inprocess when the
+# agent runs in the same process as the API to skip HTTP entirely
+client = create_client(endpoint=GRAPHQL_ENDPOINT)
 
 # Initialize the language model
 llm = ChatOpenAI(model="gpt-4-turbo", temperature=0)
@@ -18,17 +23,22 @@ llm = ChatOpenAI(model="gpt-4-turbo", temperature=0)
 def execute_graphql(query: str) -> str:
     """Execute a GraphQL query and return the results as a string."""
     try:
-        response = requests.post(
-            GRAPHQL_ENDPOINT,
-            json={"query": query},
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        return json.dumps(response.json(), indent=2)
+        return compact_json(client.execute(query))
     except Exception as e:
         return f"Error executing GraphQL query: {str(e)}"
 
 
+@tool
+def execute_graphql_queries(queries: List[str]) -> str:
+    """Execute several independent GraphQL queries at once and return a JSON array of results in the same order."""
+    try:
+        if GRAPHQL_BATCHING:
+            return compact_json(client.execute_batch(queries))
+        return compact_json(client.execute_many(queries))
+    except Exception as e:
+        return f"Error executing GraphQL queries: {str(e)}"
+
+
 @tool
 def generate_report(data: str, report_type: str) -> str:
     """Generate a report based on the provided data and report type."""
@@ -48,15 +58,15 @@ def generate_report(data: str, report_type: str) -> str:
 
 
 # Define the tools
-tools = [execute_graphql, generate_report]
+tools = [execute_graphql, execute_graphql_queries, generate_report]
 
 # Create the agent
 agent = create_react_agent(
     llm=llm,
     tools=tools,
     prompt="""You are a helpful assistant that generates reports from GraphQL data.
-    When asked to generate a report, first fetch the necessary data using execute_graphql,
-    then use generate_report to format it into a professional report.
+    When asked to generate a report, first fetch the necessary data using execute_graphql
+    (or execute_graphql_queries for several independent queries), then use generate_report to format it into a professional report.
     Always confirm with the user if the report meets their needs.
     """
 )
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+# Configuration
+GRAPHQL_ENDPOINT = os.getenv("GRAPHQL_ENDPOINT", "http://localhost:8000/graphql")
+CONNECT_TIMEOUT = float(os.getenv("GRAPHQL_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("GRAPHQL_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("GRAPHQL_MAX_RETRIES", "3"))
+POOL_SIZE = int(os.getenv("GRAPHQL_POOL_SIZE", "10"))
+
+# Only retry responses that mean the request was not executed
+RETRY_STATUSES = (429, 503)
+
+# A query string or a full {"query", "variables", "operationName"} payload
+Operation = Union[str, Dict[str, Any]]
+
+
+def to_payload(operation: Operation, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if isinstance(operation, str):
+        payload = {"query": operation}
+        if variables:
+            payload["variables"] = variables
+        return payload
+    return operation
+
+
+def compact_json(data: Any) -> str:
+    """Serialize without whitespace to keep tool output small."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class GraphQLClient:
+    """Keep-alive GraphQL client with pooled connections, timeouts and retries."""
+
+    def __init__(
+        self,
+        endpoint: str = GRAPHQL_ENDPOINT,
+        timeout: float = READ_TIMEOUT,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        pool_size: int = POOL_SIZE,
+    ):
+        self.endpoint = endpoint
+        self.timeout = (connect_timeout, timeout)
+        self.pool_size = pool_size
+
+        retry = Retry(
+            total=max_retries,
+            read=0,  # a read timeout may mean the operation already ran
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["POST"]),
+            backoff_factor=0.2,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _post(self, body: Any) -> Any:
+        response = self.session.post(self.endpoint, json=body, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def execute(
+        self,
+        query: Operation,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Execute one operation and return the decoded response."""
+        return self._post(to_payload(query, variables))
+
+    def execute_many(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        """Execute independent operations concurrently over the connection pool."""
+        if len(operations) <= 1:
+            return [self.execute(op) for op in operations]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        return list(self._executor.map(self.execute, operations))
+
+    def execute_batch(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        """Send all operations in a single POST as a JSON array."""
+        return self._post([to_payload(op) for op in operations])
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.session.close()
+
+    def __enter__(self) -> "GraphQLClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class AsyncGraphQLClient:
+    """asyncio counterpart of GraphQLClient (requires httpx)."""
+
+    def __init__(
+        self,
+        endpoint: str = GRAPHQL_ENDPOINT,
+        timeout: float = READ_TIMEOUT,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        pool_size: int = POOL_SIZE,
+    ):
+        if httpx is None:
+            raise RuntimeError("AsyncGraphQLClient requires httpx: pip install httpx")
+        self.endpoint = endpoint
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(pool_size)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            # Retries connection failures only
+            transport=httpx.AsyncHTTPTransport(retries=max_retries),
+        )
+
+    async def _post(self, body: Any) -> Any:
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                response = await self.client.post(self.endpoint, json=body)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+                retry_after = response.headers.get("retry-after", "")
+                await asyncio.sleep(float(retry_after) if retry_after.isdigit() else 0.2 * 2 ** attempt)
+            response.raise_for_status()
+            return response.json()
+
+    async def execute(
+        self,
+        query: Operation,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        return await self._post(to_payload(query, variables))
+
+    async def execute_many(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(self.execute(op) for op in operations)))
+
+    async def execute_batch(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        return await self._post([to_payload(op) for op in operations])
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncGraphQLClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+def _result_to_dict(result: Any) -> Dict[str, Any]:
+    # Same shape as the HTTP response body, without the JSON round trip
+    data: Dict[str, Any] = {"data": result.data}
+    if result.errors:
+        data["errors"] = [error.formatted for error in result.errors]
+    if result.extensions:
+        data["extensions"] = result.extensions
+    return data
+
+
+class InProcessGraphQLClient:
+    """Executes operations directly against the app schema in this process.
+
+    Skips HTTP, JSON encoding/decoding and the FastAPI stack, and shares the
+    schema's parser/validation caches with the HTTP endpoint. Results are the
+    same dictionaries an HTTP client would get back, holding Python objects.
+    """
+
+    def __init__(self, schema: Any = None):
+        if schema is None:
+            from app.schema.schema import schema
+        self.schema = schema
+
+    @staticmethod
+    def _context() -> Dict[str, Any]:
+        from app.schema.loaders import DataLoaders
+        return {"loaders": DataLoaders()}
+
+    def execute(
+        self,
+        query: Operation,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        payload = to_payload(query, variables)
+        result = self.schema.execute_sync(
+            payload["query"],
+            variable_values=payload.get("variables"),
+            operation_name=payload.get("operationName"),
+            context_value=self._context(),
+        )
+        return _result_to_dict(result)
+
+    def execute_many(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        # Resolvers are synchronous, so threads would only add overhead here
+        return [self.execute(op) for op in operations]
+
+    def execute_batch(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        return self.execute_many(operations)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "InProcessGraphQLClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class AsyncInProcessGraphQLClient:
+    """asyncio counterpart of InProcessGraphQLClient, for use inside the API's event loop."""
+
+    def __init__(self, schema: Any = None):
+        if schema is None:
+            from app.schema.schema import schema
+        self.schema = schema
+
+    @staticmethod
+    def _context() -> Dict[str, Any]:
+        from app.schema.loaders import DataLoaders
+        return {"loaders": DataLoaders()}
+
+    async def execute(
+        self,
+        query: Operation,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        payload = to_payload(query, variables)
+        result = await self.schema.execute(
+            payload["query"],
+            variable_values=payload.get("variables"),
+            operation_name=payload.get("operationName"),
+            context_value=self._context(),
+        )
+        return _result_to_dict(result)
+
+    async def execute_many(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(self.execute(op) for op in operations)))
+
+    async def execute_batch(self, operations: Sequence[Operation]) -> List[Dict[str, Any]]:
+        return await self.execute_many(operations)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "AsyncInProcessGraphQLClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+def create_client(transport: Optional[str] = None, endpoint: str = GRAPHQL_ENDPOINT) -> Any:
+    """Create a client for GRAPHQL_TRANSPORT ("http" or "inprocess")."""
+    transport = (transport or os.getenv("GRAPHQL_TRANSPORT", "http")).lower()
+    if transport == "inprocess":
+        return InProcessGraphQLClient()
+    if transport == "http":
+        return GraphQLClient(endpoint)
+    raise ValueError(f"Unknown GraphQL transport '{transport}', expected 'http' or 'inprocess'")
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import db
+from app.main import app
+from app.models import Appointment, Lead, Task, Vehicle
+
+
+@pytest.fixture
+def client():
+    # Not entered as a context manager: startup hooks (seeding, background loops) don't run
+    db.clear()
+    yield TestClient(app)
+    db.clear()
+
+
+@pytest.fixture
+def leads(client):
+    """Three leads, each with a task, an appointment and a vehicle."""
+    created = []
+    for i in range(3):
+        lead = db.create(Lead, name=f"Lead {i}", email=f"lead{i}@example.com", phone="555-0100",
+                         city="Springfield", state="IL", lead_status="NEW", lead_source="Website",
+                         lead_owner="Owner Name")
+        db.create(Task, title=f"Call {i}", description="Follow up", due_date="2030-01-01T10:00:00",
+                  status="PENDING", priority="HIGH", assignee="Owner Name", lead_id=lead.id)
+        db.create(Appointment, title=f"Test drive {i}", description="Bring license",
+                  location="123 Main St", start_time="2030-01-01T10:00:00",
+                  end_time="2030-01-01T11:00:00", status="SCHEDULED", lead_id=lead.id)
+        db.create(Vehicle, make="Toyota", model="Camry", year="2020", color="Blue",
+                  vin=f"1HGCM82633A00435{i}", mileage=42000, condition="USED", notes="", lead_id=lead.id)
+        created.append(lead)
+    return created
+
+
+def run_query(client: TestClient, query: str, **variables):
+    response = client.post("/graphql", json={"query": query, "variables": variables})
+    assert response.status_code == 200, response.text
+    return response.json()
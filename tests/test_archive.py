@@ -0,0 +1,84 @@
+import asyncio
+
+from app.archive import Archive
+from app.db import db
+from app.models import Lead, Task
+from app.schema import resolvers
+
+from .conftest import run_query
+
+
+def test_background_job_survives_a_failed_run(tmp_path, monkeypatch):
+    archive = Archive(str(tmp_path))
+    calls = []
+
+    async def run():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise OSError("No space left on device")
+        return {}
+
+    monkeypatch.setattr(archive, "run", run)
+
+    async def main():
+        archive.start(interval=0.001)
+        for _ in range(100):
+            if len(calls) >= 2:
+                break
+            await asyncio.sleep(0.001)
+        assert not archive._runner.done()
+        await archive.stop()
+
+    asyncio.run(main())
+    assert len(calls) >= 2
+
+
+def test_archiving_is_not_a_delete_for_sync(client, monkeypatch, tmp_path):
+    archive = Archive(str(tmp_path))
+    monkeypatch.setattr(resolvers, "archive", archive)
+    lead = db.create(Lead, name="Lead")
+    task = db.create(Task, title="Call", due_date="2020-01-01", status="COMPLETED", assignee="Owner",
+                     lead_id=lead.id)
+    gone = db.create(Task, title="Gone", due_date="2020-01-01", assignee="Owner", lead_id=lead.id)
+    version = db.version
+
+    archive.archive(Task, [task])
+    db.delete(Task, gone.id)
+    result = run_query(client, "query ($v: Int!) { changesSince(version: $v) { changes { id deleted archived data } } }",
+                       v=version)
+    assert "errors" not in result
+    changes = {change["id"]: change for change in result["data"]["changesSince"]["changes"]}
+    assert changes[task.id]["archived"] and not changes[task.id]["deleted"]
+    assert changes[task.id]["data"]["title"] == "Call"
+    assert changes[gone.id]["deleted"] and not changes[gone.id]["archived"]
+    assert db.changes_since(version)[0][0][3] == "ARCHIVED"
+
+
+def test_merged_leads_keep_their_archived_rows(client, monkeypatch, tmp_path):
+    from app import dedupe, scoring
+
+    archive = Archive(str(tmp_path))
+    for module in (resolvers, dedupe, scoring):
+        monkeypatch.setattr(module, "archive", archive)
+    source = db.create(Lead, name="Ada")
+    target = db.create(Lead, name="Ada L.")
+    task = db.create(Task, title="Call", due_date="2020-01-01", status="COMPLETED", assignee="Owner",
+                     lead_id=source.id)
+    archive.archive(Task, [task])
+    scoring.scorer.run(full=True)
+    assert scoring.scorer._archived_activity()[0] == {source.id: 1}
+
+    dedupe.merge_leads(target.id, [source.id])
+    result = run_query(client, "query ($id: String!) { getTasksByLead(leadId: $id, includeArchived: true) { id leadId } }",
+                       id=target.id)
+    assert result["data"]["getTasksByLead"] == [{"id": task.id, "leadId": target.id}]
+    # The target gained archived activity only, and is rescored for it
+    assert scoring.scorer.run()["scored"] == 1
+    assert scoring.scorer._archived_activity()[0] == {target.id: 1}
+
+    # The merge outlives a restart
+    reopened = Archive(str(tmp_path))
+    reopened.open()
+    assert [row.lead_id for row in reopened.get_by_lead(Task, target.id)] == [target.id]
+    assert reopened.get_by_lead(Task, source.id) == []
+    reopened.close()
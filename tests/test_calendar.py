@@ -0,0 +1,31 @@
+from app.calendar_index import calendar_index
+from app.db import db
+from app.models import Appointment, Lead
+
+from .conftest import run_query
+
+CALENDAR = """query ($from: String!, $to: String!) {
+  getCalendar(from: $from, to: $to) { date appointments { id } }
+}"""
+
+
+def _calendar(client, start, end):
+    result = run_query(client, CALENDAR, **{"from": start, "to": end})
+    assert "errors" not in result, result
+    return [(day["date"], [a["id"] for a in day["appointments"]]) for day in result["data"]["getCalendar"]]
+
+
+def test_start_times_with_offsets_use_the_utc_day(client):
+    lead = db.create(Lead, name="Lead")
+    late = db.create(Appointment, title="Late call", start_time="2024-05-01T23:30:00-05:00",
+                     end_time="2024-05-02T00:30:00-05:00", lead_id=lead.id)
+    early = db.create(Appointment, title="Breakfast", start_time="2024-05-02T01:00:00",
+                      end_time="2024-05-02T02:00:00", lead_id=lead.id)
+    db.create(Appointment, title="Someday", start_time="someday", end_time="someday", lead_id=lead.id)
+
+    # 04:30 UTC on May 2nd, after the naive 01:00 appointment
+    assert _calendar(client, "2024-05-01", "2024-05-02") == [("2024-05-02", [early.id, late.id])]
+    assert _calendar(client, "2024-05-01", "2024-05-01") == []
+    # Bounds with an offset are converted too: 2024-05-02T04:00 UTC onwards
+    assert _calendar(client, "2024-05-01T23:00:00-05:00", "2024-05-02") == [("2024-05-02", [late.id])]
+    assert len(calendar_index.all.days) == 1
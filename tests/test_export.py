@@ -0,0 +1,54 @@
+import json
+
+from app import export
+from app.archive import Archive
+from app.db import db
+from app.models import Appointment, Lead, Note, Task
+
+
+def _records(client, **params):
+    response = client.get("/export/leads.ndjson", params=params)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.content.splitlines()]
+
+
+def _note_ids(record):
+    return [note["id"] for note in record["notes"]] + [
+        note["id"] for task in record["tasks"] for note in task["notes"]
+    ]
+
+
+def test_each_note_is_exported_once(client):
+    lead = db.create(Lead, name="Lead")
+    other = db.create(Lead, name="Other")
+    task = db.create(Task, title="Call", due_date="2030-01-01", assignee="Owner", lead_id=lead.id)
+    on_task = db.create(Note, title="On task", lead_id=lead.id, task_id=task.id)
+    on_lead = db.create(Note, title="On lead", lead_id=lead.id)
+    # Filed under another lead than its task's
+    elsewhere = db.create(Note, title="Elsewhere", lead_id=other.id, task_id=task.id)
+
+    records = {record["id"]: record for record in _records(client)}
+    assert [note["id"] for note in records[lead.id]["notes"]] == [on_lead.id]
+    assert [note["id"] for note in records[lead.id]["tasks"][0]["notes"]] == [on_task.id, elsewhere.id]
+    assert _note_ids(records[other.id]) == []
+
+
+def test_archived_rows_only_on_request(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(export, "archive", Archive(str(tmp_path)))
+    lead = db.create(Lead, name="Lead")
+    task = db.create(Task, title="Call", due_date="2020-01-01", status="COMPLETED", assignee="Owner",
+                     lead_id=lead.id)
+    note = db.create(Note, title="On task", lead_id=lead.id, task_id=task.id)
+    appointment = db.create(Appointment, title="Visit", start_time="2020-01-01T10:00:00",
+                            end_time="2020-01-01T11:00:00", lead_id=lead.id)
+    export.archive.archive(Task, [task])
+    export.archive.archive(Appointment, [appointment])
+
+    [record] = _records(client)
+    assert record["tasks"] == [] and record["appointments"] == []
+    assert _note_ids(record) == [note.id]
+
+    [record] = _records(client, include_archived="true")
+    assert [t["id"] for t in record["tasks"]] == [task.id]
+    assert [a["id"] for a in record["appointments"]] == [appointment.id]
+    assert _note_ids(record) == [note.id]
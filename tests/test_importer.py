@@ -0,0 +1,68 @@
+import asyncio
+
+from app.db import db
+from app.importer import iter_lines
+from app.models import Lead
+
+
+def _import(client, entity, body, content_type):
+    return client.post(f"/import/{entity}", content=body, headers={"content-type": content_type})
+
+
+def test_csv_with_byte_order_mark(client):
+    body = "\ufeffname,email\nAda,ada@example.com\n".encode("utf-8")
+    response = _import(client, "leads", body, "text/csv")
+    assert response.status_code == 200, response.text
+    assert response.json()["created"] == 1
+    assert [lead.name for lead in db.get_all(Lead)] == ["Ada"]
+
+
+def test_invalid_utf8_is_a_row_error(client):
+    body = b'{"name": "Ada"}\n{"name": "\xff\xfe"}\n{"name": "Grace"}\n'
+    response = _import(client, "leads", body, "application/x-ndjson")
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["created"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["row"] == 2
+    assert "UTF-8" in report["errors"][0]["error"]
+
+    body = b"name,email\nAda,ada@example.com\nB\xe9atrice,b@example.com\n"
+    report = _import(client, "leads", body, "text/csv").json()
+    assert (report["created"], report["failed"]) == (1, 1)
+
+
+def test_invalid_utf8_header_is_rejected(client):
+    response = _import(client, "leads", b"n\xffame\nAda\n", "text/csv")
+    assert response.status_code == 400
+    assert "UTF-8" in response.json()["detail"]
+
+
+def _lines(chunks, max_line_bytes):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [line if isinstance(line, str) else str(line) async for line in iter_lines(stream(), max_line_bytes)]
+
+    return asyncio.run(collect())
+
+
+def test_overlong_lines_are_skipped_not_buffered():
+    long = b"x" * 25
+    # Split across chunks, within one chunk, and at the end of the body
+    chunks = [b"ok\n" + long[:10], long[10:], long[:5] + b"\nfine\n" + long + b"\nlast\n", long]
+    assert _lines(chunks, 20) == [
+        "ok", "line longer than 20 bytes", "fine", "line longer than 20 bytes", "last", "line longer than 20 bytes",
+    ]
+    assert _lines([b"a\r\n", b"b"], 20) == ["a", "b"]
+
+
+def test_overlong_quoted_csv_field(client, monkeypatch):
+    from app import importer
+
+    monkeypatch.setattr(importer, "IMPORT_MAX_LINE_BYTES", 40)
+    body = b'name,email\n"never\n' + b"closed\n" * 10 + b'Ada,ada@example.com\n'
+    report = _import(client, "leads", body, "text/csv").json()
+    assert report["failed"] >= 1
+    assert "quoted field longer than 40" in report["errors"][0]["error"]
@@ -0,0 +1,64 @@
+import json
+
+from .conftest import run_query
+
+MULTIPART = {"accept": "multipart/mixed; deferSpec=20220824, application/json"}
+
+
+def _payloads(client, query, **variables):
+    response = client.post("/graphql", json={"query": query, "variables": variables}, headers=MULTIPART)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("multipart/mixed")
+    body = response.content
+    assert body.endswith(b"\r\n-----\r\n")
+    parts = body[:-len(b"\r\n-----\r\n")].split(b"\r\n---")[1:]
+    payloads = []
+    for part in parts:
+        headers, _, data = part.partition(b"\r\n\r\n")
+        assert b"application/json" in headers
+        payloads.append(json.loads(data))
+    assert [payload["hasNext"] for payload in payloads] == [True] * (len(payloads) - 1) + [False]
+    return payloads
+
+
+def _incremental(payloads):
+    return [item for payload in payloads[1:] for item in payload["incremental"]]
+
+
+def test_defer_typed_fragment(client, leads):
+    payloads = _payloads(client, """
+        { getLead(id: "%s") { id ... on LeadType @defer(label: "contact") { email city } } }
+    """ % leads[0].id)
+    assert payloads[0]["data"] == {"getLead": {"id": leads[0].id}}
+    assert _incremental(payloads) == [{
+        "data": {"email": "lead0@example.com", "city": "Springfield"},
+        "path": ["getLead"],
+        "label": "contact",
+    }]
+
+
+def test_defer_untyped_fragment_in_list(client, leads):
+    payloads = _payloads(client, "{ getAllLeads(size: 3) { items { id ... @defer { name } } } }")
+    assert "errors" not in payloads[0]
+    assert payloads[0]["data"]["getAllLeads"]["items"] == [{"id": lead.id} for lead in leads]
+    deferred = _incremental(payloads)
+    assert sorted((item["path"], item["data"]["name"]) for item in deferred) == [
+        (["getAllLeads", "items", i], f"Lead {i}") for i in range(3)
+    ]
+
+
+def test_stream_with_initial_count(client, leads):
+    payloads = _payloads(client, "{ getVehicles @stream(initialCount: 1) { vin } }")
+    assert payloads[0]["data"]["getVehicles"] == [{"vin": "1HGCM82633A004350"}]
+    streamed = _incremental(payloads)
+    assert streamed == [{"items": [{"vin": "1HGCM82633A004351"}, {"vin": "1HGCM82633A004352"}],
+                         "path": ["getVehicles", 1]}]
+
+
+def test_directives_ignored_without_multipart(client, leads):
+    result = run_query(client, "{ getVehicles @stream(initialCount: 1) { vin ... @defer { make } } }")
+    assert "errors" not in result
+    assert [vehicle["vin"] for vehicle in result["data"]["getVehicles"]] == [
+        "1HGCM82633A004350", "1HGCM82633A004351", "1HGCM82633A004352",
+    ]
+    assert {vehicle["make"] for vehicle in result["data"]["getVehicles"]} == {"TOYOTA"}
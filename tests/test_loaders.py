@@ -0,0 +1,23 @@
+from app.db import db
+from app.models import Lead
+
+QUERY = "{ getVehicles { lead { name } } }"
+
+
+def _ws_query(ws, id):
+    ws.send_json({"type": "subscribe", "id": id, "payload": {"query": QUERY}})
+    message = ws.receive_json()
+    assert message["type"] == "next", message
+    assert ws.receive_json() == {"type": "complete", "id": id}
+    return {vehicle["lead"]["name"] for vehicle in message["payload"]["data"]["getVehicles"]}
+
+
+def test_websocket_operations_do_not_share_loaders(client, leads):
+    with client.websocket_connect("/graphql", subprotocols=["graphql-transport-ws"]) as ws:
+        ws.send_json({"type": "connection_init"})
+        assert ws.receive_json()["type"] == "connection_ack"
+
+        assert _ws_query(ws, "1") == {"Lead 0", "Lead 1", "Lead 2"}
+        for lead in leads:
+            db.update(Lead, lead.id, name="Renamed")
+        assert _ws_query(ws, "2") == {"Renamed"}
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+
+from app import prefork
+from app.archive import Archive
+
+
+def test_refuses_sqlite_backend(monkeypatch):
+    monkeypatch.setattr(prefork, "DB_BACKEND", "sqlite")
+    with pytest.raises(SystemExit):
+        prefork.serve(workers=1)
+
+
+def test_read_only_archive_does_not_archive(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.writable = False
+
+    async def run():
+        archive.start()
+        assert archive._runner is None
+        with pytest.raises(RuntimeError):
+            await archive.run()
+
+    asyncio.run(run())
+    assert list(tmp_path.iterdir()) == []
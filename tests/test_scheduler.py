@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.db import db
+from app.models import Appointment, Lead, Task
+from app.scheduler import naive_utc, scheduler
+
+
+def _appointment(lead, reminder_time):
+    return db.create(Appointment, title="Test drive", start_time="2030-01-01T10:00:00",
+                     end_time="2030-01-01T11:00:00", status="SCHEDULED", reminder_time=reminder_time,
+                     lead_id=lead.id)
+
+
+def test_naive_utc():
+    assert naive_utc("2030-01-01T09:00:00+02:00") == "2030-01-01T07:00:00"
+    assert naive_utc("2030-01-01T09:00:00Z") == "2030-01-01T09:00:00"
+    assert naive_utc("2030-01-01T09:00:00") == "2030-01-01T09:00:00"
+    assert naive_utc("next tuesday") is None
+    assert naive_utc(None) is None
+
+
+def test_offset_and_invalid_times_are_indexed_safely(client):
+    lead = db.create(Lead, name="Lead", email="lead@example.com")
+    aware = _appointment(lead, "2030-01-01T09:00:00+00:00")
+    invalid = _appointment(lead, "not a date")
+    task = db.create(Task, title="Call", due_date="2000-01-01T09:00:00+01:00", assignee="Owner", lead_id=lead.id)
+    db.create(Task, title="Call", due_date="soon", assignee="Owner", lead_id=lead.id)
+
+    assert scheduler.reminders.peek() == ("2030-01-01T09:00:00", aware.id)
+    assert invalid.id not in scheduler.reminders._times
+    assert [t.id for t in scheduler.overdue_tasks()] == [task.id]
+
+
+def test_dispatch_survives_bad_reminders(client):
+    lead = db.create(Lead, name="Lead", email="lead@example.com")
+    _appointment(lead, "garbage")
+    # Due a few seconds ago, within the grace period, with an offset
+    due = _appointment(lead, (datetime.now(timezone.utc) - timedelta(seconds=5)).isoformat())
+    fired = []
+
+    async def run():
+        scheduler.fire = fired.append
+        try:
+            scheduler.start()
+            await asyncio.sleep(0.05)
+            assert not scheduler._runner.done()
+        finally:
+            await scheduler.stop()
+            del scheduler.fire
+
+    asyncio.run(run())
+    assert [appointment.id for appointment in fired] == [due.id]
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import scoring
+from app.db import db
+from app.models import Appointment, Lead, Task
+from app.scoring import FEATURES, lead_features, scorer
+
+
+def _features(lead):
+    now = datetime.utcnow()
+    return dict(zip(FEATURES, lead_features(lead, now.isoformat(), now.year)))
+
+
+def test_times_with_offsets_and_invalid_times(client):
+    lead = db.create(Lead, name="Lead", email="lead@example.com", lead_status="NEW")
+    seen = (datetime.now(timezone.utc) - timedelta(days=9)).isoformat()
+    db.create(Appointment, title="Visit", start_time=seen, end_time=seen, status="COMPLETED", lead_id=lead.id)
+    db.create(Appointment, title="Visit", start_time="someday", end_time="someday", lead_id=lead.id)
+    db.create(Task, title="Call", due_date="2000-01-01T00:00:00+05:00", assignee="Owner", lead_id=lead.id)
+    db.create(Task, title="Call", due_date="whenever", assignee="Owner", lead_id=lead.id)
+
+    features = _features(lead)
+    assert features["appointment_recency"] == pytest.approx(1 - 9 / 90, abs=0.01)
+    assert features["upcoming_appointment"] == 0.0
+    assert features["tasks_overdue"] == pytest.approx(1 / 3)
+
+    result = scorer.run(full=True)
+    assert result["scored"] == 1
+    assert db.get(Lead, lead.id).lead_score is not None
+
+
+def test_failed_run_keeps_leads_pending(client, monkeypatch):
+    lead = db.create(Lead, name="Lead", email="lead@example.com")
+    scorer.run(full=True)
+    db.update(Lead, lead.id, city="Springfield")
+    assert scorer.pending == 1
+
+    def fail(rows):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(scoring, "score_features", fail)
+    with pytest.raises(RuntimeError):
+        scorer.run()
+    assert scorer.pending == 1
+
+    monkeypatch.undo()
+    assert scorer.run()["scored"] == 1
+    assert scorer.pending == 0
+
+
+def test_archiving_does_not_change_scores(client, monkeypatch, tmp_path):
+    from app.archive import Archive
+
+    monkeypatch.setattr(scoring, "archive", Archive(str(tmp_path)))
+    lead = db.create(Lead, name="Lead", email="lead@example.com", lead_status="QUALIFIED")
+    seen = (datetime.utcnow() - timedelta(days=60)).isoformat()
+    appointment = db.create(Appointment, title="Visit", start_time=seen, end_time=seen, status="COMPLETED",
+                            lead_id=lead.id)
+    tasks = [db.create(Task, title="Call", due_date=seen, status="COMPLETED", assignee="Owner", lead_id=lead.id)
+             for _ in range(2)]
+    scorer.run(full=True)
+    before = _features(lead), db.get(Lead, lead.id).lead_score
+
+    scoring.archive.archive(Task, tasks)
+    scoring.archive.archive(Appointment, [appointment])
+    assert db.get_by_foreign_key(Task, "lead_id", lead.id) == []
+    scorer.run()
+
+    completed, last_seen = scorer._archived_activity()
+    after_features = dict(zip(FEATURES, lead_features(lead, datetime.utcnow().isoformat(), datetime.utcnow().year,
+                                                      completed.get(lead.id, 0), last_seen.get(lead.id))))
+    assert after_features == pytest.approx(before[0])
+    assert db.get(Lead, lead.id).lead_score == before[1]
+
+
+def test_batches_are_vectorized_with_numpy(client, monkeypatch):
+    pytest.importorskip("numpy")
+    for i, status in enumerate(("NEW", "QUALIFIED", "CUSTOMER")):
+        db.create(Lead, name=f"Lead {i}", email="lead@example.com", lead_status=status, lead_source="Referral")
+    result = scorer.run(full=True)
+    assert result["vectorized"] is True
+    vectorized = sorted(lead.lead_score for lead in db.get_all(Lead))
+
+    monkeypatch.setattr(scoring, "np", None)
+    rows = [lead_features(lead, datetime.utcnow().isoformat(), datetime.utcnow().year) for lead in db.get_all(Lead)]
+    assert sorted(scoring.score_features(rows)) == vectorized
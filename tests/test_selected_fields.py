@@ -0,0 +1,27 @@
+from .conftest import run_query
+
+
+def test_untyped_inline_fragment_with_directive(client, leads):
+    result = run_query(client, "{ getAllLeads(size: 1) { items { id ... @include(if: true) { name } } } }")
+    assert "errors" not in result
+    assert result["data"]["getAllLeads"]["items"] == [{"id": leads[0].id, "name": "Lead 0"}]
+
+
+def test_untyped_inline_fragment_on_list_field(client, leads):
+    result = run_query(client, "{ getVehicles { id ... { make } } }")
+    assert "errors" not in result
+    vehicles = result["data"]["getVehicles"]
+    assert len(vehicles) == 3
+    assert {vehicle["make"] for vehicle in vehicles} == {"TOYOTA"}
+
+
+def test_named_fragment_fields_are_copied(client, leads):
+    result = run_query(client, """
+        { getAllLeads(size: 3) { items { id ...Contact } } }
+        fragment Contact on LeadType { email city }
+    """)
+    assert "errors" not in result
+    assert [item["email"] for item in result["data"]["getAllLeads"]["items"]] == [
+        "lead0@example.com", "lead1@example.com", "lead2@example.com",
+    ]
+    assert {item["city"] for item in result["data"]["getAllLeads"]["items"]} == {"Springfield"}
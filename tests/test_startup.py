@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+from app.db import db
+from app.main import app
+from app.models import Lead
+
+
+def test_startup_does_not_seed_over_existing_data(client, monkeypatch):
+    monkeypatch.setenv("ENV", "development")
+    lead = db.create(Lead, name="Kept")
+    with TestClient(app):
+        assert [row.id for row in db.get_all(Lead)] == [lead.id]
+
+
+def test_startup_seeds_an_empty_database(client, monkeypatch):
+    monkeypatch.setenv("ENV", "development")
+    with TestClient(app):
+        assert db.count(Lead) > 0
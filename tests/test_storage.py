@@ -0,0 +1,110 @@
+"""The SQLite backend must behave like the in-memory one: same operations, same results."""
+import pytest
+
+from app.db import db as memory_db
+from app.models import Lead, Note, Task, Vehicle
+from app.sqlite_db import SQLiteDB
+from app.storage import StorageBackend
+
+CREATED_AT = "2030-01-01T00:00:00"
+
+
+def _rows(models):
+    # updated_at is the wall-clock time of the write
+    return [{k: v for k, v in model.to_dict().items() if k != "updated_at"} for model in models]
+
+
+def _ids(models):
+    return [model.id for model in models]
+
+
+def exercise(backend: StorageBackend):
+    results = {}
+    for i in range(3):
+        backend.create(Lead, id=f"lead-{i}", name=f"Lead {i}", lead_status="NEW" if i else "QUALIFIED",
+                       lead_source="Website", created_at=CREATED_AT)
+    makes = ["Toyota", None, "", "Audi", "Toyota", None, "BMW"]
+    backend.bulk_create(Vehicle, [
+        dict(id=f"vehicle-{i}", make=make, model="Model", year=str(2010 + i % 3), color="Blue",
+             vin=f"VIN{i}", mileage=1000 * i, condition="USED", lead_id=f"lead-{i % 3}", created_at=CREATED_AT)
+        for i, make in enumerate(makes)
+    ])
+    tasks = backend.bulk_create(Task, [
+        dict(id=f"task-{i}", title=f"Task {i}", due_date=f"2030-01-0{i + 1}", status="PENDING",
+             assignee="Owner", lead_id=f"lead-{i % 2}", created_at=CREATED_AT)
+        for i in range(4)
+    ])
+    backend.add_relationships(Task, "lead", Lead, ((task.id, task.lead_id) for task in tasks))
+    note = backend.create(Note, id="note-0", title="Note", lead_id="lead-0", task_id="task-0",
+                          created_at=CREATED_AT)
+    backend.add_relationship(Note, note.id, "task", Task, "task-0")
+    backend.add_relationship(Lead, "lead-0", "notes", Note, note.id)
+
+    results["get"] = _rows([backend.get(Vehicle, "vehicle-3")])
+    results["get_missing"] = backend.get(Vehicle, "nope")
+    results["get_all"] = _ids(backend.get_all(Vehicle))
+    results["iter_all"] = _ids(backend.iter_all(Vehicle))
+    results["by_fk"] = _ids(backend.get_by_foreign_key(Vehicle, "lead_id", "lead-0"))
+    for descending in (False, True):
+        results[f"order_make_{descending}"] = _ids(backend.select(Vehicle, order_by="make", descending=descending))
+    results["order_page"] = _ids(backend.select(Vehicle, order_by="make", offset=2, limit=3))
+    results["where_eq"] = _ids(backend.select(Vehicle, {"make": "Toyota"}))
+    results["where_in"] = _ids(backend.select(Vehicle, {"make": {"in_list": ["Audi", "BMW"]}}))
+    results["where_ne"] = _ids(backend.select(Vehicle, {"make": {"ne": "Toyota"}}))
+    results["where_contains"] = _ids(backend.select(Vehicle, {"make": {"contains": "o"}}))
+    results["where_not_contains"] = _ids(backend.select(Vehicle, {"make": {"not_contains": "o"}}))
+    results["where_starts"] = _ids(backend.select(Vehicle, {"make": {"starts_with": "B"}}))
+    results["where_fk_sorted"] = _ids(backend.select(Vehicle, {"lead_id": "lead-1"}, order_by="year",
+                                                     descending=True))
+    results["count"] = backend.count(Vehicle)
+    results["count_where"] = backend.count(Vehicle, {"make": {"not_in": ["Toyota"]}})
+    results["count_values"] = backend.count_values(Lead, "lead_status")
+
+    backend.update(Vehicle, "vehicle-1", make="Kia", mileage=5)
+    backend.bulk_update(Vehicle, {"vehicle-2": {"color": "Red"}, "missing": {"color": "Red"}})
+    results["updated"] = _rows([backend.get(Vehicle, "vehicle-1"), backend.get(Vehicle, "vehicle-2")])
+
+    results["related_many"] = _ids(backend.get_related(Lead, "lead-0", "notes"))
+    results["related_single"] = _ids([backend.get_related_single(Task, "task-2", "lead")])
+    backend.repoint_relationships(Lead, ["lead-0"], "lead-2")
+    results["repointed"] = _ids(backend.get_related(Lead, "lead-2", "notes"))
+    results["repointed_single"] = _ids([backend.get_related_single(Task, "task-0", "lead")])
+
+    results["delete"] = backend.delete(Vehicle, "vehicle-0")
+    results["delete_missing"] = backend.delete(Vehicle, "vehicle-0")
+    results["bulk_delete"] = _ids(backend.bulk_delete(Vehicle, ["vehicle-4", "missing", "vehicle-5"]))
+    results["after_delete"] = _ids(backend.get_all(Vehicle))
+    return results
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    backend = SQLiteDB(str(tmp_path / "test.db"))
+    yield backend
+    backend.close()
+
+
+def test_sqlite_matches_memory(client, sqlite_db):
+    expected = exercise(memory_db)
+    actual = exercise(sqlite_db)
+    for name in expected:
+        assert actual[name] == expected[name], name
+
+
+def test_null_and_empty_strings_sort_together(client, sqlite_db):
+    for backend in (memory_db, sqlite_db):
+        backend.bulk_create(Vehicle, [
+            dict(id=f"v{i}", make=make, model="M", year="2020", vin="V", lead_id="x")
+            for i, make in enumerate([None, "", "A", None])
+        ])
+        assert _ids(backend.select(Vehicle, order_by="make")) == ["v0", "v1", "v3", "v2"]
+        assert _ids(backend.select(Vehicle, order_by="make", descending=True)) == ["v2", "v0", "v1", "v3"]
+
+
+def test_backends_implement_the_interface():
+    class Partial(StorageBackend):
+        def create(self, model_type, **data):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
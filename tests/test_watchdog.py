@@ -0,0 +1,14 @@
+from app.watchdog import LoopWatchdog, blocked_total
+
+
+def test_only_known_operations_are_metric_labels():
+    watchdog = LoopWatchdog(operations=["LeadReport"])
+    before = {label: blocked_total.value(operation=label) for label in ("LeadReport", "other")}
+    for operation in ("LeadReport", "Random123", None):
+        watchdog._report(0.5, {"operation": operation, "path": "getAllLeads", "stack": []})
+
+    assert blocked_total.value(operation="LeadReport") == before["LeadReport"] + 1
+    assert blocked_total.value(operation="other") == before["other"] + 2
+    assert blocked_total.value(operation="Random123") == 0
+    # The raw name is kept for /debug/event-loop
+    assert [stall["operation"] for stall in watchdog.stalls] == ["LeadReport", "Random123", None]